@@ -15,7 +15,7 @@ if PROJECT_ROOT not in sys.path:
 from app.db.base import Base  # debe existir en tu proyecto
 # Importar los módulos de modelos (ajusta si tus módulos tienen otros nombres)
 try:
-    from app.models import reservation, user  # noqa: F401
+    from app.models import audit_log, lab, reservation, rollup, user  # noqa: F401
 except Exception:
     # Si la estructura de modelos es distinta, intenta importar paquete completo
     try:
@@ -0,0 +1,63 @@
+"""Esquema inicial (el que creaba Base.metadata.create_all)
+
+Las bases ya existentes se marcan con: alembic stamp 0001
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(64), nullable=False),
+        sa.Column("full_name", sa.String(120), nullable=True),
+        sa.Column("email", sa.String(120), nullable=True, unique=True),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "reservations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("lab_name", sa.String(150), nullable=False),
+        sa.Column("reserved_by", sa.String(150), nullable=False),
+        sa.Column("purpose", sa.String(), nullable=False),
+        sa.Column("start_time", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+    )
+    op.create_index("ix_reservations_id", "reservations", ["id"])
+    op.create_index("ix_reservations_lab_name", "reservations", ["lab_name"])
+
+    op.create_table(
+        "audit_logs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("action", sa.String(50), nullable=False),
+        sa.Column("target_model", sa.String(100), nullable=False),
+        sa.Column("target_id", sa.Integer(), nullable=False),
+        sa.Column("details", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_audit_logs_id", "audit_logs", ["id"])
+
+
+def downgrade():
+    op.drop_table("audit_logs")
+    op.drop_table("reservations")
+    op.drop_table("users")
@@ -0,0 +1,73 @@
+"""Reservas como intervalos: end_time, índice (lab_name, start_time) y EXCLUDE
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# Debe coincidir con settings.RESERVATION_DEFAULT_MINUTES al migrar
+DEFAULT_MINUTES = 60
+
+# Pares de reservas solapadas que se listan en el error como máximo
+MAX_REPORTED_CONFLICTS = 50
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    op.add_column("reservations", sa.Column("end_time", sa.DateTime(timezone=True), nullable=True))
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            f"UPDATE reservations SET end_time = start_time + interval '{DEFAULT_MINUTES} minutes'"
+        )
+    else:
+        op.execute(
+            f"UPDATE reservations SET end_time = datetime(start_time, '+{DEFAULT_MINUTES} minutes')"
+        )
+    with op.batch_alter_table("reservations") as batch:
+        batch.alter_column("end_time", existing_type=sa.DateTime(timezone=True), nullable=False)
+
+    op.create_index("ix_reservations_lab_start", "reservations", ["lab_name", "start_time"])
+
+    if bind.dialect.name == "postgresql":
+        # Los datos antiguos no tenían fin y pueden solaparse. No se cancela
+        # ninguna reserva al migrar: se aborta con la lista de choques para que
+        # un operador decida cuáles anular antes de volver a ejecutar la migración.
+        conflicts = bind.execute(sa.text("""
+            SELECT o.id, r.id FROM reservations r
+            JOIN reservations o
+              ON o.lab_name = r.lab_name AND o.id < r.id
+             AND tstzrange(o.start_time, o.end_time) && tstzrange(r.start_time, r.end_time)
+            WHERE r.deleted_at IS NULL AND o.deleted_at IS NULL
+            ORDER BY o.id, r.id
+        """)).all()
+        if conflicts:
+            pairs = ", ".join(f"{first}-{second}" for first, second in conflicts[:MAX_REPORTED_CONFLICTS])
+            more = len(conflicts) - MAX_REPORTED_CONFLICTS
+            raise RuntimeError(
+                f"Hay {len(conflicts)} pares de reservas activas solapadas (ids: {pairs}"
+                + (f" y {more} más" if more > 0 else "")
+                + "). Anúlelas o corríjalas a mano y repita la migración."
+            )
+        op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        op.execute("""
+            ALTER TABLE reservations ADD CONSTRAINT reservations_no_overlap
+            EXCLUDE USING gist (lab_name WITH =, tstzrange(start_time, end_time) WITH &&)
+            WHERE (deleted_at IS NULL)
+        """)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute("ALTER TABLE reservations DROP CONSTRAINT IF EXISTS reservations_no_overlap")
+    op.drop_index("ix_reservations_lab_start", table_name="reservations")
+    with op.batch_alter_table("reservations") as batch:
+        batch.drop_column("end_time")
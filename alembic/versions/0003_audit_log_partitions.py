@@ -0,0 +1,94 @@
+"""audit_logs particionada por mes (PostgreSQL) e índice (timestamp, id)
+
+En PostgreSQL la tabla se recrea como PARTITION BY RANGE (timestamp) con una
+partición por mes más una DEFAULT, y se copian los datos existentes.
+En SQLite solo se añade el índice para la paginación por cursor.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitions import add_months, ensure_audit_partitions
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.execute("UPDATE audit_logs SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL")
+        with op.batch_alter_table("audit_logs") as batch:
+            batch.alter_column("timestamp", existing_type=sa.DateTime(timezone=True), nullable=False)
+        op.create_index("ix_audit_logs_timestamp_id", "audit_logs", ["timestamp", "id"])
+        return
+
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_legacy")
+    op.execute("ALTER TABLE audit_logs_legacy RENAME CONSTRAINT audit_logs_pkey TO audit_logs_legacy_pkey")
+    op.execute("ALTER TABLE audit_logs_legacy RENAME CONSTRAINT audit_logs_user_id_fkey TO audit_logs_legacy_user_id_fkey")
+    op.execute("ALTER INDEX IF EXISTS ix_audit_logs_id RENAME TO ix_audit_logs_legacy_id")
+
+    # La clave de partición debe formar parte de la clave primaria
+    op.execute("""
+        CREATE TABLE audit_logs (
+            id integer NOT NULL DEFAULT nextval('audit_logs_id_seq'),
+            timestamp timestamptz NOT NULL DEFAULT now(),
+            user_id integer REFERENCES users(id),
+            action varchar(50) NOT NULL,
+            target_model varchar(100) NOT NULL,
+            target_id integer NOT NULL,
+            details text,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+    op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+
+    now = datetime.now(timezone.utc).date()
+    oldest = bind.execute(sa.text("SELECT min(timestamp) FROM audit_logs_legacy")).scalar()
+    ensure_audit_partitions(bind, oldest.date() if oldest else now, add_months(now, MONTHS_AHEAD))
+
+    op.execute("""
+        INSERT INTO audit_logs (id, timestamp, user_id, action, target_model, target_id, details)
+        SELECT id, coalesce(timestamp, now()), user_id, action, target_model, target_id, details
+        FROM audit_logs_legacy
+    """)
+    op.execute("DROP TABLE audit_logs_legacy")
+    op.create_index("ix_audit_logs_timestamp_id", "audit_logs", ["timestamp", "id"])
+    op.create_index("ix_audit_logs_id", "audit_logs", ["id"])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.drop_index("ix_audit_logs_timestamp_id", table_name="audit_logs")
+        with op.batch_alter_table("audit_logs") as batch:
+            batch.alter_column("timestamp", existing_type=sa.DateTime(timezone=True), nullable=True)
+        return
+
+    op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_partitioned")
+    op.execute("""
+        CREATE TABLE audit_logs (
+            id integer PRIMARY KEY DEFAULT nextval('audit_logs_id_seq'),
+            timestamp timestamptz DEFAULT now(),
+            user_id integer REFERENCES users(id),
+            action varchar(50) NOT NULL,
+            target_model varchar(100) NOT NULL,
+            target_id integer NOT NULL,
+            details text
+        )
+    """)
+    op.execute("INSERT INTO audit_logs SELECT * FROM audit_logs_partitioned")
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+    op.execute("DROP TABLE audit_logs_partitioned")
+    op.execute("DROP INDEX IF EXISTS ix_audit_logs_id")
+    op.create_index("ix_audit_logs_id", "audit_logs", ["id"])
@@ -0,0 +1,39 @@
+"""reservation_rollups: contadores por (laboratorio, hora) para popular-times
+
+Se crea la tabla y se rellena a partir de las reservas vigentes; desde entonces
+la mantiene el CRUD de reservas (ver app/crud/rollup.py).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "reservation_rollups",
+        sa.Column("lab_name", sa.String(length=150), primary_key=True),
+        sa.Column("hour", sa.Integer(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+
+    if op.get_bind().dialect.name == "postgresql":
+        hour_expr = "CAST(EXTRACT(HOUR FROM timezone('UTC', start_time)) AS INTEGER)"
+    else:
+        hour_expr = "CAST(strftime('%H', start_time) AS INTEGER)"
+    op.execute(
+        f"INSERT INTO reservation_rollups (lab_name, hour, count) "
+        f"SELECT lab_name, {hour_expr}, COUNT(id) FROM reservations "
+        f"WHERE deleted_at IS NULL GROUP BY lab_name, {hour_expr}"
+    )
+
+
+def downgrade():
+    op.drop_table("reservation_rollups")
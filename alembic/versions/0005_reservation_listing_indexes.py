@@ -0,0 +1,44 @@
+"""Índices para el listado de reservas: parcial (owner_id, start_time) y trigramas en lab_name
+
+- ix_reservations_owner_start_live: (owner_id, start_time) WHERE deleted_at IS NULL.
+  Sirve el filtro por dueño, el rango de fechas y el ORDER BY del cursor.
+- ix_reservations_lab_name_trgm (solo PostgreSQL): GIN con pg_trgm para que
+  lab_name ILIKE '%texto%' no recorra la tabla.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    op.create_index(
+        "ix_reservations_owner_start_live",
+        "reservations",
+        ["owner_id", "start_time"],
+        postgresql_where=sa.text("deleted_at IS NULL"),
+        sqlite_where=sa.text("deleted_at IS NULL"),
+    )
+    if bind.dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            "ix_reservations_lab_name_trgm",
+            "reservations",
+            ["lab_name"],
+            postgresql_using="gin",
+            postgresql_ops={"lab_name": "gin_trgm_ops"},
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_reservations_lab_name_trgm", table_name="reservations")
+    op.drop_index("ix_reservations_owner_start_live", table_name="reservations")
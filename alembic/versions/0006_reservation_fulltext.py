@@ -0,0 +1,25 @@
+"""Búsqueda de texto completo en reservas: tsvector + GIN (PostgreSQL) o FTS5 (SQLite)
+
+Ver app/db/fulltext.py. En PostgreSQL la columna generada se calcula para las
+filas existentes al añadirla; en SQLite se reconstruye la tabla FTS5.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+from app.db.fulltext import install_fulltext, uninstall_fulltext
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    install_fulltext(op.get_bind(), backfill=True)
+
+
+def downgrade():
+    uninstall_fulltext(op.get_bind())
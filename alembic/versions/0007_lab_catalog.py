@@ -0,0 +1,159 @@
+"""Catálogo de laboratorios: tabla labs y reservations.lab_id (entero) en lugar de lab_name
+
+- labs se rellena con los nombres distintos de reservations.
+- reservations.lab_id (FK a labs) sustituye a la columna lab_name (hasta 150
+  caracteres por fila); con ella desaparecen ix_reservations_lab_name y el
+  índice de trigramas de la 0005: el filtro por nombre se resuelve en memoria.
+- ix_reservations_lab_start y la restricción EXCLUDE pasan a (lab_id, ...).
+- reservation_rollups se reconstruye con clave (lab_id, hour).
+
+En SQLite la tabla reservations se recrea (batch), así que antes se quitan el
+índice parcial y los triggers de FTS5 y después se vuelven a crear.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.fulltext import install_fulltext, uninstall_fulltext
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+_LAB_FK = "fk_reservations_lab_id_labs"
+
+
+def _hour_expr(dialect: str) -> str:
+    if dialect == "postgresql":
+        return "CAST(EXTRACT(HOUR FROM timezone('UTC', reservations.start_time)) AS INTEGER)"
+    return "CAST(strftime('%H', reservations.start_time) AS INTEGER)"
+
+
+def _before_sqlite_batch(bind) -> None:
+    if bind.dialect.name == "sqlite":
+        op.drop_index("ix_reservations_owner_start_live", table_name="reservations")
+        uninstall_fulltext(bind)
+
+
+def _after_sqlite_batch(bind) -> None:
+    if bind.dialect.name == "sqlite":
+        op.create_index(
+            "ix_reservations_owner_start_live",
+            "reservations",
+            ["owner_id", "start_time"],
+            sqlite_where=sa.text("deleted_at IS NULL"),
+        )
+        install_fulltext(bind, backfill=True)
+
+
+def _create_overlap_constraint(column: str) -> None:
+    op.execute(f"""
+        ALTER TABLE reservations ADD CONSTRAINT reservations_no_overlap
+        EXCLUDE USING gist ({column} WITH =, tstzrange(start_time, end_time) WITH &&)
+        WHERE (deleted_at IS NULL)
+    """)
+
+
+def upgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+
+    op.create_table(
+        "labs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(150), nullable=False, unique=True),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("capacity", sa.Integer(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_labs_id", "labs", ["id"])
+    true = "true" if dialect == "postgresql" else "1"
+    op.execute(f"INSERT INTO labs (name, is_active) SELECT DISTINCT lab_name, {true} FROM reservations")
+
+    op.add_column("reservations", sa.Column("lab_id", sa.Integer(), nullable=True))
+    op.execute("UPDATE reservations SET lab_id = (SELECT labs.id FROM labs WHERE labs.name = reservations.lab_name)")
+
+    if dialect == "postgresql":
+        op.execute("ALTER TABLE reservations DROP CONSTRAINT IF EXISTS reservations_no_overlap")
+        op.drop_index("ix_reservations_lab_name_trgm", table_name="reservations")
+    op.drop_index("ix_reservations_lab_start", table_name="reservations")
+    op.drop_index("ix_reservations_lab_name", table_name="reservations")
+
+    _before_sqlite_batch(bind)
+    with op.batch_alter_table("reservations") as batch:
+        batch.alter_column("lab_id", existing_type=sa.Integer(), nullable=False)
+        batch.create_foreign_key(_LAB_FK, "labs", ["lab_id"], ["id"])
+        batch.drop_column("lab_name")
+    _after_sqlite_batch(bind)
+
+    op.create_index("ix_reservations_lab_start", "reservations", ["lab_id", "start_time"])
+    if dialect == "postgresql":
+        _create_overlap_constraint("lab_id")
+
+    op.drop_table("reservation_rollups")
+    op.create_table(
+        "reservation_rollups",
+        sa.Column("lab_id", sa.Integer(), sa.ForeignKey("labs.id"), primary_key=True),
+        sa.Column("hour", sa.Integer(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+    hour_expr = _hour_expr(dialect)
+    op.execute(
+        f"INSERT INTO reservation_rollups (lab_id, hour, count) "
+        f"SELECT lab_id, {hour_expr}, COUNT(id) FROM reservations "
+        f"WHERE deleted_at IS NULL GROUP BY lab_id, {hour_expr}"
+    )
+
+
+def downgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+
+    op.drop_table("reservation_rollups")
+    op.create_table(
+        "reservation_rollups",
+        sa.Column("lab_name", sa.String(length=150), primary_key=True),
+        sa.Column("hour", sa.Integer(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+
+    if dialect == "postgresql":
+        op.execute("ALTER TABLE reservations DROP CONSTRAINT IF EXISTS reservations_no_overlap")
+    op.drop_index("ix_reservations_lab_start", table_name="reservations")
+
+    op.add_column("reservations", sa.Column("lab_name", sa.String(150), nullable=True))
+    op.execute("UPDATE reservations SET lab_name = (SELECT labs.name FROM labs WHERE labs.id = reservations.lab_id)")
+
+    _before_sqlite_batch(bind)
+    with op.batch_alter_table("reservations") as batch:
+        batch.alter_column("lab_name", existing_type=sa.String(150), nullable=False)
+        batch.drop_constraint(_LAB_FK, type_="foreignkey")
+        batch.drop_column("lab_id")
+    _after_sqlite_batch(bind)
+
+    op.create_index("ix_reservations_lab_name", "reservations", ["lab_name"])
+    op.create_index("ix_reservations_lab_start", "reservations", ["lab_name", "start_time"])
+    if dialect == "postgresql":
+        op.create_index(
+            "ix_reservations_lab_name_trgm",
+            "reservations",
+            ["lab_name"],
+            postgresql_using="gin",
+            postgresql_ops={"lab_name": "gin_trgm_ops"},
+        )
+        _create_overlap_constraint("lab_name")
+
+    hour_expr = _hour_expr(dialect)
+    op.execute(
+        f"INSERT INTO reservation_rollups (lab_name, hour, count) "
+        f"SELECT lab_name, {hour_expr}, COUNT(id) FROM reservations "
+        f"WHERE deleted_at IS NULL GROUP BY lab_name, {hour_expr}"
+    )
+
+    op.drop_index("ix_labs_id", table_name="labs")
+    op.drop_table("labs")
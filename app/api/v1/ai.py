@@ -1,107 +1,187 @@
-from fastapi import APIRouter, Body, HTTPException
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
-import os
-import openai
+import asyncio
+import json
 
-# ==========================================================
-# 💡 CARGA DE CONFIGURACIÓN Y VARIABLES DE ENTORNO
-# ==========================================================
-load_dotenv()  # Carga el .env (si estás corriendo localmente)
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.api.v1.endpoints.auth import get_current_user
+from app.core.config import settings
+from app.core.llm import LLMBusyError, LLMError, LLMTimeoutError, llm_client
+from app.crud.recommendation import suggest_reservations
+from app.crud.reservation import get_recent_reservations_async, search_reservation_history
+from app.db.session import get_async_db, get_db
+from app.models.user import User as UserModel
 
 router = APIRouter(prefix="/ai", tags=["Inteligencia Artificial"])
 
-# Clave de OpenAI (debe estar en tu archivo .env)
-openai.api_key = os.getenv("OPENAI_API_KEY")
+SYSTEM_PROMPT = "Eres un asistente experto en gestión de laboratorios y reservas."
+
+
+def build_context(rows) -> str:
+    """Resumen de reservas que se envía al modelo (una línea por reserva)."""
+    if not rows:
+        return "No hay registros recientes de reservas en la base de datos."
+    return "\n".join(
+        f"- {r.lab_name} reservado por {r.reserved_by} a las {r.start_time} ({r.purpose})"
+        for r in rows
+    )
+
 
-# Conexión a la base de datos PostgreSQL
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("❌ No se encontró DATABASE_URL en el entorno")
+def build_messages(question: str, context: str):
+    prompt = f"""
+    Actúa como un asistente del Sistema de Reservas de Laboratorio.
+    Datos recientes de reservas:
+    {context}
+
+    Usuario pregunta: "{question}"
+
+    Responde en español de forma clara, útil y profesional.
+    Si no hay datos suficientes, explica educadamente que no puedes inferirlo.
+    """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _question_from(message: dict) -> str:
+    question = (message.get("question") or "").strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Debe enviar una pregunta válida.")
+    return question
+
+
+async def _load_context(db: AsyncSession, question: str) -> str:
+    """
+    Contexto para el modelo: las reservas más relevantes para la pregunta según
+    el índice local; si ninguna comparte términos con ella, las más recientes.
+    """
+    k = settings.AI_CONTEXT_TOP_K
+    try:
+        rows = await asyncio.to_thread(search_reservation_history, question, k)
+        if not rows:
+            rows = await get_recent_reservations_async(db, limit=k)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al acceder a la base de datos: {str(e)}")
+    return build_context(rows)
 
-engine = create_engine(DATABASE_URL)
 
 # ==========================================================
 # 🧩 ENDPOINT PRINCIPAL — CHAT CON INTELIGENCIA ARTIFICIAL
 # ==========================================================
 @router.post("/chat-ia")
-async def chat_ai(message: dict = Body(...)):
+async def chat_ai(message: dict = Body(...), db: AsyncSession = Depends(get_async_db)):
     """
     Endpoint principal de IA.
     Recibe una pregunta y devuelve una respuesta contextual basada en los datos de reservas.
+    La llamada al modelo es async (no bloquea el event loop) y las preguntas
+    repetidas sobre los mismos datos se responden desde la caché.
     """
-    question = message.get("question", "").strip()
-    if not question:
-        raise HTTPException(status_code=400, detail="Debe enviar una pregunta válida.")
+    question = _question_from(message)
+    context = await _load_context(db, question)
 
-    # Recuperar datos recientes de reservas
     try:
-        with engine.connect() as conn:
-            query = text("""
-                SELECT lab_name, reserved_by, start_time
-                FROM reservation
-                ORDER BY start_time DESC
-                LIMIT 10
-            """)
-            rows = conn.execute(query).fetchall()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al acceder a la base de datos: {str(e)}")
+        respuesta, cached = await llm_client.answer(build_messages(question, context), question, context)
+    except LLMBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(e))
+    except LLMError as e:
+        raise HTTPException(status_code=500, detail=f"Error al comunicarse con el modelo de IA: {str(e)}")
 
-    # Generar resumen de contexto de las reservas
-    if not rows:
-        resumen = "No hay registros recientes de reservas en la base de datos."
-    else:
-        resumen = "\n".join(
-            f"- {r.lab_name} reservado por {r.reserved_by} a las {r.start_time}"
-            for r in rows
-        )
-
-    # Construir prompt para la IA
-    prompt = f"""
-    Actúa como un asistente del Sistema de Reservas de Laboratorio.
-    Datos recientes de reservas:
-    {resumen}
+    return {"respuesta": respuesta, "cache": cached}
 
-    Usuario pregunta: "{question}"
 
-    Responde en español de forma clara, útil y profesional.
-    Si no hay datos suficientes, explica educadamente que no puedes inferirlo.
+def _sse(data: dict, event: str = None) -> str:
+    """Formatea un evento Server-Sent Events."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat-ia/stream")
+async def chat_ai_stream(request: Request, message: dict = Body(...), db: AsyncSession = Depends(get_async_db)):
+    """
+    Igual que /ai/chat-ia, pero envía la respuesta como Server-Sent Events según
+    llegan los fragmentos del modelo:
+      data: {"token": "..."}            (uno por fragmento)
+      event: done  / data: {"cache": bool}
+      event: error / data: {"detail": "..."}
+    Si el cliente se desconecta se cierra el stream y se cancela la generación.
     """
+    question = _question_from(message)
+    context = await _load_context(db, question)
 
     try:
-        completion = openai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Eres un asistente experto en gestión de laboratorios y reservas."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=350,
-        )
-
-        respuesta = completion.choices[0].message.content.strip()
-        return {"respuesta": respuesta}
+        tokens, cached = await llm_client.start_stream(build_messages(question, context), question, context)
+    except LLMBusyError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "5"})
+
+    async def events():
+        try:
+            async for token in tokens:
+                if await request.is_disconnected():
+                    break
+                yield _sse({"token": token})
+            else:
+                yield _sse({"cache": cached}, event="done")
+        except LLMError as e:
+            yield _sse({"detail": str(e)}, event="error")
+        finally:
+            await tokens.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Sin caché ni buffering en proxies (nginx): cada fragmento sale al momento
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al comunicarse con OpenAI: {str(e)}")
 
 # ==========================================================
-# 🔹 ENDPOINT OPCIONAL — SUGERENCIA RÁPIDA (sin IA)
+# 🔹 SUGERENCIA RÁPIDA (sin IA, recomendador local)
 # ==========================================================
 @router.get("/sugerir")
-async def sugerir_reserva():
+def sugerir_reserva(
+    fecha: Optional[date] = None,
+    duracion_minutos: int = Query(60, ge=15, le=settings.RESERVATION_MAX_MINUTES),
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
     """
-    Endpoint alternativo sin conexión a OpenAI.
-    Devuelve una recomendación generada localmente.
+    Recomienda laboratorio y hora para `fecha` (por defecto, mañana) sin llamar
+    a ningún servicio externo: combina la ocupación histórica de cada
+    laboratorio por hora con el historial del usuario y solo propone huecos libres.
     """
-    try:
-        with engine.connect() as conn:
-            total = conn.execute(text("SELECT COUNT(*) FROM reservation")).scalar()
-    except Exception:
-        total = None
-
+    day = fecha or (datetime.now(timezone.utc).date() + timedelta(days=1))
+    picks = suggest_reservations(db, current_user.id, day, duracion_minutos)
+    if not picks:
+        return {
+            "laboratorio_recomendado": None,
+            "hora_sugerida": None,
+            "confianza": "0%",
+            "razon": "No hay huecos libres con los datos disponibles para esa fecha.",
+            "alternativas": [],
+        }
+
+    best = picks[0]
     return {
-        "laboratorio_recomendado": "Laboratorio de Robótica",
-        "hora_sugerida": "14:00",
-        "confianza": "92%" if total else "85%",
-        "razon": "Se recomienda por baja ocupación promedio y disponibilidad de equipos."
+        "laboratorio_recomendado": best["lab_name"],
+        "hora_sugerida": f"{best['hour']:02d}:00",
+        "confianza": f"{round(50 + 50 * best['score'])}%",
+        "razon": best["reason"],
+        "alternativas": [
+            {
+                "laboratorio": p["lab_name"],
+                "hora": f"{p['hour']:02d}:00",
+                "start_time": p["start_time"],
+                "end_time": p["end_time"],
+                "puntuacion": p["score"],
+            }
+            for p in picks
+        ],
     }
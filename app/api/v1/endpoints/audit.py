@@ -1,25 +1,64 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import Optional
 
-from app.schemas.audit_log import AuditLogOut
-from app.models.audit_log import AuditLog
-from app.db.session import get_db
+from app.schemas.audit_log import PaginatedAuditLogOut
+from app.core.versioning import AUDIT, check_not_modified
+from app.crud.audit_log import export_audit_logs_query, list_audit_logs_async
+from app.db.session import get_async_db, get_db
+from app.utils.export import ExportFormat, export_response
 from app.api.v1.endpoints.auth import get_current_user
+from app.utils.pagination import InvalidCursorError, decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/audit", tags=["Audit"])
 
-@router.get("/", response_model=List[AuditLogOut])
+def _audit_not_modified(
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
+    """ETag del registro de auditoría; 304 sin consultar si no hubo entradas nuevas."""
+    check_not_modified(request, response, AUDIT)
+
+
+@router.get("/", response_model=PaginatedAuditLogOut, dependencies=[Depends(_audit_not_modified)])
 async def read_audit_logs(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    before: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
     # Asegurarse de que el usuario está logueado para ver los logs
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Obtiene una lista de registros de auditoría.
+    Obtiene una lista de registros de auditoría, del más reciente al más antiguo.
+    Paginación por cursor: se pasa el `next_before` de la respuesta como `before`.
     (En un proyecto real, esto debería estar restringido solo a administradores).
     """
-    logs = db.query(AuditLog).order_by(AuditLog.timestamp.desc()).offset(skip).limit(limit).all()
-    return logs
\ No newline at end of file
+    try:
+        cursor_values = decode_cursor(before, datetime, int) if before else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    logs, next_values = await list_audit_logs_async(db, cursor_values, limit)
+    return {
+        "results": logs,
+        "size": len(logs),
+        "next_before": encode_cursor(*next_values) if next_values else None,
+    }
+
+
+@router.get("/export")
+def export_audit_logs(
+    fmt: ExportFormat = Query(ExportFormat.csv, alias="format"),
+    gzip: bool = False,
+    since: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Descarga el registro de auditoría completo (o desde `since`) en CSV o NDJSON,
+    en orden cronológico y en streaming.
+    """
+    return export_response(db, export_audit_logs_query(since), "auditoria", fmt, gzip)
@@ -1,15 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 
 from app.schemas.token import Token
 from app.schemas.user import UserCreate
-from app.core.security import create_access_token
+from app.core.security import PasswordPoolBusyError, create_access_token
 from app.core.config import settings
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.models.user import User as UserModel
-from app.crud.user import authenticate_user, get_user_by_username, create_user
+from app.crud.user import (
+    authenticate_user_async,
+    create_user_async,
+    get_user_by_username_async,
+    get_user_by_username_cached_async,
+)
 
 router = APIRouter(tags=["Auth"])
 
@@ -17,7 +22,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> UserModel:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -36,23 +41,38 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_username(db, username=username)
+    # Caché del usuario: en el caso normal no hay consulta a la base de datos
+    user = await get_user_by_username_cached_async(db, username=username)
     if user is None:
         raise credentials_exception
     return user
 
+def _busy_error() -> HTTPException:
+    """El pool de bcrypt está lleno: se rechaza rápido para no frenar al resto de peticiones."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Demasiados inicios de sesión simultáneos, inténtelo de nuevo en unos segundos",
+        headers={"Retry-After": "1"},
+    )
+
 @router.post("/auth/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    try:
+        user = await authenticate_user_async(db, form_data.username, form_data.password)
+    except PasswordPoolBusyError:
+        raise _busy_error()
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario o contraseña incorrectos")
     access_token = create_access_token({"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/auth/register", response_model=Token, status_code=status.HTTP_201_CREATED)
-def register_user(payload: UserCreate, db: Session = Depends(get_db)):
-    if get_user_by_username(db, payload.username):
+async def register_user(payload: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if await get_user_by_username_async(db, payload.username):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El nombre de usuario ya existe")
-    user = create_user(db, username=payload.username, password=payload.password, full_name=payload.full_name, email=payload.email)
+    try:
+        user = await create_user_async(db, username=payload.username, password=payload.password, full_name=payload.full_name, email=payload.email)
+    except PasswordPoolBusyError:
+        raise _busy_error()
     access_token = create_access_token({"sub": user.username})
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
@@ -1,36 +1,87 @@
-from fastapi import APIRouter, HTTPException
-from app.models.lab import Lab
-from app.schemas.lab import LabCreate, LabUpdate
-from app.crud.lab import create_lab, get_lab, update_lab, delete_lab, get_labs
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.orm import Session
+from typing import List
 
-router = APIRouter()
+from app.schemas.lab import LabCreate, LabOut, LabUpdate
+from app.models.user import User as UserModel
+from app.core.versioning import LABS, check_not_modified
+from app.crud import lab as crud_lab
+from app.db.session import get_db
+from app.api.v1.endpoints.auth import get_current_user
 
-@router.post("/", response_model=Lab)
-async def create_new_lab(lab: LabCreate):
-    return await create_lab(lab)
+router = APIRouter(prefix="/labs", tags=["Labs"])
 
-@router.get("/{lab_id}", response_model=Lab)
-async def read_lab(lab_id: int):
-    lab = await get_lab(lab_id)
+# Las lecturas salen del catálogo en memoria; los endpoints son síncronos
+# porque una recarga del catálogo (poco frecuente) consulta la base de datos.
+
+
+def _labs_not_modified(
+    request: Request,
+    response: Response,
+    current_user: UserModel = Depends(get_current_user)
+):
+    """ETag del catálogo; 304 sin tocar ni la memoria si no cambió."""
+    check_not_modified(request, response, LABS)
+
+
+def _duplicate_error(e: crud_lab.DuplicateLabError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.post("/", response_model=LabOut, status_code=status.HTTP_201_CREATED)
+def create_new_lab(
+    lab: LabCreate,
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    try:
+        return crud_lab.create_lab(db, lab)
+    except crud_lab.DuplicateLabError as e:
+        raise _duplicate_error(e)
+
+
+@router.get("/", response_model=List[LabOut], dependencies=[Depends(_labs_not_modified)])
+def read_labs(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    include_inactive: bool = False,
+    current_user: UserModel = Depends(get_current_user)
+):
+    """Laboratorios por nombre (solo los activos, salvo include_inactive=true)."""
+    return crud_lab.get_labs(skip=skip, limit=limit, include_inactive=include_inactive)
+
+
+@router.get("/{lab_id}", response_model=LabOut, dependencies=[Depends(_labs_not_modified)])
+def read_lab(lab_id: int, current_user: UserModel = Depends(get_current_user)):
+    lab = crud_lab.get_lab(lab_id)
     if lab is None:
-        raise HTTPException(status_code=404, detail="Lab not found")
+        raise HTTPException(status_code=404, detail="Laboratorio no encontrado")
     return lab
 
-@router.put("/{lab_id}", response_model=Lab)
-async def update_existing_lab(lab_id: int, lab: LabUpdate):
-    updated_lab = await update_lab(lab_id, lab)
+
+@router.put("/{lab_id}", response_model=LabOut)
+def update_existing_lab(
+    lab_id: int,
+    lab: LabUpdate,
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    try:
+        updated_lab = crud_lab.update_lab(db, lab_id, lab)
+    except crud_lab.DuplicateLabError as e:
+        raise _duplicate_error(e)
     if updated_lab is None:
-        raise HTTPException(status_code=404, detail="Lab not found")
+        raise HTTPException(status_code=404, detail="Laboratorio no encontrado")
     return updated_lab
 
+
 @router.delete("/{lab_id}", response_model=dict)
-async def delete_existing_lab(lab_id: int):
-    result = await delete_lab(lab_id)
-    if not result:
-        raise HTTPException(status_code=404, detail="Lab not found")
-    return {"detail": "Lab deleted successfully"}
-
-@router.get("/", response_model=list[Lab])
-async def read_labs(skip: int = 0, limit: int = 10):
-    labs = await get_labs(skip=skip, limit=limit)
-    return labs
\ No newline at end of file
+def delete_existing_lab(
+    lab_id: int,
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    """Baja lógica: conserva el historial de reservas, pero no admite nuevas."""
+    if not crud_lab.delete_lab(db, lab_id):
+        raise HTTPException(status_code=404, detail="Laboratorio no encontrado")
+    return {"detail": "Laboratorio dado de baja"}
@@ -1,21 +1,67 @@
-import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-# --- IMPORTACIONES AÑADIDAS (para Soft Delete y Análisis) ---
-from sqlalchemy import cast, Date as SQLDate, func, extract 
 from typing import List, Optional, Dict, Any # <-- Se añadió Dict y Any
-from datetime import date
+from datetime import date, datetime, time, timedelta, timezone
 
 from app.schemas import reservation as schemas
+from app.schemas.analytics import OccupancyHeatmapOut
 from app.models.user import User as UserModel
-from app.models.reservation import Reservation as ReservationModel
-from app.db.session import get_db
+from app.core.audit import audit_sink
+from app.core.versioning import RESERVATIONS, check_not_modified, user_scope
+from app.crud import reservation as crud_reservation
+from app.crud import rollup as crud_rollup
+from app.crud import search as crud_search
+from app.crud.lab import LabNotAvailableError
+from app.db.session import get_async_db, get_db
+from app.core.config import settings
+from app.utils.export import ExportFormat, export_response
+from app.utils.pagination import InvalidCursorError, decode_cursor, encode_cursor
 from app.api.v1.endpoints.auth import get_current_user
 
 router = APIRouter(prefix="/reservations", tags=["Reservations"])
 
 
+def _conflict_error(e: crud_reservation.ReservationConflictError) -> HTTPException:
+    """Traduce un choque de horario a una respuesta 409."""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={
+            "message": "El laboratorio ya está reservado en ese horario",
+            "conflicting_ids": e.conflicting_ids,
+        }
+    )
+
+
+def _own_reservations_not_modified(
+    request: Request,
+    response: Response,
+    current_user: UserModel = Depends(get_current_user)
+):
+    """ETag de las reservas del usuario; 304 antes de abrir la base si no cambiaron."""
+    check_not_modified(request, response, user_scope(RESERVATIONS, current_user.id))
+
+
+def _search_not_modified(
+    request: Request,
+    response: Response,
+    current_user: UserModel = Depends(get_current_user)
+):
+    """ETag de la búsqueda: el de las reservas propias, o el global si se busca en todas."""
+    scope = RESERVATIONS if settings.RESERVATION_SEARCH_ALL_USERS else user_scope(RESERVATIONS, current_user.id)
+    check_not_modified(request, response, scope)
+
+
+def _all_reservations_not_modified(
+    request: Request,
+    response: Response,
+    current_user: UserModel = Depends(get_current_user)
+):
+    """ETag de los análisis globales (cambian con cualquier reserva)."""
+    check_not_modified(request, response, RESERVATIONS)
+
+
 @router.post(
     "/",
     response_model=schemas.ReservationOut,
@@ -23,72 +69,176 @@ router = APIRouter(prefix="/reservations", tags=["Reservations"])
 )
 async def create_reservation(
     reservation: schemas.ReservationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
     Crea una nueva reserva.
+    Devuelve 409 si el laboratorio ya está reservado en ese intervalo.
     """
-    db_reservation = ReservationModel(
-        lab_name=reservation.lab_name,
-        reserved_by=reservation.reserved_by,
-        purpose=reservation.purpose,
-        start_time=reservation.start_time,
-        active=reservation.active,
-        owner_id=current_user.id
-    )
-    
     try:
-        db.add(db_reservation)
-        db.commit()
-        db.refresh(db_reservation)
-        return db_reservation
+        db_reservation = await crud_reservation.create_reservation_async(db, reservation, owner_id=current_user.id)
+    except crud_reservation.ReservationConflictError as e:
+        raise _conflict_error(e)
+    except LabNotAvailableError as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error real al guardar en DB: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error al crear reserva en la base de datos"
         )
 
+    await audit_sink.record_async(
+        current_user.id, "CREATE", "Reservation", db_reservation.id,
+        {"lab_name": db_reservation.lab_name, "start_time": db_reservation.start_time.isoformat()}
+    )
+    return db_reservation
+
 # --- ENDPOINT DE FILTROS CORREGIDO (con Soft Delete) ---
-@router.get("/", response_model=List[schemas.ReservationOut])
+@router.get(
+    "/",
+    response_model=schemas.PaginatedReservationOut,
+    dependencies=[Depends(_own_reservations_not_modified)]
+)
 async def get_my_reservations(
     lab_name: Optional[str] = None,
     start_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
     Obtiene las reservas (no borradas) del usuario actual, con filtros opcionales.
+    Paginación por cursor sobre (start_time, id): cada página cuesta lo mismo
+    sin importar lo profunda que sea.
     """
-    query = db.query(ReservationModel).filter(
-        ReservationModel.owner_id == current_user.id,
-        ReservationModel.deleted_at == None # <-- FILTRO AÑADIDO (Soft Delete)
+    try:
+        cursor_values = decode_cursor(cursor, datetime, int) if cursor else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    reservations, next_values, total = await crud_reservation.list_reservations_async(
+        db,
+        current_user.id,
+        lab_name=lab_name,
+        start_date=start_date,
+        cursor_values=cursor_values,
+        limit=limit,
+        include_total=include_total,
     )
-    
-    if lab_name:
-        query = query.filter(ReservationModel.lab_name.ilike(f"%{lab_name}%"))
-    
-    if start_date:
-        query = query.filter(cast(ReservationModel.start_time, SQLDate) == start_date)
-        
-    reservations = query.all()
-    return reservations
+    return {
+        "results": reservations,
+        "size": len(reservations),
+        "next_cursor": encode_cursor(*next_values) if next_values else None,
+        "total": total,
+    }
+
+
+# Declarado antes de /{id} (igual que /export)
+@router.get("/availability", response_model=schemas.AvailabilityOut)
+def get_availability(
+    labs: List[str] = Query(..., alias="lab", description="Laboratorio (se puede repetir)"),
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    duration_minutes: int = Query(60, ge=1, le=settings.RESERVATION_MAX_MINUTES),
+    open_hour: int = Query(8, ge=0, le=23),
+    close_hour: int = Query(20, ge=1, le=24),
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    """
+    Busca huecos libres de al menos `duration_minutes` en los laboratorios pedidos,
+    dentro del horario [open_hour, close_hour) UTC de cada día entre start_date y
+    end_date. Se resuelve con los bitsets de ocupación por laboratorio y día.
+    """
+    if end_date < start_date or close_hour <= open_hour:
+        raise HTTPException(status_code=400, detail="Rango de fechas u horario inválido")
+    if (end_date - start_date).days >= settings.AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"El rango no puede superar {settings.AVAILABILITY_MAX_DAYS} días")
+    labs = list(dict.fromkeys(labs))
+    if len(labs) > settings.AVAILABILITY_MAX_LABS:
+        raise HTTPException(status_code=400, detail=f"Como máximo {settings.AVAILABILITY_MAX_LABS} laboratorios")
+
+    results = crud_reservation.find_free_slots(
+        db, labs, start_date, end_date, duration_minutes, open_hour, close_hour
+    )
+    return {"slot_minutes": settings.AVAILABILITY_SLOT_MINUTES, "labs": results}
+
+
+# Declarado antes de /{id} para que "search" no se tome como un id
+@router.get(
+    "/search",
+    response_model=schemas.PaginatedReservationSearchOut,
+    dependencies=[Depends(_search_not_modified)]
+)
+async def search_reservations(
+    q: str = Query(..., min_length=2, max_length=200, description="Texto a buscar en propósito y persona"),
+    mine: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    """
+    Busca reservas vigentes por propósito y por quién las hizo, de más a menos
+    relevante. Solo las propias, salvo con RESERVATION_SEARCH_ALL_USERS (entonces
+    mine=true vuelve a limitarla a las propias). Índice de texto completo
+    (tsvector/GIN en PostgreSQL, FTS5 en SQLite) y paginación por cursor.
+    """
+    try:
+        cursor_values = decode_cursor(cursor, float, int) if cursor else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    owner_id = None if settings.RESERVATION_SEARCH_ALL_USERS and not mine else current_user.id
+    hits, next_values = await crud_search.search_reservations_async(
+        db, q, owner_id=owner_id, cursor_values=cursor_values, limit=limit
+    )
+    results = [
+        {**schemas.ReservationOut.model_validate(reservation).model_dump(), "score": score}
+        for reservation, score in hits
+    ]
+    return {
+        "results": results,
+        "size": len(results),
+        "next_cursor": encode_cursor(*next_values) if next_values else None,
+    }
+
+
+# Declarado antes de /{id} para que "export" no se tome como un id
+@router.get("/export")
+def export_my_reservations(
+    fmt: ExportFormat = Query(ExportFormat.csv, alias="format"),
+    gzip: bool = False,
+    include_deleted: bool = False,
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    """
+    Descarga todas las reservas del usuario en CSV o NDJSON (opcionalmente .gz).
+    Se genera en streaming: no se cargan todas las filas en memoria.
+    """
+    stmt = crud_reservation.export_reservations_query(current_user.id, include_deleted)
+    return export_response(db, stmt, "reservas", fmt, gzip)
 
 
 # --- (Corregido con Soft Delete) ---
-@router.get("/{id}", response_model=schemas.ReservationOut)
+@router.get(
+    "/{id}",
+    response_model=schemas.ReservationOut,
+    dependencies=[Depends(_own_reservations_not_modified)]
+)
 async def get_reservation_by_id(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user)
 ):
-    db_reservation = db.query(ReservationModel).filter(
-        ReservationModel.id == id, 
-        ReservationModel.owner_id == current_user.id,
-        ReservationModel.deleted_at == None # <-- FILTRO AÑADIDO (Soft Delete)
-    ).first()
+    db_reservation = await crud_reservation.get_reservation_by_id_async(db, id, current_user.id)
     
     if not db_reservation:
         raise HTTPException(status_code=404, detail="Reserva no encontrada o sin permisos")
@@ -99,26 +249,27 @@ async def get_reservation_by_id(
 async def update_reservation(
     id: int,
     reservation_in: schemas.ReservationUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     # Solo se puede actualizar si no está borrada
-    db_reservation = db.query(ReservationModel).filter(
-        ReservationModel.id == id, 
-        ReservationModel.owner_id == current_user.id,
-        ReservationModel.deleted_at == None # <-- FILTRO AÑADIDO (Soft Delete)
-    ).first()
+    db_reservation = await crud_reservation.get_reservation_by_id_async(db, id, current_user.id)
     
     if not db_reservation:
         raise HTTPException(status_code=404, detail="Reserva no encontrada o sin permisos")
         
-    update_data = reservation_in.model_dump(exclude_unset=True)
-    
-    for key, value in update_data.items():
-        setattr(db_reservation, key, value)
-    
-    db.commit()
-    db.refresh(db_reservation)
+    try:
+        db_reservation = await crud_reservation.update_reservation_async(db, db_reservation, reservation_in)
+    except crud_reservation.ReservationConflictError as e:
+        raise _conflict_error(e)
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    await audit_sink.record_async(
+        current_user.id, "UPDATE", "Reservation", db_reservation.id,
+        {"fields": sorted(reservation_in.model_dump(exclude_unset=True))}
+    )
     return db_reservation
 
 
@@ -126,68 +277,75 @@ async def update_reservation(
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_reservation(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
     Realiza un borrado suave (soft delete) de una reserva.
     """
-    db_reservation = db.query(ReservationModel).filter(
-        ReservationModel.id == id, 
-        ReservationModel.owner_id == current_user.id,
-        ReservationModel.deleted_at == None # <-- Solo se puede borrar si no está ya borrada
-    ).first()
+    # Solo se puede borrar si no está ya borrada
+    db_reservation = await crud_reservation.get_reservation_by_id_async(db, id, current_user.id)
 
     if not db_reservation:
         raise HTTPException(status_code=404, detail="Reserva no encontrada o sin permisos")
 
-    # En lugar de borrar, marcamos la fecha de borrado
-    db_reservation.deleted_at = datetime.datetime.utcnow() # Asegúrate de usar datetime.datetime
-    db.commit()
+    # En lugar de borrar, marcamos la fecha de borrado (y liberamos el intervalo)
+    await crud_reservation.soft_delete_reservation_async(db, db_reservation)
+    await audit_sink.record_async(current_user.id, "DELETE", "Reservation", db_reservation.id)
     return
 
 
 # --- ¡AQUÍ ESTÁ EL NUEVO ENDPOINT DE ANÁLISIS! ---
 
-@router.get("/analysis/popular-times", response_model=Dict[str, Any])
+@router.get(
+    "/analysis/popular-times",
+    response_model=Dict[str, Any],
+    dependencies=[Depends(_all_reservations_not_modified)]
+)
 async def get_popular_times(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user) # Asegura que esté logueado
 ):
     """
     Realiza un análisis de popularidad de horas y laboratorios.
-    (Filtra por reservas no borradas)
+    (Solo reservas no borradas; se lee de los rollups, no de la tabla completa)
     """
     try:
-        # 1. Consulta para horas populares (solo de reservas no borradas)
-        popular_hours_query = (
-            db.query(
-                extract("hour", ReservationModel.start_time).label("hour"),
-                func.count(ReservationModel.id).label("count"),
-            )
-            .filter(ReservationModel.deleted_at == None) # <-- FILTRO AÑADIDO
-            .group_by(extract("hour", ReservationModel.start_time))
-            .order_by(extract("hour", ReservationModel.start_time))
-            .all()
-        )
-        
-        # 2. Consulta para labs populares (solo de reservas no borradas)
-        popular_labs_query = (
-            db.query(
-                ReservationModel.lab_name,
-                func.count(ReservationModel.id).label("count"),
-            )
-            .filter(ReservationModel.deleted_at == None) # <-- FILTRO AÑADIDO
-            .group_by(ReservationModel.lab_name)
-            .order_by(func.count(ReservationModel.id).desc())
-            .all()
-        )
-
-        popular_hours = [{"hour": row.hour, "count": row.count} for row in popular_hours_query]
-        popular_labs = [{"lab_name": row.lab_name, "count": row.count} for row in popular_labs_query]
-
-        return {"popular_hours": popular_hours, "popular_labs": popular_labs}
+        return await crud_rollup.get_popular_times_async(db)
 
     except Exception as e:
         print(f"Error durante el análisis: {e}")
-        raise HTTPException(status_code=500, detail="Error al procesar el análisis")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Error al procesar el análisis")
+
+# Endpoint síncrono a propósito: el cálculo con NumPy es CPU y así corre en el
+# threadpool de FastAPI en lugar de bloquear el event loop.
+@router.get(
+    "/analysis/occupancy",
+    response_model=OccupancyHeatmapOut,
+    dependencies=[Depends(_all_reservations_not_modified)]
+)
+def get_occupancy_heatmap(
+    start_date: date,
+    end_date: date,
+    lab_name: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    """
+    Mapa de calor de ocupación laboratorio × día de la semana × hora (UTC) entre
+    start_date y end_date (ambos incluidos), con percentiles de antelación.
+    """
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date debe ser posterior o igual a start_date")
+    if (end_date - start_date).days >= settings.ANALYTICS_MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El rango no puede superar {settings.ANALYTICS_MAX_RANGE_DAYS} días"
+        )
+
+    start = datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    # numpy solo se importa al pedir el primer análisis (arranque más rápido)
+    from app.crud import analytics as crud_analytics
+
+    return crud_analytics.occupancy_heatmap(db, start, end, lab_name=lab_name)
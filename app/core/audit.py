@@ -0,0 +1,170 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.versioning import AUDIT, bump_version
+from app.crud.audit_log import build_audit_row, insert_audit_rows
+from app.db.session import SessionLocal
+
+
+class AuditSink:
+    """
+    Buffer de auditoría en memoria con escritura por lotes.
+
+    - record() solo encola la entrada; un hilo la inserta junto con otras en un
+      único INSERT multi-fila cuando se alcanza batch_size o pasa flush_interval.
+    - Si hay max_pending entradas sin escribir, quien registra vacía el buffer
+      él mismo (backpressure) en lugar de dejarlo crecer sin límite.
+    - Las acciones "durables" (o todas, con sync=True) se escriben al momento.
+    - shutdown() escribe lo pendiente antes de que el proceso termine.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        max_pending: int = 10_000,
+        durable_actions: Optional[set] = None,
+        sync: bool = False,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.durable_actions = durable_actions or set()
+        self.sync = sync
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    # --- API pública ---
+
+    def record(
+        self,
+        user_id: int,
+        action: str,
+        target_model: str,
+        target_id: int,
+        details: dict = None,
+        durable: Optional[bool] = None,
+    ) -> None:
+        row = build_audit_row(user_id, action, target_model, target_id, details)
+        if durable is None:
+            durable = action in self.durable_actions
+        if durable or self.sync:
+            self._write([row])
+            return
+
+        with self._cond:
+            self._pending.append(row)
+            pending = len(self._pending)
+            if pending >= self.batch_size:
+                self._cond.notify()
+        if pending >= self.max_pending:
+            self.flush()
+
+    async def record_async(
+        self,
+        user_id: int,
+        action: str,
+        target_model: str,
+        target_id: int,
+        details: dict = None,
+        durable: Optional[bool] = None,
+    ) -> None:
+        """Como record(), pero las escrituras inmediatas van a un hilo y no bloquean el event loop."""
+        if durable is None:
+            durable = action in self.durable_actions
+        if durable or self.sync or self.pending() + 1 >= self.max_pending:
+            await asyncio.to_thread(self.record, user_id, action, target_model, target_id, details, durable)
+        else:
+            self.record(user_id, action, target_model, target_id, details, durable)
+
+    def flush(self) -> int:
+        """Escribe todo lo pendiente. Devuelve cuántas filas se insertaron."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return written
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    print(f"⚠️ Error al escribir auditoría ({len(batch)} entradas): {e}")
+                    self._requeue(batch)
+                    return written
+                written += len(batch)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    # --- Internos ---
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._pending) < self.batch_size:
+                    self._cond.wait(timeout=self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                return
+
+    def _take_batch(self) -> List[dict]:
+        with self._cond:
+            n = min(self.batch_size, len(self._pending))
+            return [self._pending.popleft() for _ in range(n)]
+
+    def _requeue(self, batch: List[dict]) -> None:
+        with self._cond:
+            # Se devuelven al frente respetando el tope; lo que no cabe se descarta.
+            room = max(self.max_pending - len(self._pending), 0)
+            for row in reversed(batch[:room]):
+                self._pending.appendleft(row)
+
+    def _write(self, rows: List[dict]) -> None:
+        db = self.session_factory()
+        try:
+            insert_audit_rows(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        bump_version(AUDIT)
+
+
+# Instancia compartida por el proceso
+audit_sink = AuditSink(
+    session_factory=SessionLocal,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval=settings.AUDIT_FLUSH_SECONDS,
+    max_pending=settings.AUDIT_MAX_PENDING,
+    durable_actions={a.strip() for a in settings.AUDIT_DURABLE_ACTIONS.split(",") if a.strip()},
+)
@@ -1,9 +1,129 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
 import redis
 from app.core.config import settings
+from app.core.metrics import redis_command_duration_seconds
+
+
+class TimedRedis(redis.Redis):
+    """Cliente de Redis que registra la duración de cada comando en /metrics."""
+
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = super().execute_command(*args, **options)
+            outcome = "ok"
+            return result
+        finally:
+            redis_command_duration_seconds.observe(time.perf_counter() - started, str(args[0]).upper(), outcome)
+
 
 # Crea una conexión a Redis que se reutilizará en toda la aplicación
-redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+redis_client = TimedRedis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+)
 
 def get_redis_client():
     """Devuelve el cliente de Redis."""
     return redis_client
+
+
+class LocalTTLCache:
+    """Caché en memoria del proceso, con tamaño máximo (LRU) y caducidad por entrada."""
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# Respaldo en memoria cuando Redis no está disponible
+local_cache = LocalTTLCache(maxsize=settings.LOCAL_CACHE_MAX_ENTRIES)
+
+# Si Redis falla, no se reintenta hasta pasado REDIS_RETRY_SECONDS
+# (así una caída de Redis no añade un timeout a cada petición).
+_redis_down_until = 0.0
+
+
+def active_redis() -> Optional[redis.Redis]:
+    """Devuelve el cliente de Redis o None si se marcó como caído recientemente."""
+    if time.monotonic() < _redis_down_until:
+        return None
+    return redis_client
+
+
+def mark_redis_down(error: Exception) -> None:
+    global _redis_down_until
+    if time.monotonic() >= _redis_down_until:
+        print(f"⚠️ Redis no disponible, usando caché local: {error}")
+    _redis_down_until = time.monotonic() + settings.REDIS_RETRY_SECONDS
+
+
+def cache_get_json(key: str) -> Optional[Any]:
+    """Lee un valor JSON de Redis (o de la caché local si Redis no responde)."""
+    client = active_redis()
+    if client is not None:
+        try:
+            raw = client.get(key)
+            return json.loads(raw) if raw is not None else None
+        except redis.RedisError as e:
+            mark_redis_down(e)
+    return local_cache.get(key)
+
+
+def cache_set_json(key: str, value: Any, ttl: int) -> None:
+    client = active_redis()
+    if client is not None:
+        try:
+            client.set(key, json.dumps(value), ex=ttl)
+            return
+        except redis.RedisError as e:
+            mark_redis_down(e)
+    local_cache.set(key, value, ttl)
+
+
+def cache_delete(*keys: str) -> None:
+    """Invalida las claves en Redis y también en la caché local."""
+    local_cache.delete(*keys)
+    client = active_redis()
+    if client is not None:
+        try:
+            client.delete(*keys)
+        except redis.RedisError as e:
+            mark_redis_down(e)
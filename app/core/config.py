@@ -1,18 +1,133 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
     # === Base de datos ===
     DATABASE_URL: str
+    # Cada worker tiene dos engines, cada uno con su pool: el síncrono (DB_POOL_*)
+    # y el async (DB_ASYNC_POOL_*). Conexiones máximas por worker:
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW;
+    # por el número de workers debe quedar por debajo de max_connections de PostgreSQL.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_ASYNC_POOL_SIZE: int = 5
+    DB_ASYNC_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: float = 10.0
+    # Segundos antes de reciclar una conexión (menos que el idle timeout del servidor)
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # === Arranque ===
+    # false (por defecto): el esquema lo gestiona Alembic y `python -m app.db.init_db`
+    # se lanza una vez por despliegue; los workers arrancan sin tocar la base de datos.
+    # true: cada worker crea tablas, admin y particiones al arrancar (desarrollo;
+    # docker-compose.yml lo activa).
+    DB_AUTO_INIT: bool = False
+    # Segundos de import + arranque por encima de los cuales se avisa en el log
+    STARTUP_TIME_BUDGET_SECONDS: float = 1.5
+    # Middleware de métricas y GET /metrics (formato Prometheus)
+    METRICS_ENABLED: bool = True
+
+    # === Perfilado (solo depuración) ===
+    # Activa la cabecera X-Profile y el muestreo; nunca en un entorno público
+    PROFILING_ENABLED: bool = False
+    # Fracción de peticiones que se perfilan sin cabecera (0 = ninguna)
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_SECONDS: float = 0.005
+    PROFILE_DIR: str = "profiles"
+    # Veces que debe repetirse una misma sentencia para marcarla como N+1
+    PROFILE_N_PLUS_ONE_THRESHOLD: int = 5
 
     # === Redis ===
     REDIS_URL: str = "redis://redis:6379"
+    REDIS_SOCKET_TIMEOUT: float = 0.5
+    # Tras un fallo, segundos sin intentar Redis (se usa la caché local)
+    REDIS_RETRY_SECONDS: int = 30
+    LOCAL_CACHE_MAX_ENTRIES: int = 10_000
 
     # === JWT ===
     SECRET_KEY: str = "CAMBIAR_POR_UNA_SECRET_REAL"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24
+    # Coste de bcrypt; si cambia, los hashes se regeneran al iniciar sesión
+    BCRYPT_ROUNDS: int = 12
+    # Hilos dedicados a bcrypt y máximo de operaciones en cola (más => 503)
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32
+    # Segundos que se cachea el usuario autenticado (se invalida al editarlo/borrarlo)
+    AUTH_USER_CACHE_TTL: int = 60
+
+    # === Reservas ===
+    # Duración usada cuando el cliente no envía end_time
+    RESERVATION_DEFAULT_MINUTES: int = 60
+    # Duración máxima de una reserva (acota la búsqueda de choques en la BD)
+    RESERVATION_MAX_MINUTES: int = 12 * 60
+    # /reservations/search busca solo en las reservas propias; true: en las de
+    # todos los usuarios (instalaciones donde todos pueden verlo todo)
+    RESERVATION_SEARCH_ALL_USERS: bool = False
+
+    # Granularidad de los bitsets de disponibilidad (debe dividir 60)
+    AVAILABILITY_SLOT_MINUTES: int = 15
+    # Límites de una búsqueda de huecos libres
+    AVAILABILITY_MAX_DAYS: int = 31
+    AVAILABILITY_MAX_LABS: int = 20
+
+    # === Laboratorios ===
+    # Una reserva con un lab_name desconocido da de alta el laboratorio (si no, 422)
+    LAB_AUTO_CREATE: bool = True
+    # Cada cuánto (segundos) se comprueba si otro worker cambió el catálogo
+    LAB_CATALOG_CHECK_SECONDS: float = 2.0
+
+    # === Analítica ===
+    # Filas por bloque al leer reservations para el mapa de ocupación
+    ANALYTICS_CHUNK_ROWS: int = 50_000
+    ANALYTICS_MAX_RANGE_DAYS: int = 2 * 366
+
+    # === Exportación ===
+    # Filas leídas del cursor del servidor por cada bloque escrito en la respuesta
+    EXPORT_CHUNK_ROWS: int = 5_000
+
+    # === Auditoría ===
+    # Las entradas se acumulan en memoria y se insertan en lote al llegar a
+    # AUDIT_BATCH_SIZE o cada AUDIT_FLUSH_SECONDS, lo que ocurra primero.
+    AUDIT_BATCH_SIZE: int = 200
+    AUDIT_FLUSH_SECONDS: float = 2.0
+    # Con más entradas pendientes, quien registra vacía el buffer él mismo (backpressure)
+    AUDIT_MAX_PENDING: int = 10_000
+    # Acciones que se escriben de inmediato (separadas por coma)
+    AUDIT_DURABLE_ACTIONS: str = "DELETE"
+    # Particiones mensuales que se crean por adelantado (PostgreSQL)
+    AUDIT_PARTITION_MONTHS_AHEAD: int = 3
+
+    # === Caché HTTP (ETag) ===
+    # Vida de las marcas de versión en Redis; si caducan se genera otra
+    # (los clientes reciben un 200 completo y siguen con la nueva).
+    VERSION_STAMP_TTL: int = 24 * 60 * 60
+    # Sin Redis cada worker solo ve sus propias escrituras: las marcas locales
+    # duran poco para acotar cuánto puede tardar otro worker en notar un cambio.
+    VERSION_STAMP_LOCAL_TTL: int = 5
+
+    # === Límite de peticiones y descarte de carga ===
+    # Cubetas de tokens por usuario (o por IP sin token) en Redis; sin Redis,
+    # por worker. Formato "N/second", "N/minute" o "N/hour" (N = ráfaga máxima).
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_DEFAULT: str = "300/minute"
+    # Límites adicionales por "MÉTODO ruta" (plantilla tal cual en el router)
+    RATE_LIMIT_ROUTES: Dict[str, str] = {
+        "POST /reservations/": "30/minute",
+        "PUT /reservations/{id}": "60/minute",
+        "POST /ai/chat-ia": "10/minute",
+        "POST /ai/chat-ia/stream": "10/minute",
+        "POST /auth/token": "20/minute",
+    }
+    # Prefijos sin límite ni descarte (sondas del balanceador, métricas, estáticos)
+    RATE_LIMIT_EXEMPT_PREFIXES: str = "/health,/metrics,/static"
+    # 503 inmediato por encima de estas cotas (por worker; 0 = sin cota)
+    LOAD_SHED_ENABLED: bool = True
+    LOAD_SHED_MAX_IN_FLIGHT: int = 256
+    LOAD_SHED_POOL_WAIT_SECONDS: float = 1.0
+    LOAD_SHED_RETRY_AFTER_SECONDS: int = 2
 
     # === CORS (Frontend) ===
     CORS_ORIGINS: str = "http://localhost:5173,http://127.0.0.1:5173"
@@ -20,6 +135,19 @@ class Settings(BaseSettings):
     # === OpenAI (IA de pago) ===
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: Optional[str] = "gpt-4o-mini"
+    # "openai" o "local" (modelo de prueba sin red); vacío = openai si hay API key
+    LLM_PROVIDER: Optional[str] = None
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    LLM_MAX_RETRIES: int = 1
+    # Llamadas simultáneas al modelo por worker y cuánto se espera por una plaza
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 5.0
+    # Respuestas cacheadas por (pregunta normalizada, contexto)
+    LLM_CACHE_TTL: int = 10 * 60
+    # Reservas que se pasan como contexto: las k más relevantes para la pregunta
+    AI_CONTEXT_TOP_K: int = 10
+    # Archivo JSON donde guardar el índice de búsqueda (vacío = solo en memoria)
+    RETRIEVAL_INDEX_PATH: Optional[str] = None
 
     # === Frontend (para API URL) ===
     VITE_API_URL: Optional[str] = "http://localhost:8000"
@@ -0,0 +1,267 @@
+"""
+Cliente de modelos de lenguaje para los endpoints de IA.
+
+- Proveedor intercambiable: OpenAI (AsyncOpenAI, conexiones reutilizadas) o un
+  modelo local de prueba que no sale de la máquina (tests, entornos sin red).
+- Límite de llamadas simultáneas y timeout por respuesta: un proveedor lento
+  no acumula peticiones colgadas ni bloquea el event loop.
+- Caché con TTL (Redis o memoria) por hash de la pregunta normalizada más el
+  contexto de reservas: la misma pregunta sobre los mismos datos no vuelve a
+  llamar al modelo.
+"""
+import asyncio
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.cache import cache_get_json, cache_set_json
+from app.core.config import settings
+from app.core.metrics import ai_cache_total, ai_request_duration_seconds
+
+Messages = List[Dict[str, str]]
+
+
+class LLMError(Exception):
+    """Fallo del proveedor al generar la respuesta."""
+
+
+class LLMTimeoutError(LLMError):
+    """El proveedor no respondió dentro de LLM_TIMEOUT_SECONDS."""
+
+
+class LLMBusyError(LLMError):
+    """Todas las plazas de LLM_MAX_CONCURRENCY siguen ocupadas tras esperar."""
+
+
+class LLMProvider(ABC):
+    """Interfaz mínima de un proveedor: dado el chat, devuelve el texto."""
+
+    name = "base"
+
+    @abstractmethod
+    async def complete(self, messages: Messages, max_tokens: int) -> str:
+        """Respuesta completa del modelo."""
+
+    async def stream(self, messages: Messages, max_tokens: int) -> AsyncIterator[str]:
+        """Fragmentos de la respuesta según se generan (por defecto, uno solo)."""
+        yield await self.complete(messages, max_tokens)
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str], model: str):
+        self.api_key = api_key
+        self.model = model
+        self._client = None
+        self._loop = None
+
+    def _get_client(self):
+        # El cliente (y su pool de conexiones) pertenece a un event loop
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            from openai import AsyncOpenAI
+
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                max_retries=settings.LLM_MAX_RETRIES,
+            )
+            self._loop = loop
+        return self._client
+
+    async def complete(self, messages: Messages, max_tokens: int) -> str:
+        from openai import APIError, APITimeoutError
+
+        try:
+            completion = await self._get_client().chat.completions.create(
+                model=self.model, messages=messages, max_tokens=max_tokens
+            )
+        except APITimeoutError as e:
+            raise LLMTimeoutError(str(e)) from e
+        except APIError as e:
+            raise LLMError(str(e)) from e
+        return (completion.choices[0].message.content or "").strip()
+
+    async def stream(self, messages: Messages, max_tokens: int) -> AsyncIterator[str]:
+        from openai import APIError, APITimeoutError
+
+        try:
+            response = await self._get_client().chat.completions.create(
+                model=self.model, messages=messages, max_tokens=max_tokens, stream=True
+            )
+        except APITimeoutError as e:
+            raise LLMTimeoutError(str(e)) from e
+        except APIError as e:
+            raise LLMError(str(e)) from e
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except APIError as e:
+            raise LLMError(str(e)) from e
+        finally:
+            # Cerrar la respuesta HTTP corta la generación en OpenAI
+            await response.close()
+
+
+class LocalStubProvider(LLMProvider):
+    """
+    Modelo local determinista: resume el contexto recibido sin ninguna llamada
+    externa. Sirve para tests y para instalaciones sin acceso a OpenAI.
+    """
+
+    name = "local"
+
+    async def complete(self, messages: Messages, max_tokens: int) -> str:
+        prompt = messages[-1]["content"] if messages else ""
+        context = [line.strip() for line in prompt.splitlines() if line.strip().startswith("- ")]
+        if not context:
+            return "No hay datos de reservas suficientes para responder a esa pregunta."
+        answer = f"Según las {len(context)} reservas consultadas: " + "; ".join(
+            line[2:] for line in context[:3]
+        )
+        return answer[: max_tokens * 4]
+
+    async def stream(self, messages: Messages, max_tokens: int) -> AsyncIterator[str]:
+        words = (await self.complete(messages, max_tokens)).split(" ")
+        for i, word in enumerate(words):
+            yield word if i == 0 else " " + word
+            await asyncio.sleep(0)
+
+
+def build_provider() -> LLMProvider:
+    """LLM_PROVIDER manda; si no se indica, OpenAI solo cuando hay API key."""
+    choice = settings.LLM_PROVIDER or ("openai" if settings.OPENAI_API_KEY else "local")
+    if choice == "openai":
+        return OpenAIProvider(settings.OPENAI_API_KEY, settings.OPENAI_MODEL or "gpt-4o-mini")
+    if choice == "local":
+        return LocalStubProvider()
+    raise ValueError(f"LLM_PROVIDER desconocido: {choice}")
+
+
+def normalize_question(question: str) -> str:
+    """Minúsculas, espacios colapsados y sin signos de apertura/cierre en los extremos."""
+    return " ".join(question.lower().split()).strip("?¿!¡. ")
+
+
+class LLMClient:
+    def __init__(self, provider: LLMProvider, max_concurrency: int, timeout: float, queue_timeout: float, cache_ttl: int):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.cache_ttl = cache_ttl
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    def cache_key(self, question: str, context: str) -> str:
+        digest = hashlib.sha256(
+            f"{self.provider.name}\n{normalize_question(question)}\n{context}".encode()
+        ).hexdigest()
+        return f"llm:answer:{digest}"
+
+    async def answer(self, messages: Messages, question: str, context: str, max_tokens: int = 350) -> Tuple[str, bool]:
+        """
+        Devuelve (respuesta, si vino de la caché). Si no hay plaza libre en
+        queue_timeout segundos se lanza LLMBusyError en lugar de encolar más.
+        """
+        key = self.cache_key(question, context)
+        cached = await asyncio.to_thread(cache_get_json, key)
+        if cached is not None:
+            ai_cache_total.inc("hit")
+            return cached, True
+        ai_cache_total.inc("miss")
+
+        semaphore = self._get_semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMBusyError("Demasiadas consultas de IA en curso")
+        started, outcome = time.perf_counter(), "error"
+        try:
+            text = await asyncio.wait_for(self.provider.complete(messages, max_tokens), timeout=self.timeout)
+            outcome = "ok"
+        except asyncio.TimeoutError as e:
+            outcome = "timeout"
+            raise LLMTimeoutError(f"Sin respuesta del modelo en {self.timeout}s") from e
+        finally:
+            semaphore.release()
+            ai_request_duration_seconds.observe(time.perf_counter() - started, self.provider.name, "complete", outcome)
+
+        await asyncio.to_thread(cache_set_json, key, text, self.cache_ttl)
+        return text, False
+
+    async def start_stream(
+        self, messages: Messages, question: str, context: str, max_tokens: int = 350
+    ) -> Tuple[AsyncIterator[str], bool]:
+        """
+        Variante en streaming: devuelve (fragmentos, si vino de la caché).
+        Si todas las plazas están ocupadas se lanza LLMBusyError aquí, antes de
+        empezar a responder, para poder contestar un 503 normal. La plaza se toma
+        al empezar a iterar y se libera al cerrar el iterador, también si el
+        cliente se desconecta a mitad de la respuesta.
+        """
+        key = self.cache_key(question, context)
+        cached = await asyncio.to_thread(cache_get_json, key)
+        if cached is not None:
+            ai_cache_total.inc("hit")
+            return self._replay(cached), True
+        ai_cache_total.inc("miss")
+        if self._get_semaphore().locked():
+            raise LLMBusyError("Demasiadas consultas de IA en curso")
+        return self._relay(key, messages, max_tokens), False
+
+    @staticmethod
+    async def _replay(text: str) -> AsyncIterator[str]:
+        yield text
+
+    async def _relay(self, key: str, messages: Messages, max_tokens: int) -> AsyncIterator[str]:
+        semaphore = self._get_semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMBusyError("Demasiadas consultas de IA en curso")
+        upstream = self.provider.stream(messages, max_tokens)
+        parts: List[str] = []
+        # "cancelled" si el cliente abandona el stream antes del final
+        started, outcome = time.perf_counter(), "cancelled"
+        try:
+            while True:
+                # El timeout se aplica entre fragmentos (incluido el primero)
+                try:
+                    token = await asyncio.wait_for(upstream.__anext__(), timeout=self.timeout)
+                except StopAsyncIteration:
+                    outcome = "ok"
+                    break
+                except asyncio.TimeoutError as e:
+                    outcome = "timeout"
+                    raise LLMTimeoutError(f"Sin respuesta del modelo en {self.timeout}s") from e
+                except LLMError:
+                    outcome = "error"
+                    raise
+                parts.append(token)
+                yield token
+        finally:
+            await upstream.aclose()
+            semaphore.release()
+            ai_request_duration_seconds.observe(time.perf_counter() - started, self.provider.name, "stream", outcome)
+        await asyncio.to_thread(cache_set_json, key, "".join(parts).strip(), self.cache_ttl)
+
+
+# Cliente compartido por el proceso
+llm_client = LLMClient(
+    provider=build_provider(),
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    timeout=settings.LLM_TIMEOUT_SECONDS,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+    cache_ttl=settings.LLM_CACHE_TTL,
+)
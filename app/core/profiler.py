@@ -0,0 +1,233 @@
+"""
+Perfilado de peticiones individuales (solo depuración).
+
+Con PROFILING_ENABLED, una petición se perfila si trae la cabecera
+`X-Profile` o si cae en la muestra de PROFILE_SAMPLE_RATE:
+
+- Un hilo muestrea la pila de la petición cada PROFILE_INTERVAL_SECONDS
+  (sys._current_frames): el hilo del event loop solo mientras ejecuta la tarea
+  de esta petición, y los hilos del threadpool en los que la petición hizo SQL.
+- Cada sentencia SQL emitida por SQLAlchemy se guarda con su duración y la
+  línea de la aplicación que la lanzó. Una misma sentencia repetida
+  PROFILE_N_PLUS_ONE_THRESHOLD veces o más se marca como posible N+1 (p. ej.
+  acceder a Reservation.owner, que es lazy, dentro de un bucle).
+
+Con la cabecera, la respuesta se sustituye por el informe:
+  X-Profile: json       -> informe JSON descargable (muestras, SQL, N+1)
+  X-Profile: collapsed  -> pilas colapsadas para flamegraph.pl / speedscope
+Las peticiones muestreadas responden normal y el informe se guarda en PROFILE_DIR.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+PROFILE_HEADER = b"x-profile"
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _app_caller() -> Optional[str]:
+    """Línea más interna del proyecto en la pila actual (quién lanzó el SQL)."""
+    for entry in reversed(traceback.extract_stack(limit=60)[:-2]):
+        if entry.filename.startswith(_PROJECT_DIR) and "site-packages" not in entry.filename:
+            return f"{os.path.relpath(entry.filename, _PROJECT_DIR)}:{entry.lineno}"
+    return None
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, interval: float):
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started_at = datetime.now(timezone.utc)
+        self.samples: Counter = Counter()
+        self.statements: List[dict] = []
+        self.duration = 0.0
+        self._threads = {threading.get_ident()}
+        self._loop_thread = threading.get_ident()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    # --- Muestreo de pilas ---
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self._started
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def track_current_thread(self) -> None:
+        self._threads.add(threading.get_ident())
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self._threads):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                # En el event loop pueden correr otras peticiones: solo cuenta la nuestra
+                if thread_id == self._loop_thread and asyncio.current_task(self._loop) is not self._task:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    # --- SQL ---
+
+    def record_statement(self, statement: str, elapsed: float, caller: Optional[str]) -> None:
+        self.statements.append({"sql": statement, "ms": round(elapsed * 1000, 3), "caller": caller})
+
+    def n_plus_one(self, threshold: int) -> List[dict]:
+        groups: Dict[str, dict] = {}
+        for entry in self.statements:
+            group = groups.setdefault(entry["sql"], {"sql": entry["sql"], "count": 0, "total_ms": 0.0, "callers": Counter()})
+            group["count"] += 1
+            group["total_ms"] += entry["ms"]
+            if entry["caller"]:
+                group["callers"][entry["caller"]] += 1
+        return [
+            {**group, "total_ms": round(group["total_ms"], 3), "callers": dict(group["callers"])}
+            for group in sorted(groups.values(), key=lambda g: -g["count"])
+            if group["count"] >= threshold
+        ]
+
+    # --- Informes ---
+
+    def collapsed(self) -> str:
+        """Formato de pilas colapsadas: `marco;marco;marco muestras` por línea."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def report(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "interval_ms": self.interval * 1000,
+            "sample_count": sum(self.samples.values()),
+            "sql": {
+                "count": len(self.statements),
+                "total_ms": round(sum(s["ms"] for s in self.statements), 3),
+                "statements": self.statements,
+                "n_plus_one": self.n_plus_one(settings.PROFILE_N_PLUS_ONE_THRESHOLD),
+            },
+            "collapsed": self.collapsed(),
+        }
+
+
+_current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("request_profile", default=None)
+
+
+# Escuchas a nivel de clase: aplican a todos los engines (también a los de tests).
+# Sin perfil activo el coste es una lectura de ContextVar.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.track_current_thread()
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is not None and conn.info.get("profile_started"):
+        elapsed = time.perf_counter() - conn.info["profile_started"].pop()
+        profile.record_statement(statement, elapsed, _app_caller())
+
+
+class ProfilerMiddleware:
+    """Middleware ASGI; solo se instala con PROFILING_ENABLED (no usar en producción abierta)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _mode(self, scope) -> Optional[str]:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER:
+                value = value.decode().strip().lower()
+                return "collapsed" if value == "collapsed" else "json"
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return "save"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        mode = self._mode(scope) if scope["type"] == "http" else None
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], settings.PROFILE_INTERVAL_SECONDS)
+        token = _current_profile.set(profile)
+
+        async def discard(message):
+            # Con cabecera se responde con el informe en lugar de la respuesta original
+            pass
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send if mode == "save" else discard)
+        finally:
+            profile.stop()
+            _current_profile.reset(token)
+
+        if mode == "save":
+            await asyncio.to_thread(save_profile, profile)
+            return
+        if mode == "collapsed":
+            body = profile.collapsed().encode()
+            content_type, filename = b"text/plain; charset=utf-8", "profile.folded"
+        else:
+            body = json.dumps(profile.report(), ensure_ascii=False, indent=2).encode()
+            content_type, filename = b"application/json", "profile.json"
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type),
+                (b"content-length", str(len(body)).encode()),
+                (b"content-disposition", f'attachment; filename="{filename}"'.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def save_profile(profile: RequestProfile) -> str:
+    """Guarda el informe JSON y las pilas colapsadas en PROFILE_DIR; devuelve la ruta base."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    stamp = profile.started_at.strftime("%Y%m%dT%H%M%S%f")
+    slug = profile.path.strip("/").replace("/", "_") or "root"
+    base = os.path.join(settings.PROFILE_DIR, f"{stamp}-{profile.method}-{slug}")
+    with open(f"{base}.json", "w", encoding="utf-8") as f:
+        json.dump(profile.report(), f, ensure_ascii=False, indent=2)
+    with open(f"{base}.folded", "w", encoding="utf-8") as f:
+        f.write(profile.collapsed())
+    return base
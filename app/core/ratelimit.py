@@ -0,0 +1,254 @@
+"""
+Límite de peticiones y descarte de carga (middleware ASGI).
+
+- Descarte de carga: si el worker ya tiene LOAD_SHED_MAX_IN_FLIGHT peticiones
+  en curso, o la espera reciente por una conexión del pool supera
+  LOAD_SHED_POOL_WAIT_SECONDS, se responde 503 al momento (con Retry-After) en
+  lugar de encolar una petición más que acabaría en timeout.
+- Límite por cliente: cubetas de tokens por usuario (el `sub` del JWT, ya
+  verificado) o por IP si no hay token. Una cubeta general (RATE_LIMIT_DEFAULT)
+  y otra por ruta para las de RATE_LIMIT_ROUTES. Se guardan en Redis y se
+  actualizan con un script Lua (atómico y en un solo viaje); si Redis no
+  responde, cada worker lleva sus propias cubetas en memoria. Sin token => 429.
+  El cliente de Redis es síncrono: el middleware hace ese viaje en un hilo.
+
+Las sondas (/health), /metrics, los estáticos y los preflight CORS no cuentan.
+Detrás de un proxy, uvicorn debe arrancar con --proxy-headers para que la IP
+del cliente sea la real.
+"""
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import redis
+from jose import JWTError, jwt
+from starlette.routing import compile_path
+
+from app.core.cache import active_redis, mark_redis_down
+from app.core.config import settings
+from app.core.metrics import http_requests_rejected_total
+from app.db.session import recent_pool_wait
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+class Rate(NamedTuple):
+    burst: int
+    per_second: float
+
+
+def parse_rate(spec: str) -> Rate:
+    """"30/minute" -> Rate(burst=30, per_second=0.5)."""
+    amount, _, period = spec.partition("/")
+    try:
+        burst = int(amount)
+        seconds = _PERIODS[period.strip().lower()]
+    except (ValueError, KeyError):
+        raise ValueError(f"Límite no válido: {spec!r} (formato N/second, N/minute o N/hour)")
+    if burst < 1:
+        raise ValueError(f"Límite no válido: {spec!r}")
+    return Rate(burst, burst / seconds)
+
+
+# KEYS: una cubeta por clave. ARGV: ráfaga y tokens por segundo de cada una.
+# Todo o nada: solo se consume si todas las cubetas tienen al menos un token.
+# La hora es la del servidor de Redis, común a todos los workers.
+_TOKEN_BUCKET_LUA = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local allowed = 1
+local retry_after = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+  local burst = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local level = tonumber(state[1]) or burst
+  local ts = tonumber(state[2]) or now
+  level = math.min(burst, level + math.max(0, now - ts) * rate)
+  if level < 1 then
+    allowed = 0
+    retry_after = math.max(retry_after, (1 - level) / rate)
+  end
+  levels[i] = level
+end
+local remaining = nil
+for i, key in ipairs(KEYS) do
+  local burst = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  local level = levels[i] - allowed
+  if remaining == nil or level < remaining then remaining = level end
+  redis.call('HSET', key, 'tokens', tostring(level), 'ts', tostring(now))
+  redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+return {allowed, math.floor(remaining), math.ceil(retry_after * 1000)}
+"""
+
+Bucket = Tuple[str, Rate]
+
+
+class LocalTokenBuckets:
+    """Las mismas cubetas en memoria del proceso (respaldo sin Redis), con tamaño máximo."""
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._state: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets: Sequence[Bucket]) -> Tuple[bool, int, float]:
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            retry_after = 0.0
+            for key, rate in buckets:
+                level, ts = self._state.get(key, (rate.burst, now))
+                level = min(rate.burst, level + max(0.0, now - ts) * rate.per_second)
+                if level < 1:
+                    retry_after = max(retry_after, (1 - level) / rate.per_second)
+                levels.append(level)
+            allowed = retry_after == 0.0
+            for (key, _), level in zip(buckets, levels):
+                self._state[key] = [level - 1 if allowed else level, now]
+                self._state.move_to_end(key)
+            while len(self._state) > self.maxsize:
+                self._state.popitem(last=False)
+        remaining = min(level - 1 if allowed else level for level in levels)
+        return allowed, math.floor(remaining), retry_after
+
+
+class RateLimiter:
+    def __init__(self, default: Optional[str], routes: Dict[str, str]):
+        self.default = parse_rate(default) if default else None
+        self.routes = []
+        for rule, spec in routes.items():
+            method, _, template = rule.partition(" ")
+            regex = compile_path(template.strip())[0]
+            self.routes.append((method.upper(), regex, template.strip(), parse_rate(spec)))
+        self.local = LocalTokenBuckets()
+        self._script = None
+
+    def buckets_for(self, method: str, path: str, identity: str) -> List[Bucket]:
+        # {identity} es el hash tag de Redis Cluster: todas las claves en el mismo slot
+        prefix = f"ratelimit:{{{identity}}}"
+        buckets = [(prefix, self.default)] if self.default else []
+        for rule_method, regex, template, rate in self.routes:
+            if rule_method == method and regex.match(path):
+                buckets.append((f"{prefix}:{rule_method} {template}", rate))
+        return buckets
+
+    def take(self, buckets: Sequence[Bucket]) -> Tuple[bool, int, float]:
+        """Consume un token de cada cubeta: (permitido, tokens restantes, segundos hasta reintentar)."""
+        client = active_redis()
+        if client is not None:
+            try:
+                if self._script is None:
+                    self._script = client.register_script(_TOKEN_BUCKET_LUA)
+                args = [value for _, rate in buckets for value in (rate.burst, rate.per_second)]
+                allowed, remaining, retry_ms = self._script(keys=[key for key, _ in buckets], args=args)
+                return bool(allowed), int(remaining), int(retry_ms) / 1000
+            except redis.RedisError as e:
+                mark_redis_down(e)
+        return self.local.take(buckets)
+
+    async def take_async(self, buckets: Sequence[Bucket]) -> Tuple[bool, int, float]:
+        """take() sin bloquear el event loop: sin Redis las cubetas locales no necesitan hilo."""
+        if active_redis() is None:
+            return self.local.take(buckets)
+        return await asyncio.to_thread(self.take, buckets)
+
+
+def client_identity(scope) -> str:
+    """"user:<sub>" si trae un JWT válido; si no, "ip:<dirección>"."""
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    subject = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("sub")
+                except JWTError:
+                    subject = None
+                if subject:
+                    return f"user:{subject}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+async def _reject(send, status: int, detail: str, retry_after: float, extra_headers=()) -> None:
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            *extra_headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """
+    Los interruptores (RATE_LIMIT_ENABLED, LOAD_SHED_*) se leen en cada petición;
+    las reglas de límite, al crear el middleware.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None, exempt_prefixes: Optional[Sequence[str]] = None):
+        self.app = app
+        self.limiter = limiter or RateLimiter(settings.RATE_LIMIT_DEFAULT, settings.RATE_LIMIT_ROUTES)
+        if exempt_prefixes is None:
+            exempt_prefixes = [p.strip() for p in settings.RATE_LIMIT_EXEMPT_PREFIXES.split(",") if p.strip()]
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        # Solo lo toca el event loop: no necesita lock
+        self.in_flight = 0
+
+    def overload_reason(self) -> Optional[str]:
+        if not settings.LOAD_SHED_ENABLED:
+            return None
+        if settings.LOAD_SHED_MAX_IN_FLIGHT and self.in_flight >= settings.LOAD_SHED_MAX_IN_FLIGHT:
+            return "in_flight"
+        if settings.LOAD_SHED_POOL_WAIT_SECONDS and recent_pool_wait() >= settings.LOAD_SHED_POOL_WAIT_SECONDS:
+            return "pool_wait"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"].startswith(self.exempt_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        reason = self.overload_reason()
+        if reason is not None:
+            http_requests_rejected_total.inc(reason)
+            await _reject(
+                send, 503, "Servidor saturado, reintente en unos segundos",
+                settings.LOAD_SHED_RETRY_AFTER_SECONDS,
+            )
+            return
+
+        if settings.RATE_LIMIT_ENABLED:
+            buckets = self.limiter.buckets_for(scope["method"], scope["path"], client_identity(scope))
+            if buckets:
+                allowed, remaining, retry_after = await self.limiter.take_async(buckets)
+                if not allowed:
+                    http_requests_rejected_total.inc("rate_limited")
+                    await _reject(
+                        send, 429, "Demasiadas peticiones, reintente más tarde", retry_after,
+                        [(b"x-ratelimit-remaining", str(max(remaining, 0)).encode())],
+                    )
+                    return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
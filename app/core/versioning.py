@@ -0,0 +1,155 @@
+"""
+Marcas de versión por colección para responder GET condicionales (ETag / 304).
+
+Cada colección ("reservations:user:7", "reservations", "audit") tiene una marca
+que se renueva después de cada escritura confirmada. El ETag de una respuesta se
+deriva de la marca y de la URL pedida (ruta + filtros + cursor), así que un 304 se
+decide con una lectura a Redis, sin consultar la base de datos ni serializar nada.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from email.utils import formatdate
+from typing import Dict, Tuple
+
+import redis
+from fastapi import HTTPException, Request, Response, status
+
+from app.core.cache import active_redis, local_cache, mark_redis_down
+from app.core.config import settings
+
+_KEY_PREFIX = "version:"
+_COUNTER_PREFIX = "counter:"
+
+# Colecciones globales (las de cada usuario se construyen con user_scope)
+RESERVATIONS = "reservations"
+AUDIT = "audit"
+LABS = "labs"
+
+
+def user_scope(collection: str, user_id: int) -> str:
+    """Colección propia de un usuario, p. ej. sus reservas."""
+    return f"{collection}:user:{user_id}"
+
+
+def lab_scope(lab_id: int) -> str:
+    """Reservas de un laboratorio (para las cachés por laboratorio)."""
+    return f"{RESERVATIONS}:lab:{lab_id}"
+
+
+def _new_stamp() -> str:
+    return f"{uuid.uuid4().hex}:{time.time():.3f}"
+
+
+def _store(key: str, stamp: str, only_if_missing: bool = False) -> str:
+    """Guarda la marca en Redis (o localmente) y devuelve la que quedó vigente."""
+    client = active_redis()
+    if client is not None:
+        try:
+            if only_if_missing:
+                # Si otro worker creó la marca a la vez, se usa la suya
+                if not client.set(key, stamp, ex=settings.VERSION_STAMP_TTL, nx=True):
+                    return client.get(key) or stamp
+            else:
+                client.set(key, stamp, ex=settings.VERSION_STAMP_TTL)
+            return stamp
+        except redis.RedisError as e:
+            mark_redis_down(e)
+    local_cache.set(key, stamp, settings.VERSION_STAMP_LOCAL_TTL)
+    return stamp
+
+
+def get_version(scope: str) -> Tuple[str, float]:
+    """Devuelve (marca, instante de la última modificación) de la colección."""
+    key = _KEY_PREFIX + scope
+    stamp = None
+    client = active_redis()
+    if client is not None:
+        try:
+            stamp = client.get(key)
+        except redis.RedisError as e:
+            mark_redis_down(e)
+            stamp = local_cache.get(key)
+    else:
+        stamp = local_cache.get(key)
+    if stamp is None:
+        stamp = _store(key, _new_stamp(), only_if_missing=True)
+    version, _, modified_at = stamp.partition(":")
+    return version, float(modified_at)
+
+
+def bump_version(*scopes: str) -> None:
+    """Renueva la marca de las colecciones; llamar después del commit."""
+    for scope in scopes:
+        _store(_KEY_PREFIX + scope, _new_stamp())
+
+
+def check_not_modified(request: Request, response: Response, scope: str) -> None:
+    """
+    Añade ETag y Last-Modified a la respuesta y, si el cliente ya tiene esa
+    versión (If-None-Match), corta la petición con un 304 sin cuerpo.
+    """
+    version, modified_at = get_version(scope)
+    digest = hashlib.sha1(f"{version}|{request.url.path}?{request.url.query}".encode()).hexdigest()
+    headers = {
+        "ETag": f'W/"{digest[:20]}"',
+        "Last-Modified": formatdate(modified_at, usegmt=True),
+        # El navegador puede guardar la respuesta, pero debe revalidarla siempre
+        "Cache-Control": "private, no-cache",
+    }
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or headers["ETag"].removeprefix("W/") in tags:
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+# --- Contadores de versión ---
+# A diferencia de las marcas, un contador dice además cuántas escrituras hubo:
+# si tras escribir vale exactamente lo que el proceso tenía + 1, nadie más
+# escribió entremedias y una caché local puede parchearse en vez de recargarse.
+
+#
+# Sin Redis cada worker lleva sus propios contadores y no ve las escrituras de
+# los demás. Como con las marcas locales, la desactualización se acota: cada
+# VERSION_STAMP_LOCAL_TTL segundos el contador local avanza solo (como si otro
+# hubiera escrito) y las cachés que dependen de él se reconstruyen.
+
+_local_counters: Dict[str, Tuple[int, float]] = {}
+_local_counters_lock = threading.Lock()
+
+
+def _local_counter(scope: str, increment: int = 0) -> int:
+    now = time.monotonic()
+    with _local_counters_lock:
+        value, expires_at = _local_counters.get(scope, (0, now + settings.VERSION_STAMP_LOCAL_TTL))
+        if now >= expires_at:
+            value += 1
+            expires_at = now + settings.VERSION_STAMP_LOCAL_TTL
+        value += increment
+        _local_counters[scope] = (value, expires_at)
+        return value
+
+
+def get_counter(scope: str) -> int:
+    client = active_redis()
+    if client is not None:
+        try:
+            return int(client.get(_COUNTER_PREFIX + scope) or 0)
+        except redis.RedisError as e:
+            mark_redis_down(e)
+    return _local_counter(scope)
+
+
+def incr_counter(scope: str) -> int:
+    """Incrementa el contador de forma atómica y devuelve el nuevo valor."""
+    client = active_redis()
+    if client is not None:
+        try:
+            return int(client.incr(_COUNTER_PREFIX + scope))
+        except redis.RedisError as e:
+            mark_redis_down(e)
+    return _local_counter(scope, 1)
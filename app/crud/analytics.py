@@ -0,0 +1,169 @@
+"""
+Analítica de ocupación vectorizada con NumPy.
+
+Por cada laboratorio se leen de reservations solo los tiempos (segundos epoch),
+en bloques con un cursor del servidor; cada bloque se convierte en arrays y se
+acumula con np.bincount / np.histogram. No se construyen objetos
+ORM ni diccionarios por fila y la memoria depende del tamaño de bloque, no del
+rango pedido.
+"""
+import math
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.reservation import Reservation as ReservationModel
+from app.models.rollup import ReservationRollup
+from app.utils.lab_catalog import lab_catalog
+
+HOUR = 3600
+DAY = 24 * HOUR
+CELLS_PER_LAB = 7 * 24
+# El 1 de enero de 1970 fue jueves (lunes = 0)
+_EPOCH_WEEKDAY = 3
+
+# Bins de antelación (segundos, escala logarítmica de 1 min a 2 años):
+# percentiles con ~2% de error relativo y memoria constante.
+LEAD_TIME_EDGES = np.concatenate(([0.0], np.geomspace(60, 2 * 365 * DAY, 500)))
+LEAD_TIME_PERCENTILES = (50, 90, 99)
+
+
+def _epoch(dialect: str, column):
+    """Expresión SQL que devuelve la columna como segundos desde epoch (UTC)."""
+    if dialect == "postgresql":
+        return cast(func.extract("epoch", column), Float)
+    return (func.julianday(column) - 2440587.5) * 86400.0
+
+
+def _active_labs(db: Session) -> List[int]:
+    """
+    Laboratorios (lab_id) con reservas vigentes, por nombre. Se leen de los
+    rollups (una fila por laboratorio y hora) en lugar de un DISTINCT sobre
+    toda la tabla.
+    """
+    lab_ids = db.scalars(
+        select(ReservationRollup.lab_id)
+        .where(ReservationRollup.count > 0)
+        .group_by(ReservationRollup.lab_id)
+    )
+    return sorted(lab_ids, key=lambda lab_id: lab_catalog.name(lab_id) or "")
+
+
+def _occupied_seconds(starts, ends, lo: float, hi: float) -> np.ndarray:
+    """
+    Segundos ocupados por celda (día, hora) de un laboratorio. Cada reserva se
+    reparte entre las horas que cubre: a lo sumo RESERVATION_MAX_MINUTES/60 + 1
+    pasadas vectorizadas, una por desplazamiento de hora.
+    """
+    totals = np.zeros(CELLS_PER_LAB)
+    s, e = np.maximum(starts, lo), np.minimum(ends, hi)
+    keep = e > s
+    s, e = s[keep], e[keep]
+    first_hour = np.floor(s / HOUR)
+
+    for offset in range(math.ceil(settings.RESERVATION_MAX_MINUTES / 60) + 1):
+        bucket = first_hour + offset
+        bucket_start = bucket * HOUR
+        overlap = np.minimum(e, bucket_start + HOUR) - np.maximum(s, bucket_start)
+        inside = overlap > 0
+        if not inside.any():
+            break
+        bucket = bucket[inside].astype(np.int64)
+        weekday = (bucket // 24 + _EPOCH_WEEKDAY) % 7
+        totals += np.bincount(weekday * 24 + bucket % 24, weights=overlap[inside], minlength=CELLS_PER_LAB)
+    return totals
+
+
+def _percentiles(counts: np.ndarray) -> Dict[str, Optional[float]]:
+    """Percentiles (en horas) a partir del histograma: cota superior del bin."""
+    total = int(counts.sum())
+    result: Dict[str, Optional[float]] = {"count": total}
+    cumulative = np.cumsum(counts)
+    for q in LEAD_TIME_PERCENTILES:
+        if total == 0:
+            result[f"p{q}"] = None
+            continue
+        idx = int(np.searchsorted(cumulative, math.ceil(q / 100 * total)))
+        result[f"p{q}"] = round(float(LEAD_TIME_EDGES[idx + 1]) / HOUR, 2)
+    return result
+
+
+def occupancy_heatmap(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    lab_name: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+) -> dict:
+    """
+    Mapa de calor laboratorio × día de la semana × hora (UTC) sobre [start, end)
+    y percentiles de antelación (start_time - created_at) de las reservas que
+    empiezan en el rango. Solo reservas no borradas.
+    """
+    lo, hi = start.timestamp(), end.timestamp()
+    dialect = db.get_bind().dialect.name
+    stmt = select(
+        _epoch(dialect, ReservationModel.start_time),
+        _epoch(dialect, ReservationModel.end_time),
+        _epoch(dialect, ReservationModel.created_at),
+    ).where(
+        ReservationModel.deleted_at == None,
+        # Las que empiezan antes pero siguen ocupando dentro del rango también cuentan
+        ReservationModel.start_time > datetime.fromtimestamp(
+            lo - settings.RESERVATION_MAX_MINUTES * 60, timezone.utc
+        ),
+        ReservationModel.start_time < end,
+    )
+    # Core (sin ORM) y cursor del servidor: filas como tuplas, leídas por bloques
+    conn = db.connection().execution_options(
+        stream_results=True, yield_per=chunk_size or settings.ANALYTICS_CHUNK_ROWS
+    )
+
+    if lab_name:
+        lab_id = lab_catalog.id_for(lab_name)
+        lab_ids = [lab_id] if lab_id is not None else []
+    else:
+        lab_ids = _active_labs(db)
+
+    grids: Dict[int, np.ndarray] = {}
+    lead_counts = np.zeros(len(LEAD_TIME_EDGES) - 1, dtype=np.int64)
+    # Una consulta por laboratorio: cada una recorre el índice (lab_id, start_time)
+    for lab in lab_ids:
+        seconds = None
+        for chunk in conn.execute(stmt.where(ReservationModel.lab_id == lab)).partitions():
+            # np.array(chunk) sobre Row es muy lento; se transpone con zip
+            starts, ends, created = (
+                np.fromiter(column, dtype=np.float64, count=len(chunk)) for column in zip(*chunk)
+            )
+            occupied = _occupied_seconds(starts, ends, lo, hi)
+            seconds = occupied if seconds is None else seconds + occupied
+
+            in_range = starts >= lo
+            lead = np.clip(starts[in_range] - created[in_range], 0, LEAD_TIME_EDGES[-1])
+            lead_counts += np.histogram(lead, bins=LEAD_TIME_EDGES)[0]
+        if seconds is not None:
+            grids[lab] = seconds.reshape(7, 24)
+
+    # Cuántas veces aparece cada día de la semana en el rango (para el % de ocupación)
+    days = np.arange(math.floor(lo / DAY), math.ceil(hi / DAY))
+    day_counts = np.bincount((days + _EPOCH_WEEKDAY) % 7, minlength=7)
+    capacity = np.maximum(day_counts, 1)[:, None] * HOUR
+
+    labs: List[dict] = [
+        {
+            "lab_name": lab_catalog.name(lab),
+            "occupied_hours": np.round(grid / HOUR, 2).tolist(),
+            "occupancy": np.round(grid / capacity, 4).tolist(),
+        }
+        for lab, grid in grids.items()
+    ]
+    return {
+        "start": start,
+        "end": end,
+        "labs": labs,
+        "lead_time_hours": _percentiles(lead_counts),
+    }
@@ -1,8 +1,36 @@
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 import json
 
+from app.core.versioning import AUDIT, bump_version
 from app.models.audit_log import AuditLog
 from app.models.user import User
+from app.utils.pagination import keyset_page
+
+def build_audit_row(
+    user_id: int,
+    action: str,
+    target_model: str,
+    target_id: int,
+    details: dict = None
+) -> dict:
+    """Prepara una fila de auditoría (con la hora en que ocurrió la acción)."""
+    return {
+        "timestamp": datetime.now(timezone.utc),
+        "user_id": user_id,
+        "action": action,
+        "target_model": target_model,
+        "target_id": target_id,
+        "details": json.dumps(details) if details else None,
+    }
+
+def insert_audit_rows(db: Session, rows: List[dict]) -> None:
+    """Inserta varias filas en un único INSERT multi-fila (sin hacer commit)."""
+    if rows:
+        db.execute(insert(AuditLog), rows)
 
 def create_audit_log(
     db: Session,
@@ -12,16 +40,37 @@ def create_audit_log(
     target_id: int,
     details: dict = None
 ):
-    """Crea un nuevo registro de auditoría."""
-    details_str = json.dumps(details) if details else None
-    
-    db_log = AuditLog(
-        user_id=user.id,
-        action=action,
-        target_model=target_model,
-        target_id=target_id,
-        details=details_str
-    )
+    """Crea un nuevo registro de auditoría de forma inmediata (un commit por entrada)."""
+    db_log = AuditLog(**build_audit_row(user.id, action, target_model, target_id, details))
     db.add(db_log)
     db.commit()
+    bump_version(AUDIT)
     return db_log
+
+def list_audit_logs(
+    db: Session,
+    before: Optional[Tuple[datetime, int]] = None,
+    limit: int = 100,
+) -> Tuple[List[AuditLog], Optional[Tuple[datetime, int]]]:
+    """
+    Registros del más reciente al más antiguo, paginados por cursor (timestamp, id).
+    Devuelve (registros, valores del siguiente cursor o None).
+    """
+    query = db.query(AuditLog)
+    if before is not None:
+        # Filtro simple sobre timestamp para que PostgreSQL descarte particiones
+        query = query.filter(AuditLog.timestamp <= before[0])
+    return keyset_page(query, [AuditLog.timestamp, AuditLog.id], before, limit, descending=True)
+
+def export_audit_logs_query(since: Optional[datetime] = None):
+    """Consulta Core (columnas, sin ORM) para exportar la auditoría en orden cronológico."""
+    stmt = select(*AuditLog.__table__.columns).order_by(AuditLog.timestamp, AuditLog.id)
+    if since is not None:
+        stmt = stmt.where(AuditLog.timestamp >= since)
+    return stmt
+
+
+# --- Variantes async (AsyncSession) ---
+
+async def list_audit_logs_async(db: AsyncSession, before: Optional[Tuple[datetime, int]] = None, limit: int = 100):
+    return await db.run_sync(list_audit_logs, before, limit)
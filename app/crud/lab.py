@@ -0,0 +1,158 @@
+"""
+CRUD del catálogo de laboratorios.
+
+Las lecturas se sirven desde el catálogo en memoria (app/utils/lab_catalog.py);
+las escrituras van a la base de datos y, tras el commit, parchean el catálogo y
+renuevan las marcas de versión.
+"""
+from typing import List, Optional, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.versioning import LABS, RESERVATIONS, bump_version, incr_counter, user_scope
+from app.models.lab import Lab
+from app.models.reservation import Reservation as ReservationModel
+from app.schemas.lab import LabCreate, LabUpdate
+from app.utils.lab_catalog import LabEntry, lab_catalog
+
+
+class DuplicateLabError(Exception):
+    """Ya existe un laboratorio con ese nombre."""
+
+    def __init__(self, name: str):
+        self.name = name
+        super().__init__(f"Ya existe un laboratorio llamado '{name}'")
+
+
+class LabNotAvailableError(ValueError):
+    """El laboratorio no existe (y no se crean solos) o está dado de baja."""
+
+
+def _is_duplicate_name(error: IntegrityError) -> bool:
+    """Violación del UNIQUE de labs.name (PostgreSQL: labs_name_key; SQLite: labs.name)."""
+    message = str(error.orig)
+    return "labs_name_key" in message or "labs.name" in message
+
+
+def sync_catalog(lab: Union[Lab, LabEntry]) -> None:
+    """Tras el commit: parchea el catálogo del proceso y renueva el ETag de /labs."""
+    lab_catalog.apply_write(incr_counter(LABS), LabEntry.from_row(lab))
+    bump_version(LABS)
+
+
+def get_labs(skip: int = 0, limit: int = 100, include_inactive: bool = False) -> List[LabEntry]:
+    labs = lab_catalog.all()
+    if not include_inactive:
+        labs = [lab for lab in labs if lab.is_active]
+    return labs[skip:skip + limit]
+
+
+def get_lab(lab_id: int) -> Optional[LabEntry]:
+    return lab_catalog.get(lab_id)
+
+
+def create_lab(db: Session, lab_in: LabCreate) -> Lab:
+    db_lab = Lab(**lab_in.model_dump())
+    db.add(db_lab)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if _is_duplicate_name(e):
+            raise DuplicateLabError(lab_in.name)
+        raise
+    db.refresh(db_lab)
+    sync_catalog(db_lab)
+    return db_lab
+
+
+def update_lab(db: Session, lab_id: int, lab_in: LabUpdate) -> Optional[Lab]:
+    """
+    Actualiza un laboratorio. Renombrarlo no toca reservations (van por lab_id),
+    pero sí cambia lo que devuelven: se renuevan los ETag de los análisis y de
+    los usuarios con reservas en él, y el contador que usa el índice de la IA.
+    """
+    db_lab = db.get(Lab, lab_id)
+    if db_lab is None:
+        return None
+    update_data = lab_in.model_dump(exclude_unset=True)
+    renamed = "name" in update_data and update_data["name"] != db_lab.name
+    for key, value in update_data.items():
+        setattr(db_lab, key, value)
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if _is_duplicate_name(e):
+            raise DuplicateLabError(update_data["name"])
+        raise
+    db.refresh(db_lab)
+    sync_catalog(db_lab)
+
+    if renamed:
+        owners = db.scalars(
+            select(ReservationModel.owner_id).where(ReservationModel.lab_id == lab_id).distinct()
+        ).all()
+        bump_version(RESERVATIONS, *(user_scope(RESERVATIONS, owner_id) for owner_id in owners))
+        incr_counter(RESERVATIONS)
+    return db_lab
+
+
+def delete_lab(db: Session, lab_id: int) -> bool:
+    """
+    Baja lógica: el laboratorio deja de admitir reservas nuevas, pero su
+    historial (y las reservas que lo referencian) se conserva.
+    """
+    db_lab = db.get(Lab, lab_id)
+    if db_lab is None:
+        return False
+    db_lab.is_active = False
+    db.commit()
+    db.refresh(db_lab)
+    sync_catalog(db_lab)
+    return True
+
+
+def _find_lab(db: Session, name: str):
+    """(id, is_active) del laboratorio `name` leído en la sesión dada, o None."""
+    return db.execute(select(Lab.id, Lab.is_active).where(Lab.name == name)).first()
+
+
+def resolve_lab_id(db: Session, name: str) -> Tuple[int, Optional[Lab]]:
+    """
+    lab_id para reservar en el laboratorio `name`. Si no existe y LAB_AUTO_CREATE
+    está activo, se da de alta en la transacción de la reserva (se confirman
+    juntos); en ese caso se devuelve también el Lab nuevo, para pasarlo a
+    sync_catalog() después del commit. Debe llamarse antes de otras escrituras
+    en la sesión: si otro worker lo crea a la vez, se hace rollback y se usa el suyo.
+
+    Un nombre que no está en el catálogo se busca con la misma sesión en lugar
+    de recargar el catálogo (que abriría otra conexión síncrona).
+    """
+    lab_id = lab_catalog.id_for(name, reload_on_miss=False)
+    if lab_id is not None:
+        is_active = lab_catalog.get(lab_id).is_active
+    else:
+        row = _find_lab(db, name)
+        lab_id, is_active = row if row is not None else (None, None)
+    if lab_id is not None:
+        if not is_active:
+            raise LabNotAvailableError(f"El laboratorio '{name}' está dado de baja")
+        return lab_id, None
+    if not settings.LAB_AUTO_CREATE:
+        raise LabNotAvailableError(f"Laboratorio desconocido: '{name}'")
+
+    db_lab = Lab(name=name, is_active=True)
+    db.add(db_lab)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        row = _find_lab(db, name)
+        if row is None:
+            raise
+        return row.id, None
+    return db_lab.id, db_lab
@@ -0,0 +1,99 @@
+import math
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.versioning import RESERVATIONS, get_version, user_scope
+from app.crud.reservation import find_free_slots
+from app.crud.rollup import utc_hour_expr
+from app.models.reservation import Reservation as ReservationModel
+from app.models.rollup import ReservationRollup
+from app.utils.lab_catalog import lab_catalog
+from app.utils.recommender import Counts, rank_candidates, suggestion_index
+
+# Laboratorios cuya disponibilidad se consulta como mucho por recomendación
+MAX_LABS_CHECKED = 8
+
+
+def _named_counts(rows) -> Counts:
+    """(nombre del laboratorio, hora) -> conteo; se omiten los ids que ya no están en el catálogo."""
+    counts = {}
+    for row in rows:
+        name = lab_catalog.name(row.lab_id)
+        if name is not None:
+            counts[(name, row.hour)] = row.count
+    return counts
+
+
+def _only_active(counts: Counts, active: Set[str]) -> Counts:
+    return {key: count for key, count in counts.items() if key[0] in active}
+
+
+def _load_global_counts(db: Session) -> Counts:
+    """Ocupación histórica por (laboratorio, hora): los rollups ya la tienen agregada."""
+    rows = db.execute(
+        select(ReservationRollup.lab_id, ReservationRollup.hour, ReservationRollup.count)
+        .where(ReservationRollup.count > 0)
+    ).all()
+    return _named_counts(rows)
+
+
+def _load_user_counts(db: Session, user_id: int) -> Counts:
+    hour = utc_hour_expr(db.get_bind().dialect.name, ReservationModel.start_time)
+    rows = db.execute(
+        select(ReservationModel.lab_id, hour.label("hour"), func.count(ReservationModel.id).label("count"))
+        .where(ReservationModel.owner_id == user_id, ReservationModel.deleted_at == None)
+        .group_by(ReservationModel.lab_id, hour)
+    ).all()
+    return _named_counts(rows)
+
+
+def suggest_reservations(
+    db: Session,
+    user_id: int,
+    day: date,
+    duration_minutes: int = 60,
+    open_hour: int = 8,
+    close_hour: int = 20,
+    limit: int = 3,
+) -> List[dict]:
+    """
+    Mejores (laboratorio, hora) para el usuario en `day`, un laboratorio por
+    sugerencia y solo horas que están libres. Los conteos salen del índice en
+    memoria; a la base solo se va si alguna marca de versión cambió.
+    """
+    global_stamp, _ = get_version(RESERVATIONS)
+    user_stamp, _ = get_version(user_scope(RESERVATIONS, user_id))
+    global_counts = suggestion_index.global_counts(global_stamp, lambda: _load_global_counts(db))
+    user_counts = suggestion_index.user_counts(user_id, user_stamp, lambda: _load_user_counts(db, user_id))
+    # Los conteos se cachean por la versión de reservas, no por la del catálogo:
+    # los laboratorios dados de baja (no admiten reservas) se quitan en cada llamada
+    active = {lab.name for lab in lab_catalog.all() if lab.is_active}
+    global_counts, user_counts = _only_active(global_counts, active), _only_active(user_counts, active)
+
+    last_start = close_hour - math.ceil(duration_minutes / 60)
+    now = datetime.now(timezone.utc)
+    free_by_lab = {}
+    picks = []
+    for candidate in rank_candidates(global_counts, user_counts, range(open_hour, last_start + 1)):
+        lab = candidate["lab_name"]
+        if lab in {p["lab_name"] for p in picks}:
+            continue
+        if lab not in free_by_lab:
+            if len(free_by_lab) >= MAX_LABS_CHECKED:
+                continue
+            free_by_lab[lab] = find_free_slots(
+                db, [lab], day, day, duration_minutes, open_hour, close_hour
+            )[0]["free"]
+
+        start = datetime.combine(day, time(candidate["hour"]), tzinfo=timezone.utc)
+        end = start + timedelta(minutes=duration_minutes)
+        if start <= now:
+            continue
+        if any(w["start"] <= start and end <= w["end"] for w in free_by_lab[lab]):
+            picks.append({**candidate, "start_time": start, "end_time": end})
+            if len(picks) == limit:
+                break
+    return picks
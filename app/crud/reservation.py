@@ -1,26 +1,215 @@
+import asyncio
+from functools import partial
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
 
+from app.core.config import settings
+from app.core.versioning import RESERVATIONS, bump_version, get_counter, incr_counter, lab_scope, user_scope
+from app.crud.lab import resolve_lab_id, sync_catalog
+from app.crud.rollup import bump_rollup, rollup_hour
+from app.models.lab import Lab
 from app.models.reservation import Reservation as ReservationModel
 from app.schemas.reservation import ReservationCreate, ReservationUpdate
+from app.utils.availability import availability_index, free_runs
+from app.utils.interval_index import reservation_index
+from app.utils.lab_catalog import LabEntry, lab_catalog
+from app.utils.pagination import estimate_count, keyset_page
+from app.utils.retrieval import ReservationDoc, retrieval_index
 
-def create_reservation(db: Session, reservation_in: ReservationCreate, owner_id: int) -> ReservationModel:
+
+class ReservationConflictError(Exception):
+    """El intervalo pedido se solapa con otra reserva vigente del mismo laboratorio."""
+
+    def __init__(self, lab_name: str, conflicting_ids: List[int]):
+        self.lab_name = lab_name
+        self.conflicting_ids = conflicting_ids
+        super().__init__(f"Choque de horario en '{lab_name}' con reservas {conflicting_ids}")
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Las fechas sin zona horaria se interpretan como UTC."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _resolve_interval(start_time: datetime, end_time: Optional[datetime]) -> Tuple[datetime, datetime]:
+    start_time = _as_utc(start_time)
+    if end_time is None:
+        return start_time, start_time + timedelta(minutes=settings.RESERVATION_DEFAULT_MINUTES)
+    return start_time, _as_utc(end_time)
+
+
+def _ensure_lab_loaded(db: Session, lab_id: int) -> None:
+    """Carga en el índice los intervalos vigentes del laboratorio (solo la primera vez)."""
+    if reservation_index.is_loaded(lab_id):
+        return
+    rows = db.query(
+        ReservationModel.id, ReservationModel.start_time, ReservationModel.end_time
+    ).filter(
+        ReservationModel.lab_id == lab_id,
+        ReservationModel.deleted_at == None
+    ).all()
+    reservation_index.load(lab_id, rows)
+
+
+def _overlapping_query(db: Session, lab_id: int, start: datetime, end: datetime, exclude_id: Optional[int]):
     """
-    Crea una nueva reserva en la base de datos.
+    Reservas vigentes que se solapan con [start, end).
+    El límite inferior sobre start_time permite usar el índice (lab_id, start_time)
+    en lugar de recorrer todo el historial del laboratorio.
+    """
+    lower_bound = start - timedelta(minutes=settings.RESERVATION_MAX_MINUTES)
+    query = db.query(ReservationModel.id).filter(
+        ReservationModel.lab_id == lab_id,
+        ReservationModel.deleted_at == None,
+        ReservationModel.start_time > lower_bound,
+        ReservationModel.start_time < end,
+        ReservationModel.end_time > start,
+    )
+    if exclude_id is not None:
+        query = query.filter(ReservationModel.id != exclude_id)
+    return query
+
+
+def _check_index(
+    db: Session, lab_id: int, lab_name: str, start: datetime, end: datetime, exclude_id: Optional[int] = None
+) -> None:
+    """
+    Vía rápida: consulta el índice en memoria. Si reporta choques, se confirman por
+    clave primaria (otro worker pudo haber borrado o movido esas reservas).
     """
+    _ensure_lab_loaded(db, lab_id)
+    candidates = reservation_index.find_conflicts(lab_id, start, end, exclude_id=exclude_id)
+    if not candidates:
+        return
+    confirmed = [
+        row.id for row in _overlapping_query(db, lab_id, start, end, exclude_id)
+        .filter(ReservationModel.id.in_(candidates))
+        .all()
+    ]
+    if confirmed:
+        raise ReservationConflictError(lab_name, confirmed)
+    # El índice estaba desactualizado: se recarga y decide la base de datos.
+    reservation_index.invalidate(lab_id)
+
+
+def _guard_in_transaction(db: Session, db_reservation: ReservationModel, lab_name: str) -> None:
+    """
+    Verificación definitiva dentro de la transacción, después del flush.
+    En PostgreSQL un advisory lock por laboratorio serializa las escrituras
+    concurrentes (además de la restricción EXCLUDE de la migración); en SQLite
+    el propio INSERT/UPDATE ya tomó el bloqueo de escritura de la base.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(func.pg_advisory_xact_lock(db_reservation.lab_id).select())
+    db.flush()
+    conflicts = [
+        row.id for row in _overlapping_query(
+            db, db_reservation.lab_id, db_reservation.start_time, db_reservation.end_time, db_reservation.id
+        ).all()
+    ]
+    if conflicts:
+        raise ReservationConflictError(lab_name, conflicts)
+
+
+def _commit_guarded(db: Session, db_reservation: ReservationModel, lab_name: str) -> None:
+    try:
+        _guard_in_transaction(db, db_reservation, lab_name)
+        db.commit()
+    except ReservationConflictError:
+        db.rollback()
+        raise
+    except IntegrityError as e:
+        db.rollback()
+        # Violación de la restricción EXCLUDE de PostgreSQL
+        if "reservations_no_overlap" in str(e.orig):
+            raise ReservationConflictError(lab_name, [])
+        raise
+
+
+# Cada escritura se divide en dos partes: la de base de datos (_create_reservation,
+# ...) y la posterior al commit (_after_*), que habla con Redis y parchea las
+# cachés del proceso. La segunda solo recibe valores ya leídos, sin objetos ORM,
+# para que las variantes async puedan lanzarla en un hilo (ver más abajo).
+AfterCommit = Callable[[], None]
+
+
+def _bump_versions(owner_id: int) -> None:
+    """Invalida los ETag de las reservas del dueño y de los análisis globales."""
+    bump_version(user_scope(RESERVATIONS, owner_id), RESERVATIONS)
+
+
+def _sync_availability(
+    lab_id: int,
+    added: Optional[Tuple[datetime, datetime]] = None,
+    removed: Optional[Tuple[datetime, datetime]] = None,
+) -> None:
+    """Tras el commit: avanza la versión del laboratorio y parchea sus bitsets."""
+    version = incr_counter(lab_scope(lab_id))
+    availability_index.apply_write(lab_id, version, added=added, removed=removed)
+
+
+def _sync_retrieval(reservation_id: int, doc: Optional[ReservationDoc]) -> None:
+    """Tras el commit: refleja la reserva en el índice de búsqueda del contexto de IA (None = quitarla)."""
+    version = incr_counter(RESERVATIONS)
+    retrieval_index.apply_write(version, reservation_id, doc)
+
+
+def _after_create(
+    new_lab: Optional[LabEntry], lab_id: int, reservation_id: int,
+    interval: Tuple[datetime, datetime], doc: ReservationDoc, owner_id: int,
+) -> None:
+    if new_lab is not None:
+        sync_catalog(new_lab)
+    reservation_index.add(lab_id, reservation_id, *interval)
+    _sync_availability(lab_id, added=interval)
+    _sync_retrieval(reservation_id, doc)
+    _bump_versions(owner_id)
+
+
+def _create_reservation(
+    db: Session, reservation_in: ReservationCreate, owner_id: int
+) -> Tuple[ReservationModel, AfterCommit]:
+    start_time, end_time = _resolve_interval(reservation_in.start_time, reservation_in.end_time)
+    lab_id, new_lab = resolve_lab_id(db, reservation_in.lab_name)
+    _check_index(db, lab_id, reservation_in.lab_name, start_time, end_time)
+
     # Crea el objeto del modelo de base de datos usando los datos del schema
     db_reservation = ReservationModel(
-        lab_name=reservation_in.lab_name,
+        lab_id=lab_id,
         reserved_by=reservation_in.reserved_by,
         purpose=reservation_in.purpose,
-        start_time=reservation_in.start_time,
+        start_time=start_time,
+        end_time=end_time,
         active=reservation_in.active,
         owner_id=owner_id
     )
-    
+
     db.add(db_reservation)
-    db.commit()
+    bump_rollup(db, lab_id, start_time, +1)
+    _commit_guarded(db, db_reservation, reservation_in.lab_name)
     db.refresh(db_reservation)
+    return db_reservation, partial(
+        _after_create,
+        LabEntry.from_row(new_lab) if new_lab is not None else None,
+        lab_id, db_reservation.id, (start_time, end_time),
+        ReservationDoc.from_row(db_reservation), owner_id,
+    )
+
+def create_reservation(db: Session, reservation_in: ReservationCreate, owner_id: int) -> ReservationModel:
+    """
+    Crea una nueva reserva en la base de datos.
+    Lanza ReservationConflictError si el laboratorio ya está ocupado en ese intervalo
+    y LabNotAvailableError si no se puede reservar en él.
+    """
+    db_reservation, after_commit = _create_reservation(db, reservation_in, owner_id)
+    after_commit()
     return db_reservation
 
 def get_reservation_by_id(db: Session, reservation_id: int, owner_id: int) -> ReservationModel | None:
@@ -28,27 +217,287 @@ def get_reservation_by_id(db: Session, reservation_id: int, owner_id: int) -> Re
     Obtiene una reserva por su ID, asegurándose de que pertenezca al usuario.
     """
     return db.query(ReservationModel).filter(
-        ReservationModel.id == reservation_id, 
+        ReservationModel.id == reservation_id,
         ReservationModel.owner_id == owner_id,
         ReservationModel.deleted_at == None
     ).first()
 
-def update_reservation(db: Session, db_reservation: ReservationModel, reservation_in: ReservationUpdate) -> ReservationModel:
+# Clave de ordenación (y del cursor) del listado
+LIST_ORDER = (ReservationModel.start_time, ReservationModel.id)
+
+def list_reservations_query(
+    db: Session,
+    owner_id: int,
+    lab_name: Optional[str] = None,
+    start_date: Optional[date] = None,
+):
+    """Consulta con los filtros del listado, sin paginar (la pagina keyset_query con LIST_ORDER)."""
+    # Usa el índice parcial (owner_id, start_time) WHERE deleted_at IS NULL
+    query = db.query(ReservationModel).filter(
+        ReservationModel.owner_id == owner_id,
+        ReservationModel.deleted_at == None
+    )
+    if lab_name:
+        # La subcadena se busca en el catálogo en memoria; a la base llega un IN de enteros
+        query = query.filter(ReservationModel.lab_id.in_(lab_catalog.matching_ids(lab_name)))
+    if start_date:
+        # Rango semiabierto [día, día + 1) en UTC: a diferencia de cast(start_time, Date),
+        # permite usar el índice sobre start_time (y funciona igual en SQLite)
+        day_start = datetime.combine(start_date, datetime.min.time(), tzinfo=timezone.utc)
+        query = query.filter(
+            ReservationModel.start_time >= day_start,
+            ReservationModel.start_time < day_start + timedelta(days=1),
+        )
+    return query
+
+def list_reservations(
+    db: Session,
+    owner_id: int,
+    lab_name: Optional[str] = None,
+    start_date: Optional[date] = None,
+    cursor_values: Optional[Tuple[datetime, int]] = None,
+    limit: int = 50,
+    include_total: bool = False,
+) -> Tuple[List[ReservationModel], Optional[Tuple[datetime, int]], Optional[int]]:
     """
-    Actualiza una reserva en la base de datos.
+    Reservas (no borradas) del usuario, paginadas por cursor sobre (start_time, id).
+    Devuelve (reservas, valores del siguiente cursor, total estimado o None).
     """
+    query = list_reservations_query(db, owner_id, lab_name=lab_name, start_date=start_date)
+    total = estimate_count(query) if include_total else None
+    reservations, next_values = keyset_page(query, list(LIST_ORDER), cursor_values, limit)
+    return reservations, next_values, total
+
+def export_reservations_query(owner_id: int, include_deleted: bool = False):
+    """Consulta Core (columnas, sin ORM) con todas las reservas del usuario para exportar."""
+    stmt = (
+        select(*ReservationModel.__table__.columns, Lab.name.label("lab_name"))
+        .join(Lab, Lab.id == ReservationModel.lab_id)
+        .where(ReservationModel.owner_id == owner_id)
+        .order_by(ReservationModel.start_time, ReservationModel.id)
+    )
+    if not include_deleted:
+        stmt = stmt.where(ReservationModel.deleted_at == None)
+    return stmt
+
+def _after_update(
+    new_lab: Optional[LabEntry], reservation_id: int, owner_id: int, doc: ReservationDoc,
+    old_lab: int, old_interval: Tuple[datetime, datetime],
+    lab_id: int, new_interval: Optional[Tuple[datetime, datetime]],
+) -> None:
+    """new_interval es None si la reserva no cambió de laboratorio ni de horario."""
+    if new_lab is not None:
+        sync_catalog(new_lab)
+    if new_interval is not None:
+        reservation_index.add(lab_id, reservation_id, *new_interval)
+        if old_lab == lab_id:
+            _sync_availability(old_lab, added=new_interval, removed=old_interval)
+        else:
+            _sync_availability(old_lab, removed=old_interval)
+            _sync_availability(lab_id, added=new_interval)
+    _sync_retrieval(reservation_id, doc)
+    _bump_versions(owner_id)
+
+
+def _update_reservation(
+    db: Session, db_reservation: ReservationModel, reservation_in: ReservationUpdate
+) -> Tuple[ReservationModel, AfterCommit]:
     update_data = reservation_in.model_dump(exclude_unset=True)
+    moves = {"lab_name", "start_time", "end_time"} & update_data.keys()
+    old_lab, old_start_time, old_end_time = db_reservation.lab_id, db_reservation.start_time, db_reservation.end_time
+    lab_name = update_data.pop("lab_name", None) or db_reservation.lab_name
+    new_lab = None
+    if lab_name != db_reservation.lab_name:
+        update_data["lab_id"], new_lab = resolve_lab_id(db, lab_name)
+
+    if moves:
+        old_start = _as_utc(db_reservation.start_time)
+        old_end = _as_utc(db_reservation.end_time)
+        start_time = _as_utc(update_data.get("start_time") or old_start)
+        if update_data.get("end_time") is not None:
+            end_time = _as_utc(update_data["end_time"])
+        else:
+            end_time = start_time + (old_end - old_start)
+        if end_time <= start_time:
+            raise ValueError("end_time debe ser posterior a start_time")
+        # El schema solo valida la duración si llegan ambos extremos; aquí se
+        # comprueba el intervalo resultante (_overlapping_query cuenta con ese máximo)
+        if end_time - start_time > timedelta(minutes=settings.RESERVATION_MAX_MINUTES):
+            raise ValueError(f"La reserva no puede durar más de {settings.RESERVATION_MAX_MINUTES} minutos")
+        update_data["start_time"], update_data["end_time"] = start_time, end_time
+        lab_id = update_data.get("lab_id", old_lab)
+        _check_index(db, lab_id, lab_name, start_time, end_time, exclude_id=db_reservation.id)
+
     for key, value in update_data.items():
         setattr(db_reservation, key, value)
-    
-    db.commit()
+
+    if moves and (old_lab, rollup_hour(old_start_time)) != (db_reservation.lab_id, rollup_hour(db_reservation.start_time)):
+        bump_rollup(db, old_lab, old_start_time, -1)
+        bump_rollup(db, db_reservation.lab_id, db_reservation.start_time, +1)
+
+    if moves:
+        _commit_guarded(db, db_reservation, lab_name)
+    else:
+        db.commit()
     db.refresh(db_reservation)
+    return db_reservation, partial(
+        _after_update,
+        LabEntry.from_row(new_lab) if new_lab is not None else None,
+        db_reservation.id, db_reservation.owner_id, ReservationDoc.from_row(db_reservation),
+        old_lab, (old_start_time, old_end_time),
+        db_reservation.lab_id, (update_data["start_time"], update_data["end_time"]) if moves else None,
+    )
+
+def update_reservation(db: Session, db_reservation: ReservationModel, reservation_in: ReservationUpdate) -> ReservationModel:
+    """
+    Actualiza una reserva en la base de datos.
+    Si cambia el laboratorio o el horario se vuelve a comprobar que no haya choques;
+    al mover solo start_time se conserva la duración original.
+    """
+    db_reservation, after_commit = _update_reservation(db, db_reservation, reservation_in)
+    after_commit()
     return db_reservation
 
+def _after_delete(reservation_id: int, owner_id: int, lab_id: int, interval: Tuple[datetime, datetime]) -> None:
+    reservation_index.remove(reservation_id)
+    _sync_availability(lab_id, removed=interval)
+    _sync_retrieval(reservation_id, None)
+    _bump_versions(owner_id)
+
+def _soft_delete_reservation(db: Session, db_reservation: ReservationModel) -> Tuple[ReservationModel, AfterCommit]:
+    db_reservation.deleted_at = datetime.utcnow()
+    bump_rollup(db, db_reservation.lab_id, db_reservation.start_time, -1)
+    after_commit = partial(
+        _after_delete, db_reservation.id, db_reservation.owner_id,
+        db_reservation.lab_id, (db_reservation.start_time, db_reservation.end_time),
+    )
+    db.commit()
+    return db_reservation, after_commit
+
 def soft_delete_reservation(db: Session, db_reservation: ReservationModel) -> ReservationModel:
     """
     Realiza un borrado suave de una reserva.
     """
-    db_reservation.deleted_at = datetime.utcnow()
-    db.commit()
-    return db_reservation
\ No newline at end of file
+    db_reservation, after_commit = _soft_delete_reservation(db, db_reservation)
+    after_commit()
+    return db_reservation
+
+def _occupancy(db: Session, lab_id: int, days: List[date]) -> Dict[date, int]:
+    """
+    Bitsets de ocupación de `days` para esta consulta: los del índice y, para los
+    que falten, cargados de la base (una consulta por laboratorio).
+    """
+    version = get_counter(lab_scope(lab_id))
+    occupancy = availability_index.cached_days(lab_id, version, days)
+    missing = [day for day in days if day not in occupancy]
+    if not missing:
+        return occupancy
+    lo = datetime.combine(min(missing), datetime.min.time(), tzinfo=timezone.utc)
+    hi = datetime.combine(max(missing) + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    rows = db.query(ReservationModel.start_time, ReservationModel.end_time).filter(
+        ReservationModel.lab_id == lab_id,
+        ReservationModel.deleted_at == None,
+        ReservationModel.start_time > lo - timedelta(minutes=settings.RESERVATION_MAX_MINUTES),
+        ReservationModel.start_time < hi,
+    ).all()
+    occupancy.update(availability_index.load(lab_id, version, missing, rows))
+    return occupancy
+
+def find_free_slots(
+    db: Session,
+    lab_names: List[str],
+    start_date: date,
+    end_date: date,
+    duration_minutes: int,
+    open_hour: int,
+    close_hour: int,
+) -> List[dict]:
+    """
+    Huecos libres de al menos duration_minutes dentro del horario [open_hour, close_hour)
+    (UTC) de cada día, por laboratorio. Cada hueco es un tramo libre maximal.
+    Un laboratorio que no está en el catálogo no tiene reservas: todo libre.
+    """
+    slot = availability_index.slot_minutes
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    business = ((1 << ((close_hour - open_hour) * 60 // slot)) - 1) << (open_hour * 60 // slot)
+    min_slots = -(-duration_minutes // slot)
+
+    results = []
+    for lab_name in lab_names:
+        lab_id = lab_catalog.id_for(lab_name)
+        occupancy = _occupancy(db, lab_id, days) if lab_id is not None else dict.fromkeys(days, 0)
+        free = []
+        for day in days:
+            midnight = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+            bits = business & ~occupancy[day]
+            for first, length in free_runs(bits):
+                if length >= min_slots:
+                    free.append({
+                        "start": midnight + timedelta(minutes=first * slot),
+                        "end": midnight + timedelta(minutes=(first + length) * slot),
+                    })
+        results.append({"lab_name": lab_name, "free": free})
+    return results
+
+
+# --- Variantes async (AsyncSession) ---
+# Las escrituras reutilizan la parte de base de datos con run_sync: se ejecuta
+# sobre el driver async (asyncpg/aiosqlite) sin bloquear el event loop. Lo
+# posterior al commit usa el cliente síncrono de Redis (y puede recargar cachés
+# desde la base), así que va a un hilo. Por lo mismo, el catálogo de
+# laboratorios se pone al día antes (ensure_fresh_async) y no dentro de run_sync.
+
+async def create_reservation_async(db: AsyncSession, reservation_in: ReservationCreate, owner_id: int) -> ReservationModel:
+    await lab_catalog.ensure_fresh_async()
+    db_reservation, after_commit = await db.run_sync(_create_reservation, reservation_in, owner_id)
+    await asyncio.to_thread(after_commit)
+    return db_reservation
+
+async def get_reservation_by_id_async(db: AsyncSession, reservation_id: int, owner_id: int) -> ReservationModel | None:
+    result = await db.execute(
+        select(ReservationModel).where(
+            ReservationModel.id == reservation_id,
+            ReservationModel.owner_id == owner_id,
+            ReservationModel.deleted_at == None
+        )
+    )
+    return result.scalars().first()
+
+async def get_recent_reservations_async(db: AsyncSession, limit: int = 10):
+    """Últimas reservas vigentes (solo las columnas que usa el contexto de la IA)."""
+    result = await db.execute(
+        select(
+            Lab.name.label("lab_name"), ReservationModel.reserved_by,
+            ReservationModel.purpose, ReservationModel.start_time
+        )
+        .join(Lab, Lab.id == ReservationModel.lab_id)
+        .where(ReservationModel.deleted_at == None)
+        .order_by(ReservationModel.start_time.desc())
+        .limit(limit)
+    )
+    return result.all()
+
+def search_reservation_history(question: str, limit: int = 10) -> List[ReservationDoc]:
+    """
+    Reservas vigentes más relevantes para la pregunta (BM25 sobre propósito,
+    laboratorio y persona). Bloqueante la primera vez: llamar fuera del event loop.
+    """
+    retrieval_index.ensure_fresh(get_counter(RESERVATIONS))
+    return retrieval_index.search(question, limit)
+
+async def list_reservations_async(db: AsyncSession, owner_id: int, **filters):
+    if filters.get("lab_name"):
+        await lab_catalog.ensure_fresh_async()
+    return await db.run_sync(lambda s: list_reservations(s, owner_id, **filters))
+
+async def update_reservation_async(db: AsyncSession, db_reservation: ReservationModel, reservation_in: ReservationUpdate) -> ReservationModel:
+    if reservation_in.lab_name is not None:
+        await lab_catalog.ensure_fresh_async()
+    db_reservation, after_commit = await db.run_sync(_update_reservation, db_reservation, reservation_in)
+    await asyncio.to_thread(after_commit)
+    return db_reservation
+
+async def soft_delete_reservation_async(db: AsyncSession, db_reservation: ReservationModel) -> ReservationModel:
+    db_reservation, after_commit = await db.run_sync(_soft_delete_reservation, db_reservation)
+    await asyncio.to_thread(after_commit)
+    return db_reservation
@@ -0,0 +1,121 @@
+"""
+Rollups de ocupación para /reservations/analysis/popular-times.
+
+En lugar de agrupar toda la tabla reservations en cada petición, se mantiene un
+contador por (laboratorio, hora) que el CRUD de reservas ajusta (+1/-1) dentro de
+la misma transacción. rebuild_rollups() los reconstruye desde la tabla original
+por si alguna vez divergen (cargas masivas, ediciones manuales...).
+
+Reconciliación manual:
+    python -m app.crud.rollup
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+from sqlalchemy import Integer, cast, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.lab import Lab
+from app.models.reservation import Reservation as ReservationModel
+from app.models.rollup import ReservationRollup
+
+
+def rollup_hour(start_time: datetime) -> int:
+    """Hora UTC con la que se agrupa una reserva."""
+    if start_time.tzinfo is not None:
+        start_time = start_time.astimezone(timezone.utc)
+    return start_time.hour
+
+
+def utc_hour_expr(dialect: str, column):
+    """Expresión SQL con la hora UTC (entero) de una columna de fecha."""
+    if dialect == "postgresql":
+        return cast(func.extract("hour", func.timezone("UTC", column)), Integer)
+    return cast(func.strftime("%H", column), Integer)
+
+
+def bump_rollup(db: Session, lab_id: int, start_time: datetime, delta: int) -> None:
+    """Suma delta al contador (lab_id, hora) con un upsert atómico (sin commit)."""
+    dialect = db.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = insert(ReservationRollup).values(
+        lab_id=lab_id, hour=rollup_hour(start_time), count=delta
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ReservationRollup.lab_id, ReservationRollup.hour],
+        set_={"count": ReservationRollup.count + delta},
+    )
+    db.execute(stmt)
+
+
+def _popular_times_statements():
+    hours = (
+        select(ReservationRollup.hour, func.sum(ReservationRollup.count).label("count"))
+        .where(ReservationRollup.count > 0)
+        .group_by(ReservationRollup.hour)
+        .order_by(ReservationRollup.hour)
+    )
+    # Se agrupa por lab_id (entero); el nombre se une por clave primaria de labs
+    labs = (
+        select(Lab.name.label("lab_name"), func.sum(ReservationRollup.count).label("count"))
+        .join(Lab, Lab.id == ReservationRollup.lab_id)
+        .where(ReservationRollup.count > 0)
+        .group_by(ReservationRollup.lab_id, Lab.name)
+        .order_by(func.sum(ReservationRollup.count).desc())
+    )
+    return hours, labs
+
+
+def _format_popular_times(hour_rows, lab_rows) -> Dict[str, Any]:
+    return {
+        "popular_hours": [{"hour": row.hour, "count": int(row.count)} for row in hour_rows],
+        "popular_labs": [{"lab_name": row.lab_name, "count": int(row.count)} for row in lab_rows],
+    }
+
+
+def get_popular_times(db: Session) -> Dict[str, Any]:
+    """Horas y laboratorios más populares leídos del rollup: O(labs × horas)."""
+    hours, labs = _popular_times_statements()
+    return _format_popular_times(db.execute(hours).all(), db.execute(labs).all())
+
+
+async def get_popular_times_async(db: AsyncSession) -> Dict[str, Any]:
+    hours, labs = _popular_times_statements()
+    return _format_popular_times((await db.execute(hours)).all(), (await db.execute(labs)).all())
+
+
+def rebuild_rollups(db: Session) -> int:
+    """
+    Recalcula todos los contadores desde reservations y hace commit.
+    En PostgreSQL se bloquea la tabla de rollups mientras tanto, de modo que las
+    escrituras concurrentes aplican su +1/-1 sobre el resultado ya reconstruido.
+    Devuelve el número de filas (laboratorio, hora) generadas.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        db.execute(text("LOCK TABLE reservation_rollups IN EXCLUSIVE MODE"))
+    hour_expr = utc_hour_expr(dialect, ReservationModel.start_time)
+
+    rows = db.execute(
+        select(ReservationModel.lab_id, hour_expr.label("hour"), func.count(ReservationModel.id).label("count"))
+        .where(ReservationModel.deleted_at == None)
+        .group_by(ReservationModel.lab_id, hour_expr)
+    ).all()
+
+    db.query(ReservationRollup).delete()
+    if rows:
+        db.execute(
+            ReservationRollup.__table__.insert(),
+            [{"lab_id": r.lab_id, "hour": r.hour, "count": r.count} for r in rows],
+        )
+    db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    with SessionLocal() as session:
+        print(f"Rollups reconstruidos: {rebuild_rollups(session)} filas (laboratorio, hora)")
@@ -0,0 +1,79 @@
+"""
+Búsqueda de reservas por texto (purpose y reserved_by), ordenada por relevancia.
+
+PostgreSQL usa la columna generada search_vector (GIN) con websearch_to_tsquery
+y ts_rank_cd; SQLite, la tabla FTS5 reservations_fts con bm25(). En ambos casos
+la puntuación es "mayor = más relevante" y se pagina por clave (puntuación, id)
+descendente, así que cada página cuesta lo mismo.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Float, cast, column, func, literal_column, select, table, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.fulltext import FTS_TABLE, SEARCH_VECTOR, TS_CONFIG
+from app.models.reservation import Reservation as ReservationModel
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+_fts = table(FTS_TABLE, column("rowid"))
+
+
+def fts5_query(q: str) -> Optional[str]:
+    """Términos del usuario como frase FTS5 segura: cada palabra entre comillas, todas requeridas."""
+    terms = _TERM.findall(q)
+    return " ".join(f'"{term}"' for term in terms) or None
+
+
+def _score_and_filter(dialect: str, q: str):
+    if dialect == "postgresql":
+        tsquery = func.websearch_to_tsquery(TS_CONFIG, q)
+        vector = literal_column(f"reservations.{SEARCH_VECTOR}")
+        return cast(func.ts_rank_cd(vector, tsquery), Float), vector.op("@@")(tsquery), None
+    match = fts5_query(q)
+    if match is None:
+        return None
+    fts = literal_column(FTS_TABLE)
+    # bm25() es menor cuanto más relevante: se invierte el signo
+    return -func.bm25(fts), fts.op("MATCH")(match), _fts.c.rowid == ReservationModel.id
+
+
+def search_reservations(
+    db: Session,
+    q: str,
+    owner_id: Optional[int] = None,
+    cursor_values: Optional[Tuple[float, int]] = None,
+    limit: int = 20,
+) -> Tuple[List[Tuple[ReservationModel, float]], Optional[Tuple[float, int]]]:
+    """
+    Reservas vigentes que coinciden con `q` (opcionalmente solo las de owner_id),
+    de más a menos relevante. Devuelve ([(reserva, puntuación)], siguiente cursor).
+    """
+    parts = _score_and_filter(db.get_bind().dialect.name, q)
+    if parts is None:
+        return [], None
+    score, matches, join_on = parts
+
+    score_col = score.label("score")
+    inner = select(ReservationModel.id.label("id"), score_col).where(matches, ReservationModel.deleted_at == None)
+    if join_on is not None:
+        inner = inner.select_from(_fts).join(ReservationModel, join_on)
+    if owner_id is not None:
+        inner = inner.where(ReservationModel.owner_id == owner_id)
+    ranked = inner.subquery()
+
+    stmt = select(ReservationModel, ranked.c.score).join(ranked, ranked.c.id == ReservationModel.id)
+    if cursor_values is not None:
+        stmt = stmt.where(tuple_(ranked.c.score, ranked.c.id) < tuple_(*cursor_values))
+    rows = db.execute(stmt.order_by(ranked.c.score.desc(), ranked.c.id.desc()).limit(limit + 1)).all()
+
+    next_values = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_values = (rows[-1][1], rows[-1][0].id)
+    return [(reservation, score) for reservation, score in rows], next_values
+
+
+async def search_reservations_async(db: AsyncSession, q: str, **filters):
+    return await db.run_sync(lambda s: search_reservations(s, q, **filters))
@@ -1,10 +1,29 @@
+import asyncio
 from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.models.user import User
-from app.core.security import get_password_hash, verify_password
+from app.core.cache import cache_delete, cache_get_json, cache_set_json
+from app.core.config import settings
+from app.core.security import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_and_update_password_async,
+    verify_password,
+)
 from app.schemas.user import UserUpdate
 
+# Campos del usuario que se guardan en caché (nunca el hash de la contraseña)
+_CACHED_FIELDS = ("id", "username", "full_name", "email", "is_active")
+
+def _user_cache_key(username: str) -> str:
+    return f"auth:user:{username}"
+
+def invalidate_cached_user(username: str) -> None:
+    cache_delete(_user_cache_key(username))
+
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
 
@@ -14,12 +33,31 @@ def get_user_by_email(db: Session, email: str):
 def get_user_by_username(db: Session, username: str) -> Optional[User]:
     return db.query(User).filter(User.username == username).first()
 
-def create_user(db: Session, username: str, password: str, full_name: Optional[str] = None, email: Optional[str] = None) -> User:
+def get_user_by_username_cached(db: Session, username: str) -> Optional[User]:
+    """
+    Igual que get_user_by_username pero consultando antes la caché (Redis o local).
+    Devuelve un User desacoplado de la sesión con los campos básicos; no debe
+    usarse para comprobar la contraseña.
+    """
+    cached = cache_get_json(_user_cache_key(username))
+    if cached is not None:
+        return User(**cached)
+    user = get_user_by_username(db, username)
+    if user is not None:
+        cache_set_json(
+            _user_cache_key(username),
+            {field: getattr(user, field) for field in _CACHED_FIELDS},
+            settings.AUTH_USER_CACHE_TTL,
+        )
+    return user
+
+def create_user(db: Session, username: str, password: str, full_name: Optional[str] = None, email: Optional[str] = None, hashed_password: Optional[str] = None) -> User:
+    """Crea un usuario. Si ya se calculó el hash (p. ej. en el pool de bcrypt) se pasa en hashed_password."""
     user = User(
         username=username,
         full_name=full_name,
         email=email,
-        hashed_password=get_password_hash(password),
+        hashed_password=hashed_password or get_password_hash(password),
         is_active=True
     )
     db.add(user)
@@ -35,22 +73,109 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
         return None
     return user
 
-def update_user(db: Session, user_id: int, user_update: UserUpdate):
+# update_user y delete_user devuelven también el nombre de usuario cuya caché
+# hay que invalidar tras el commit (None si no existía): las variantes async
+# hacen esa llamada a Redis en un hilo, fuera de run_sync.
+
+def _update_user(db: Session, user_id: int, user_update: UserUpdate, hashed_password: Optional[str] = None):
     db_user = get_user(db, user_id)
-    if db_user:
-        data = user_update.model_dump(exclude_unset=True) if hasattr(user_update, "model_dump") else user_update.dict(exclude_unset=True)
-        # si se incluye password, hashearla
-        if "password" in data and data["password"] is not None:
-            db_user.hashed_password = get_password_hash(data.pop("password"))
-        for key, value in data.items():
-            setattr(db_user, key, value)
-        db.commit()
-        db.refresh(db_user)
+    if not db_user:
+        return None, None
+    cached_username = db_user.username
+    data = user_update.model_dump(exclude_unset=True) if hasattr(user_update, "model_dump") else user_update.dict(exclude_unset=True)
+    # si se incluye password, hashearla (o usar el hash ya calculado)
+    if "password" in data and data["password"] is not None:
+        password = data.pop("password")
+        db_user.hashed_password = hashed_password or get_password_hash(password)
+    for key, value in data.items():
+        setattr(db_user, key, value)
+    db.commit()
+    db.refresh(db_user)
+    return db_user, cached_username
+
+def update_user(db: Session, user_id: int, user_update: UserUpdate, hashed_password: Optional[str] = None):
+    db_user, cached_username = _update_user(db, user_id, user_update, hashed_password)
+    if cached_username is not None:
+        invalidate_cached_user(cached_username)
     return db_user
 
-def delete_user(db: Session, user_id: int):
+def _delete_user(db: Session, user_id: int):
     db_user = get_user(db, user_id)
-    if db_user:
-        db.delete(db_user)
-        db.commit()
-    return db_user
\ No newline at end of file
+    if not db_user:
+        return None, None
+    cached_username = db_user.username
+    db.delete(db_user)
+    db.commit()
+    return db_user, cached_username
+
+def delete_user(db: Session, user_id: int):
+    db_user, cached_username = _delete_user(db, user_id)
+    if cached_username is not None:
+        invalidate_cached_user(cached_username)
+    return db_user
+
+
+# --- Variantes async (AsyncSession) ---
+
+async def get_user_async(db: AsyncSession, user_id: int) -> Optional[User]:
+    return await db.get(User, user_id)
+
+async def get_user_by_username_async(db: AsyncSession, username: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
+
+async def get_user_by_username_cached_async(db: AsyncSession, username: str) -> Optional[User]:
+    """
+    Versión async de get_user_by_username_cached (misma caché y mismas claves).
+    El cliente de Redis es síncrono: se usa en un hilo para no frenar el event loop.
+    """
+    cached = await asyncio.to_thread(cache_get_json, _user_cache_key(username))
+    if cached is not None:
+        return User(**cached)
+    user = await get_user_by_username_async(db, username)
+    if user is not None:
+        await asyncio.to_thread(
+            cache_set_json,
+            _user_cache_key(username),
+            {field: getattr(user, field) for field in _CACHED_FIELDS},
+            settings.AUTH_USER_CACHE_TTL,
+        )
+    return user
+
+# bcrypt se calcula en el pool acotado de app.core.security, nunca en el event loop;
+# estas funciones pueden lanzar PasswordPoolBusyError si el pool está lleno.
+
+async def create_user_async(db: AsyncSession, username: str, password: str, full_name: Optional[str] = None, email: Optional[str] = None) -> User:
+    hashed_password = await get_password_hash_async(password)
+    return await db.run_sync(create_user, username, password, full_name, email, hashed_password)
+
+async def update_user_async(db: AsyncSession, user_id: int, user_update: UserUpdate):
+    hashed_password = None
+    if user_update.password is not None:
+        hashed_password = await get_password_hash_async(user_update.password)
+    db_user, cached_username = await db.run_sync(_update_user, user_id, user_update, hashed_password)
+    if cached_username is not None:
+        await asyncio.to_thread(invalidate_cached_user, cached_username)
+    return db_user
+
+async def authenticate_user_async(db: AsyncSession, username: str, password: str) -> Optional[User]:
+    """
+    Autentica verificando la contraseña en el pool de bcrypt. Si el hash guardado
+    usa un coste distinto de BCRYPT_ROUNDS, se regenera y guarda en ese momento.
+    """
+    user = await get_user_by_username_async(db, username)
+    if not user:
+        return None
+    valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+async def delete_user_async(db: AsyncSession, user_id: int):
+    db_user, cached_username = await db.run_sync(_delete_user, user_id)
+    if cached_username is not None:
+        await asyncio.to_thread(invalidate_cached_user, cached_username)
+    return db_user
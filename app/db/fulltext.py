@@ -0,0 +1,80 @@
+"""
+Búsqueda de texto completo en reservas (purpose y reserved_by).
+
+- PostgreSQL: columna generada `search_vector` (tsvector, STORED) con GIN. La
+  calcula la propia base en cada INSERT/UPDATE; no la mapea el modelo ORM.
+- SQLite (local/tests): tabla virtual FTS5 `reservations_fts` de contenido
+  externo, mantenida por triggers sobre `reservations`.
+
+install_fulltext() lo crea en ambos motores (migración 0006 y create_all).
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+FTS_TABLE = "reservations_fts"
+SEARCH_VECTOR = "search_vector"
+SEARCH_INDEX = "ix_reservations_search"
+# Configuración de tsvector: propósito con raíces en español, personas tal cual
+TS_CONFIG = "spanish"
+
+_PG_STATEMENTS = (
+    f"""
+    ALTER TABLE reservations ADD COLUMN IF NOT EXISTS {SEARCH_VECTOR} tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{TS_CONFIG}', coalesce(purpose, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(reserved_by, '')), 'B')
+    ) STORED
+    """,
+    f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON reservations USING gin ({SEARCH_VECTOR})",
+)
+
+_SQLITE_STATEMENTS = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        purpose, reserved_by,
+        content='reservations', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON reservations BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, purpose, reserved_by) VALUES (new.id, new.purpose, new.reserved_by);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON reservations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, purpose, reserved_by)
+        VALUES ('delete', old.id, old.purpose, old.reserved_by);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF purpose, reserved_by ON reservations BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, purpose, reserved_by)
+        VALUES ('delete', old.id, old.purpose, old.reserved_by);
+        INSERT INTO {FTS_TABLE}(rowid, purpose, reserved_by) VALUES (new.id, new.purpose, new.reserved_by);
+    END
+    """,
+)
+
+
+def install_fulltext(conn: Connection, backfill: bool = False) -> None:
+    """Crea la columna/índice (PostgreSQL) o la tabla FTS5 y sus triggers (SQLite)."""
+    if conn.dialect.name == "postgresql":
+        # La columna generada se rellena sola al añadirla
+        for statement in _PG_STATEMENTS:
+            conn.execute(text(statement))
+    elif conn.dialect.name == "sqlite":
+        for statement in _SQLITE_STATEMENTS:
+            conn.execute(text(statement))
+        if backfill:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def uninstall_fulltext(conn: Connection) -> None:
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"DROP INDEX IF EXISTS {SEARCH_INDEX}"))
+        conn.execute(text(f"ALTER TABLE reservations DROP COLUMN IF EXISTS {SEARCH_VECTOR}"))
+    elif conn.dialect.name == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
@@ -0,0 +1,55 @@
+"""
+Inicialización de la base de datos fuera del arranque de los workers.
+
+- create_all de las tablas (solo para desarrollo; en producción manda Alembic).
+- Usuario admin por defecto si no existe (cuesta un hash bcrypt).
+- Particiones de auditoría de los próximos meses (solo PostgreSQL).
+
+Por defecto (DB_AUTO_INIT=false) se lanza una vez por despliegue:
+
+    alembic upgrade head && python -m app.db.init_db
+
+Con DB_AUTO_INIT=true (desarrollo) lo ejecuta cada worker al arrancar.
+"""
+from datetime import datetime, timezone
+
+from app.core.config import settings
+from app.crud.user import create_user, get_user_by_username
+from app.db.base import Base
+from app.db.partitions import add_months, ensure_audit_partitions
+from app.db.session import SessionLocal, engine
+
+
+def init_db(create_schema: bool = True) -> None:
+    """Crea las tablas (opcional), el usuario admin y las particiones de auditoría."""
+    if create_schema:
+        Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        if not get_user_by_username(db, "admin"):
+            create_user(
+                db,
+                username="admin",
+                password="admin123",
+                full_name="Administrador",
+                email="admin@example.com"
+            )
+            print("✅ Usuario admin creado (admin / admin123)")
+    except Exception as e:
+        print(f"⚠️ Error al crear usuario admin: {e}")
+    finally:
+        db.close()
+
+    # Particiones mensuales de auditoría de los próximos meses (solo PostgreSQL)
+    try:
+        today = datetime.now(timezone.utc).date()
+        with engine.begin() as conn:
+            ensure_audit_partitions(conn, today, add_months(today, settings.AUDIT_PARTITION_MONTHS_AHEAD))
+    except Exception as e:
+        print(f"⚠️ Error al crear particiones de auditoría: {e}")
+
+
+if __name__ == "__main__":
+    # Tras `alembic upgrade head` el esquema ya existe: solo datos iniciales
+    init_db(create_schema=False)
@@ -0,0 +1,128 @@
+"""
+Particionado mensual de audit_logs (solo PostgreSQL).
+
+La tabla se convierte en una tabla particionada por RANGE (timestamp) en la
+migración 0003; aquí están las tareas de mantenimiento:
+
+- ensure_audit_partitions(): crea por adelantado las particiones de los próximos meses.
+- archive_audit_partitions(): separa (DETACH) las particiones antiguas y las mueve
+  al esquema de archivo, donde pueden exportarse o eliminarse sin tocar la tabla viva.
+
+En SQLite (local/tests) audit_logs es una tabla normal y estas funciones no hacen nada.
+
+Uso manual:
+    python -m app.db.partitions ensure
+    python -m app.db.partitions archive --before 2025-01-01
+"""
+import argparse
+from datetime import date, datetime, timezone
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+AUDIT_TABLE = "audit_logs"
+ARCHIVE_SCHEMA = "archive"
+
+
+def month_floor(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{AUDIT_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = :table AND pg_table_is_visible(c.oid)
+    """), {"table": AUDIT_TABLE}).first())
+
+
+def ensure_audit_partitions(conn: Connection, start: date, end: date) -> List[str]:
+    """Crea (si faltan) las particiones mensuales de start a end, ambos incluidos."""
+    if not is_partitioned(conn):
+        return []
+    created = []
+    month = month_floor(start)
+    while month <= month_floor(end):
+        name = partition_name(month)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {AUDIT_TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+        created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def list_audit_partitions(conn: Connection) -> List[Tuple[str, date]]:
+    """Particiones mensuales adjuntas, ordenadas por mes (sin la partición DEFAULT)."""
+    if not is_partitioned(conn):
+        return []
+    rows = conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table
+    """), {"table": AUDIT_TABLE}).scalars().all()
+    prefix = f"{AUDIT_TABLE}_y"
+    partitions = []
+    for name in rows:
+        if not name.startswith(prefix):
+            continue
+        year, month = name[len(prefix):].split("m")
+        partitions.append((name, date(int(year), int(month), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def archive_audit_partitions(conn: Connection, before: date, archive_schema: str = ARCHIVE_SCHEMA) -> List[str]:
+    """
+    Separa las particiones cuyo mes termina antes de `before` y las mueve a
+    `archive_schema`. Los datos no se borran: quedan fuera de las consultas
+    de la tabla viva y pueden exportarse (pg_dump -t) o eliminarse después.
+    """
+    archived = []
+    for name, month in list_audit_partitions(conn):
+        if add_months(month, 1) > before:
+            continue
+        conn.execute(text(f"ALTER TABLE {AUDIT_TABLE} DETACH PARTITION {name}"))
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+        conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+        archived.append(f"{archive_schema}.{name}")
+    return archived
+
+
+def _main():
+    from app.core.config import settings
+    from app.db.session import engine
+
+    parser = argparse.ArgumentParser(description="Mantenimiento de particiones de auditoría")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("ensure", help="Crea las particiones de los próximos meses")
+    archive = sub.add_parser("archive", help="Separa y archiva particiones antiguas")
+    archive.add_argument("--before", required=True, type=date.fromisoformat)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if args.command == "ensure":
+            today = datetime.now(timezone.utc).date()
+            names = ensure_audit_partitions(
+                conn, today, add_months(today, settings.AUDIT_PARTITION_MONTHS_AHEAD)
+            )
+        else:
+            names = archive_audit_partitions(conn, args.before)
+    print("\n".join(names) or "Nada que hacer (¿audit_logs no está particionada?)")
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,9 +1,157 @@
-from typing import Generator
+import threading
+import time
+from typing import AsyncGenerator, Dict, Generator
 from sqlalchemy import create_engine
+from sqlalchemy import exc
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
+from app.core.metrics import instrument_engine
 
-engine = create_engine(settings.DATABASE_URL, future=True)
+
+# --- Registro de engines y estadísticas del pool ---
+# Todo el proceso usa los engines de este módulo (uno síncrono y uno async, cada
+# uno con su pool), así el número de conexiones por worker es el que fija la
+# configuración: DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE +
+# DB_ASYNC_MAX_OVERFLOW como máximo.
+
+class PoolStats:
+    """Contadores acumulados de un pool: esperas, desbordes y timeouts."""
+
+    # La espera reciente pierde la mitad de su peso cada RECENT_HALFLIFE segundos
+    # sin checkouts: si se deja de pedir conexiones (p. ej. porque se descarta
+    # carga) vuelve sola a cero.
+    RECENT_HALFLIFE = 5.0
+    RECENT_WEIGHT = 0.2
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self._recent_wait = 0.0
+        self._recent_at = time.monotonic()
+
+    def _decayed_wait(self, now: float) -> float:
+        return self._recent_wait * 0.5 ** ((now - self._recent_at) / self.RECENT_HALFLIFE)
+
+    def recent_wait(self) -> float:
+        """Media móvil de la espera por conexión (segundos), con decaimiento temporal."""
+        return self._decayed_wait(time.monotonic())
+
+    def _blend_recent(self, waited: float) -> None:
+        now = time.monotonic()
+        self._recent_wait = self._decayed_wait(now) * (1 - self.RECENT_WEIGHT) + waited * self.RECENT_WEIGHT
+        self._recent_at = now
+
+    def record(self, waited: float, overflowed: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self._blend_recent(waited)
+            if overflowed:
+                self.overflow_events += 1
+
+    def record_timeout(self, waited: float) -> None:
+        with self._lock:
+            self.timeouts += 1
+            self._blend_recent(waited)
+
+
+class _InstrumentedPoolMixin:
+    """Mide cuánto se espera por una conexión y cuándo se abre una de desborde."""
+
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        overflow_before = self._overflow
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.perf_counter() - started)
+            raise
+        self.stats.record(time.perf_counter() - started, self._overflow > max(overflow_before, 0))
+        return entry
+
+    def recreate(self):
+        # dispose() crea un pool nuevo: las estadísticas siguen siendo las mismas
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_options(url: URL, pool_class, pool_size: int, max_overflow: int) -> dict:
+    """Opciones de pool desde Settings (solo si el dialecto usa un QueuePool)."""
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    default_pool = url.get_dialect().get_pool_class(url)
+    if issubclass(default_pool, QueuePool):
+        options.update(
+            poolclass=pool_class,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
+
+
+_engines: Dict[str, Engine] = {}
+
+
+def _register(name: str, sync_engine: Engine) -> None:
+    if isinstance(sync_engine.pool, _InstrumentedPoolMixin):
+        sync_engine.pool.stats = PoolStats()
+    instrument_engine(sync_engine, name)
+    _engines[name] = sync_engine
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Estado actual de cada pool registrado (para /health/db y métricas)."""
+    report = {}
+    for name, registered in _engines.items():
+        pool = registered.pool
+        entry = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(size=pool.size(), checked_in=pool.checkedin(), checked_out=pool.checkedout(), overflow=max(pool.overflow(), 0))
+        stats = getattr(pool, "stats", None)
+        if stats is not None:
+            entry.update(
+                checkouts=stats.checkouts,
+                wait_seconds_total=round(stats.wait_seconds_total, 6),
+                max_wait_seconds=round(stats.max_wait_seconds, 6),
+                overflow_events=stats.overflow_events,
+                timeouts=stats.timeouts,
+                recent_wait_seconds=round(stats.recent_wait(), 6),
+            )
+        report[name] = entry
+    return report
+
+
+def recent_pool_wait() -> float:
+    """Mayor espera reciente por conexión entre los pools del proceso (descarte de carga)."""
+    all_stats = [getattr(registered.pool, "stats", None) for registered in _engines.values()]
+    return max((stats.recent_wait() for stats in all_stats if stats is not None), default=0.0)
+
+
+_sync_url = make_url(settings.DATABASE_URL)
+engine = create_engine(_sync_url, future=True, **_pool_options(
+    _sync_url, InstrumentedQueuePool, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW,
+))
+_register("sync", engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
 def get_db() -> Generator:
@@ -11,4 +159,31 @@ def get_db() -> Generator:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- Ruta async (asyncpg / aiosqlite) para los endpoints async def ---
+
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str) -> URL:
+    """Traduce la DATABASE_URL síncrona a su driver async equivalente."""
+    parsed = make_url(url)
+    return parsed.set(drivername=_ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername))
+
+_async_url = to_async_url(settings.DATABASE_URL)
+async_engine = create_async_engine(_async_url, **_pool_options(
+    _async_url, InstrumentedAsyncQueuePool, settings.DB_ASYNC_POOL_SIZE, settings.DB_ASYNC_MAX_OVERFLOW,
+))
+_register("async", async_engine.sync_engine)
+# expire_on_commit=False: tras el commit los objetos siguen legibles sin otra consulta
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,22 +1,31 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 import os
+from functools import lru_cache
 
 # --- Routers principales ---
 from app.api.v1.endpoints import (
     auth as auth_router,
     reservations as reservations_router,
     audit as audit_router,
+    labs as labs_router,
 )
 # --- 💡 Nuevo router de Inteligencia Artificial ---
 from app.api.v1 import ai  # asegúrate de tener app/api/v1/ai.py
 
 # --- Base de datos ---
-from app.db.session import engine, SessionLocal
-from app.db.base import Base
-from app.crud.user import get_user_by_username, create_user
+from app.db.session import pool_stats
+from app.core.audit import audit_sink
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.ratelimit import RateLimitMiddleware
+from app.utils.retrieval import retrieval_index
+from app.core.config import settings
 
 # =====================================================
 # 🚀 CONFIGURACIÓN PRINCIPAL DE LA APLICACIÓN
@@ -30,6 +39,9 @@ origins = [
     os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")[0]
 ]
 
+# --- Límite de peticiones y descarte de carga (429/503), por dentro de CORS y métricas ---
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -38,33 +50,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Métricas (latencia por ruta, consultas SQL por petición...) en /metrics ---
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# --- Perfilado por petición (X-Profile o muestreo), solo en depuración ---
+if settings.PROFILING_ENABLED:
+    from app.core.profiler import ProfilerMiddleware
+
+    app.add_middleware(ProfilerMiddleware)
+
 # --- Archivos estáticos y plantillas (HTML, CSS) ---
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
-templates = Jinja2Templates(directory="app/templates")
+
+
+@lru_cache(maxsize=1)
+def get_templates():
+    """Jinja2 se carga con la primera página HTML, no al arrancar el worker."""
+    from fastapi.templating import Jinja2Templates
+
+    return Jinja2Templates(directory="app/templates")
+
+
+# Tiempos de arranque del worker (segundos), expuestos en /health
+startup_timings = {"import": 0.0, "startup": 0.0}
 
 # =====================================================
 # ⚙️ EVENTOS DE INICIO
 # =====================================================
 @app.on_event("startup")
 def on_startup():
-    """Crea las tablas y el usuario admin por defecto si no existe."""
-    Base.metadata.create_all(bind=engine)
-
-    db = SessionLocal()
-    try:
-        if not get_user_by_username(db, "admin"):
-            create_user(
-                db,
-                username="admin",
-                password="admin123",
-                full_name="Administrador",
-                email="admin@example.com"
-            )
-            print("✅ Usuario admin creado (admin / admin123)")
-    except Exception as e:
-        print(f"⚠️ Error al crear usuario admin: {e}")
-    finally:
-        db.close()
+    """
+    Con DB_AUTO_INIT crea tablas, usuario admin y particiones (desarrollo); si no,
+    el worker arranca sin tocar la base de datos (ver app/db/init_db.py).
+    """
+    started = time.perf_counter()
+    if settings.DB_AUTO_INIT:
+        from app.db.init_db import init_db
+
+        init_db()
+
+    # Hilo que vacía el buffer de auditoría por lotes
+    audit_sink.start()
+
+    startup_timings["startup"] = round(time.perf_counter() - started, 4)
+    total = startup_timings["import"] + startup_timings["startup"]
+    budget = settings.STARTUP_TIME_BUDGET_SECONDS
+    marker = "⏱️" if total <= budget else "⚠️"
+    print(
+        f"{marker} Arranque en {total:.3f}s (import {startup_timings['import']:.3f}s, "
+        f"startup {startup_timings['startup']:.3f}s; presupuesto {budget}s)"
+    )
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    """Escribe la auditoría pendiente y guarda el índice de búsqueda antes de apagar el worker."""
+    audit_sink.shutdown()
+    retrieval_index.save()
 
 
 # =====================================================
@@ -74,21 +117,42 @@ def on_startup():
 async def root():
     return {"message": "Bienvenido al Sistema de Reservas de Laboratorio"}
 
+@app.get("/health", tags=["Health"])
+def health():
+    """Comprobación de vida para el balanceador: no toca la base de datos."""
+    return {
+        "status": "ok",
+        "startup_seconds": startup_timings,
+        "startup_budget_seconds": settings.STARTUP_TIME_BUDGET_SECONDS,
+    }
+
+@app.get("/health/db", tags=["Health"])
+def db_health():
+    """Estado de los pools de conexiones del worker (conexiones en uso, esperas, desbordes)."""
+    return pool_stats()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas del worker en formato de texto de Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/login", tags=["Login Page"])
 def login_page(request: Request):
     """Renderiza la página de login en HTML (solo si usas plantillas)."""
-    return templates.TemplateResponse("login.html", {"request": request})
+    return get_templates().TemplateResponse("login.html", {"request": request})
 
 
 # =====================================================
 # 🧩 REGISTRO DE ROUTERS
 # =====================================================
-app.include_router(auth_router.router, prefix="/auth", tags=["Auth"])
-app.include_router(reservations_router.router, prefix="/reservations", tags=["Reservas"])
-app.include_router(audit_router.router, prefix="/audit", tags=["Auditoría"])
+# (cada router ya declara sus rutas completas: /auth/..., /reservations, /labs, /audit, /ai)
+app.include_router(auth_router.router, tags=["Auth"])
+app.include_router(reservations_router.router, tags=["Reservas"])
+app.include_router(labs_router.router, tags=["Laboratorios"])
+app.include_router(audit_router.router, tags=["Auditoría"])
 
 # --- ✅ Registrar el nuevo router de IA Conversacional ---
-app.include_router(ai.router, prefix="/ai", tags=["Inteligencia Artificial"])
+app.include_router(ai.router, tags=["Inteligencia Artificial"])
 
 
 # =====================================================
@@ -104,3 +168,6 @@ def env_check():
         "openai_key_present": bool(os.getenv("OPENAI_API_KEY")),
         "openai_model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
     }
+
+
+startup_timings["import"] = round(time.perf_counter() - _IMPORT_STARTED, 4)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Text
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -6,9 +6,16 @@ class AuditLog(Base):
     __tablename__ = "audit_logs"
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"))
     action = Column(String(50), nullable=False) 
     target_model = Column(String(100), nullable=False) 
     target_id = Column(Integer, nullable=False) 
-    details = Column(Text, nullable=True) 
+    details = Column(Text, nullable=True)
+
+    # En PostgreSQL la tabla está particionada por mes sobre timestamp (migración 0003)
+    # y la clave primaria real es (id, timestamp); el ORM sigue identificando por id.
+    __table_args__ = (
+        # Paginación por cursor (timestamp, id) descendente
+        Index("ix_audit_logs_timestamp_id", "timestamp", "id"),
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, func
+from app.db.base import Base
+
+class Lab(Base):
+    """
+    Catálogo de laboratorios. Las reservas lo referencian por lab_id (entero),
+    así que renombrar un laboratorio no toca la tabla reservations.
+    """
+    __tablename__ = "labs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(150), unique=True, nullable=False)
+    description = Column(Text, nullable=True)
+    capacity = Column(Integer, nullable=True)
+    # Un laboratorio dado de baja conserva su historial pero no admite reservas nuevas
+    is_active = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -1,16 +1,20 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index, event, func, text
 from sqlalchemy.orm import relationship
 from app.db.base import Base
+from app.db.fulltext import install_fulltext, uninstall_fulltext
 
 class Reservation(Base):
     __tablename__ = "reservations"
 
     id = Column(Integer, primary_key=True, index=True)
     
-    lab_name = Column(String(150), index=True, nullable=False)
+    # Entero (4 bytes) en lugar del nombre: filas e índices más pequeños
+    lab_id = Column(Integer, ForeignKey("labs.id"), nullable=False)
     reserved_by = Column(String(150), nullable=False)
     purpose = Column(String, nullable=False)
     start_time = Column(DateTime(timezone=True), nullable=False)
+    # Fin del intervalo [start_time, end_time) que ocupa la reserva
+    end_time = Column(DateTime(timezone=True), nullable=False)
     active = Column(Boolean, default=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -19,4 +23,28 @@ class Reservation(Base):
     deleted_at = Column(DateTime(timezone=True), nullable=True, default=None)
 
     owner_id = Column(Integer, ForeignKey("users.id"))
-    owner = relationship("User", back_populates="reservations")
\ No newline at end of file
+    owner = relationship("User", back_populates="reservations")
+
+    # Se carga en la misma consulta (JOIN por clave primaria de labs): leer
+    # lab_name al serializar no hace I/O, tampoco con AsyncSession
+    lab = relationship("Lab", lazy="joined", innerjoin=True)
+
+    @property
+    def lab_name(self) -> str | None:
+        return self.lab.name if self.lab is not None else None
+
+    __table_args__ = (
+        # Búsqueda de choques por laboratorio y rango de horas
+        Index("ix_reservations_lab_start", "lab_id", "start_time"),
+        # Listado del usuario: solo reservas vigentes, ordenadas por fecha
+        Index(
+            "ix_reservations_owner_start_live", "owner_id", "start_time",
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+    )
+
+
+# Búsqueda de texto completo (tsvector / FTS5) también en bases creadas con create_all
+event.listen(Reservation.__table__, "after_create", lambda target, conn, **kw: install_fulltext(conn))
+event.listen(Reservation.__table__, "before_drop", lambda target, conn, **kw: uninstall_fulltext(conn))
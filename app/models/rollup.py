@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from app.db.base import Base
+
+class ReservationRollup(Base):
+    """
+    Contador de reservas vigentes por (laboratorio, hora UTC de inicio).
+    Se actualiza en la misma transacción que cada alta, cambio o borrado suave;
+    los totales por laboratorio y por hora salen de sumar estas filas.
+    """
+    __tablename__ = "reservation_rollups"
+
+    lab_id = Column(Integer, ForeignKey("labs.id"), primary_key=True)
+    hour = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
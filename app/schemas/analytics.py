@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+
+class LabOccupancy(BaseModel):
+    lab_name: str
+    # Matrices 7 × 24: [día de la semana (lunes = 0)][hora UTC]
+    occupied_hours: List[List[float]]
+    occupancy: List[List[float]]
+
+
+class LeadTimePercentiles(BaseModel):
+    count: int
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+
+
+class OccupancyHeatmapOut(BaseModel):
+    start: datetime
+    end: datetime
+    labs: List[LabOccupancy]
+    lead_time_hours: LeadTimePercentiles
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class AuditLogOut(BaseModel):
     id: int
@@ -12,3 +12,10 @@ class AuditLogOut(BaseModel):
     details: Optional[str] = None
 
     model_config = {"from_attributes": True}
+
+# --- Página de auditoría (más reciente primero) ---
+# next_before se envía como ?before= para pedir los registros anteriores.
+class PaginatedAuditLogOut(BaseModel):
+    results: List[AuditLogOut]
+    size: int
+    next_before: Optional[str] = None
@@ -1,24 +1,39 @@
-import React, { useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
+import { streamChat } from "./src/streamChat";
+
+const API_URL = "http://localhost:8000/ai/chat-ia/stream";
 
 export default function ChatIA() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
+  const abortRef = useRef(null);
+
+  // Si el componente se desmonta, se corta la respuesta en curso
+  useEffect(() => () => abortRef.current?.abort(), []);
 
   const sendMessage = async () => {
     if (!input.trim()) return;
 
     const newMessage = { role: "user", content: input };
-    setMessages([...messages, newMessage]);
+    const history = [...messages, newMessage];
+    setMessages([...history, { role: "assistant", content: "" }]);
     setInput("");
 
-    const res = await fetch("http://localhost:8000/chat-ia", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ question: input }),
-    });
-    const data = await res.json();
-    const reply = { role: "assistant", content: data.respuesta };
-    setMessages([...messages, newMessage, reply]);
+    abortRef.current?.abort();
+    abortRef.current = new AbortController();
+
+    try {
+      // La respuesta se va pintando según llegan los fragmentos
+      await streamChat(
+        API_URL,
+        newMessage.content,
+        (_token, text) => setMessages([...history, { role: "assistant", content: text }]),
+        abortRef.current.signal
+      );
+    } catch (err) {
+      if (err.name === "AbortError") return;
+      setMessages([...history, { role: "assistant", content: `⚠️ ${err.message}` }]);
+    }
   };
 
   return (
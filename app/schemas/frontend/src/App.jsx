@@ -23,6 +23,7 @@ import {
   Legend,
 } from "chart.js";
 import { Bar, Pie } from "react-chartjs-2";
+import { streamChat } from "./streamChat";
 
 // --- Registro de Chart.js ---
 ChartJS.register(
@@ -1074,8 +1075,12 @@ const AISugerencia = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
 
-  // URL del endpoint de FastAPI (tu backend)
-  const API_URL = "http://localhost:8000/chat-ia";
+  // URL del endpoint de FastAPI (respuesta en streaming con SSE)
+  const API_URL = "http://localhost:8000/ai/chat-ia/stream";
+
+  // Se cancela la respuesta en curso al salir de la sección
+  const abortRef = React.useRef(null);
+  useEffect(() => () => abortRef.current?.abort(), []);
 
   // Función que se ejecuta al presionar "Preguntar"
   const handleAsk = async (e) => {
@@ -1086,19 +1091,20 @@ const AISugerencia = () => {
     setError(null);
     setResponse("");
 
-    try {
-      const res = await fetch(API_URL, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ question: input }),
-      });
-
-      if (!res.ok) throw new Error(`Error del servidor (${res.status})`);
+    abortRef.current?.abort();
+    abortRef.current = new AbortController();
 
-      const data = await res.json();
-      setResponse(data.answer || "No se recibió respuesta del modelo IA.");
+    try {
+      // El texto se va mostrando según llegan los fragmentos del modelo
+      const text = await streamChat(
+        API_URL,
+        input,
+        (_token, partial) => setResponse(partial),
+        abortRef.current.signal
+      );
+      if (!text) setResponse("No se recibió respuesta del modelo IA.");
     } catch (err) {
-      setError(err.message);
+      if (err.name !== "AbortError") setError(err.message);
     } finally {
       setLoading(false);
     }
@@ -1147,6 +1153,8 @@ export default function App() {
   const [collapsed, setCollapsed] = useState(false);
   const [section, setSection] = useState("panel");
   const [reservas, setReservas] = useState([]);
+  const [siguienteCursor, setSiguienteCursor] = useState(null);
+  const [cargandoMas, setCargandoMas] = useState(false);
   const [isAuthenticated, setIsAuthenticated] = useState(
     !!localStorage.getItem("authToken")
   );
@@ -1175,6 +1183,7 @@ export default function App() {
     localStorage.removeItem("authToken");
     setIsAuthenticated(false);
     setReservas([]); // Limpiar datos al cerrar sesión
+    setSiguienteCursor(null);
   };
 
   const getToken = () => localStorage.getItem("authToken");
@@ -1192,28 +1201,57 @@ export default function App() {
   // --- Funciones CRUD (API) ---
 
   // READ
-  const cargarReservas = async () => {
+  // La API pagina por cursor ({ results, next_cursor, size }): se carga una
+  // página y el resto solo si el usuario pulsa "Cargar más".
+  const TAM_PAGINA = "50";
+
+  const pedirPagina = async (cursor) => {
     const token = getToken();
     if (!token) {
       handleLogout();
-      return;
+      return null;
+    }
+    const params = new URLSearchParams({ limit: TAM_PAGINA });
+    if (cursor) params.set("cursor", cursor);
+    const res = await fetch(`${API_RESERVAS_URL}?${params}`, {
+      headers: getAuthHeaders(false),
+    });
+    if (res.status === 401) {
+      console.error("Token no válido o expirado.");
+      handleLogout();
+      return null;
     }
+    if (!res.ok) throw new Error(`Error al obtener reservas: ${res.status}`);
+    return res.json();
+  };
 
+  // READ: primera página (tras iniciar sesión o modificar una reserva)
+  const cargarReservas = async () => {
     try {
-      const res = await fetch(API_RESERVAS_URL, {
-        headers: getAuthHeaders(false),
-      });
-      if (res.status === 401) {
-        console.error("Token no válido o expirado.");
-        handleLogout();
-        return;
-      }
-      if (!res.ok) throw new Error(`Error al obtener reservas: ${res.status}`);
-      const data = await res.json();
-      setReservas(data);
+      const data = await pedirPagina(null);
+      if (!data) return;
+      setReservas(data.results);
+      setSiguienteCursor(data.next_cursor);
     } catch (e) {
       console.error(e);
       setReservas([]);
+      setSiguienteCursor(null);
+    }
+  };
+
+  // READ: página siguiente, añadida a las ya cargadas
+  const cargarMasReservas = async () => {
+    if (!siguienteCursor || cargandoMas) return;
+    setCargandoMas(true);
+    try {
+      const data = await pedirPagina(siguienteCursor);
+      if (!data) return;
+      setReservas((previas) => [...previas, ...data.results]);
+      setSiguienteCursor(data.next_cursor);
+    } catch (e) {
+      console.error(e);
+    } finally {
+      setCargandoMas(false);
     }
   };
 
@@ -1577,6 +1615,16 @@ export default function App() {
                 )}
               </tbody>
             </table>
+            {siguienteCursor && (
+              <button
+                type="button"
+                className="btn-submit"
+                onClick={cargarMasReservas}
+                disabled={cargandoMas}
+              >
+                {cargandoMas ? "Cargando..." : "Cargar más"}
+              </button>
+            )}
           </section>
         </>
       );
@@ -0,0 +1,47 @@
+// Lee la respuesta de /ai/chat-ia/stream (Server-Sent Events sobre POST).
+// EventSource solo admite GET, así que se parsea el cuerpo con fetch + reader.
+// onToken recibe cada fragmento según llega; devuelve el texto completo.
+// Para cancelar (y cortar la generación en el servidor) usa un AbortController.
+export async function streamChat(url, question, onToken, signal) {
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ question }),
+    signal,
+  });
+  if (!res.ok) throw new Error(`Error del servidor (${res.status})`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let text = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Los eventos SSE se separan con una línea en blanco
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+
+      if (event === "error") throw new Error(payload.detail);
+      if (event === "message" && payload.token) {
+        text += payload.token;
+        onToken(payload.token, text);
+      }
+    }
+  }
+  return text;
+}
@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+from typing import Optional
+
+class LabCreate(BaseModel):
+    name: str = Field(..., min_length=3, max_length=150)
+    description: Optional[str] = None
+    capacity: Optional[int] = Field(None, ge=1)
+
+class LabUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=3, max_length=150)
+    description: Optional[str] = None
+    capacity: Optional[int] = Field(None, ge=1)
+    is_active: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def check_not_null(self):
+        # Omitirlos deja el valor como está; enviarlos a null no (son NOT NULL)
+        for field in ("name", "is_active"):
+            if field in self.model_fields_set and getattr(self, field) is None:
+                raise ValueError(f"'{field}' no puede ser null")
+        return self
+
+class LabOut(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    capacity: Optional[int] = None
+    is_active: bool
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
@@ -1,7 +1,23 @@
-from pydantic import BaseModel, Field
-from datetime import datetime
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime, timedelta
 from typing import List, Optional
 
+from app.core.config import settings
+from app.utils.interval_index import to_utc_naive
+
+
+def _validate_interval(start_time: Optional[datetime], end_time: Optional[datetime]) -> None:
+    """Comprueba que el intervalo sea positivo y no supere la duración máxima."""
+    if start_time is None or end_time is None:
+        return
+    start_time, end_time = to_utc_naive(start_time), to_utc_naive(end_time)
+    if end_time <= start_time:
+        raise ValueError("end_time debe ser posterior a start_time")
+    if end_time - start_time > timedelta(minutes=settings.RESERVATION_MAX_MINUTES):
+        raise ValueError(
+            f"La reserva no puede durar más de {settings.RESERVATION_MAX_MINUTES} minutos"
+        )
+
 # --- SCHEMA PARA CREAR (MODIFICADO) ---
 # Este es el "molde" para el JSON que envías al crear una reserva.
 class ReservationCreate(BaseModel):
@@ -9,35 +25,73 @@ class ReservationCreate(BaseModel):
     reserved_by: str = Field(..., min_length=3, max_length=150)
     purpose: str = Field(..., min_length=3)
     start_time: datetime
+    # Si no se envía, se usa start_time + RESERVATION_DEFAULT_MINUTES
+    end_time: Optional[datetime] = None
     active: bool = True
 
+    @model_validator(mode="after")
+    def check_interval(self):
+        _validate_interval(self.start_time, self.end_time)
+        return self
+
 # --- SCHEMA PARA ACTUALIZAR (MODIFICADO) ---
 class ReservationUpdate(BaseModel):
     lab_name: Optional[str] = Field(None, min_length=3, max_length=150)
     reserved_by: Optional[str] = Field(None, min_length=3, max_length=150)
     purpose: Optional[str] = Field(None, min_length=3)
     start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
     active: Optional[bool] = None
 
+    @model_validator(mode="after")
+    def check_interval(self):
+        _validate_interval(self.start_time, self.end_time)
+        return self
+
 # --- SCHEMA DE RESPUESTA (MODIFICADO) ---
 # Este es el "molde" para el JSON que la API te devuelve.
 class ReservationOut(BaseModel):
     id: int
+    lab_id: int
     lab_name: str
     reserved_by: str
     purpose: str
     start_time: datetime
+    end_time: datetime
     active: bool
     created_at: datetime 
     owner_id: int
 
     model_config = {"from_attributes": True}
     
-    # --- ¡NUEVO SCHEMA PARA LA PAGINACIÓN! ---
-# Esto es lo que faltaba. Define la estructura de la respuesta paginada.
+# --- SCHEMA PARA LA PAGINACIÓN POR CURSOR ---
+# next_cursor es opaco: se reenvía tal cual en ?cursor= para pedir la siguiente página.
 class PaginatedReservationOut(BaseModel):
-    total: int
-    page: int
-    size: int
-    pages: int
     results: List[ReservationOut]
+    size: int
+    next_cursor: Optional[str] = None
+    # Total aproximado (solo si se pide con include_total=true)
+    total: Optional[int] = None
+
+# --- SCHEMAS DE BÚSQUEDA ---
+class ReservationSearchHit(ReservationOut):
+    # Relevancia (mayor = mejor); solo comparable dentro de la misma búsqueda
+    score: float
+
+class PaginatedReservationSearchOut(BaseModel):
+    results: List[ReservationSearchHit]
+    size: int
+    next_cursor: Optional[str] = None
+
+# --- SCHEMAS DE DISPONIBILIDAD ---
+class FreeWindow(BaseModel):
+    start: datetime
+    end: datetime
+
+class LabAvailability(BaseModel):
+    lab_name: str
+    free: List[FreeWindow]
+
+class AvailabilityOut(BaseModel):
+    slot_minutes: int
+    labs: List[LabAvailability]
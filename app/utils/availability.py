@@ -0,0 +1,143 @@
+import math
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.utils.interval_index import to_utc_naive
+
+
+def _slots_covered(start: datetime, end: datetime, slot_minutes: int) -> Iterable[Tuple[date, int, int]]:
+    """
+    Reparte [start, end) por días: (día, primer slot, slot final exclusivo).
+    Un slot tocado parcialmente cuenta como ocupado.
+    """
+    start, end = to_utc_naive(start), to_utc_naive(end)
+    day = start.date()
+    while True:
+        day_start = datetime.combine(day, datetime.min.time())
+        lo = max(start, day_start) - day_start
+        hi = min(end, day_start + timedelta(days=1)) - day_start
+        if hi > lo:
+            slot_seconds = slot_minutes * 60
+            yield day, int(lo.total_seconds() // slot_seconds), math.ceil(hi.total_seconds() / slot_seconds)
+        day += timedelta(days=1)
+        if datetime.combine(day, datetime.min.time()) >= end:
+            break
+
+
+def _mask(first: int, last: int) -> int:
+    """Entero con los bits [first, last) encendidos."""
+    return ((1 << (last - first)) - 1) << first
+
+
+def free_runs(bits: int) -> Iterable[Tuple[int, int]]:
+    """Tramos de bits encendidos como (inicio, longitud), de menor a mayor."""
+    while bits:
+        low = (bits & -bits).bit_length() - 1
+        shifted = bits >> low
+        length = (~shifted & (shifted + 1)).bit_length() - 1
+        yield low, length
+        bits &= ~_mask(low, low + length)
+
+
+class _LabDays:
+    """Bitsets de ocupación por día de un laboratorio y la versión con la que se cargaron."""
+
+    __slots__ = ("version", "days")
+
+    def __init__(self, version: int):
+        self.version = version
+        self.days: Dict[date, int] = {}
+
+
+class AvailabilityIndex:
+    """
+    Ocupación de cada laboratorio por día como bitsets (un bit por slot de
+    slot_minutes; con 15 minutos, 96 bits por día en un int de Python).
+
+    Los días se cargan de la base de datos al pedirlos y se guardan junto con el
+    contador de versión del laboratorio. Las escrituras del propio proceso
+    parchean los bits si el contador avanzó justo una unidad (nadie más escribió);
+    si no, o si la versión leída al consultar no coincide, el laboratorio se
+    descarta y se recarga. Buscar huecos es entonces aritmética de bits.
+
+    Cada consulta trabaja con su propia copia (cached_days + lo que devuelve
+    load): una escritura concurrente puede descartar días del índice, pero no
+    los de una respuesta a medio construir.
+    """
+
+    def __init__(self, slot_minutes: int = 15):
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = 24 * 60 // slot_minutes
+        self._labs: Dict[int, _LabDays] = {}
+        self._lock = threading.Lock()
+
+    def cached_days(self, lab_id: int, version: int, days: List[date]) -> Dict[date, int]:
+        """
+        Copia de los bitsets ya cargados de `days` (los que falten hay que
+        cargarlos); si la versión cambió se descarta lo que había.
+        """
+        with self._lock:
+            lab = self._labs.get(lab_id)
+            if lab is None or lab.version != version:
+                lab = self._labs[lab_id] = _LabDays(version)
+            return {day: lab.days[day] for day in days if day in lab.days}
+
+    def load(
+        self, lab_id: int, version: int, days: List[date], rows: Iterable[Tuple[datetime, datetime]]
+    ) -> Dict[date, int]:
+        """
+        Construye los bitsets de `days` a partir de filas (inicio, fin) y los
+        devuelve. Se guardan en el índice solo si la versión sigue siendo la misma.
+        """
+        wanted: Set[date] = set(days)
+        bitsets = dict.fromkeys(wanted, 0)
+        for start, end in rows:
+            for day, first, last in _slots_covered(start, end, self.slot_minutes):
+                if day in wanted:
+                    bitsets[day] |= _mask(first, last)
+        with self._lock:
+            lab = self._labs.get(lab_id)
+            if lab is not None and lab.version == version:
+                lab.days.update(bitsets)
+        return bitsets
+
+    def apply_write(
+        self,
+        lab_id: int,
+        version: int,
+        added: Optional[Tuple[datetime, datetime]] = None,
+        removed: Optional[Tuple[datetime, datetime]] = None,
+    ) -> None:
+        """
+        Refleja una escritura confirmada. `version` es el valor del contador tras
+        incrementarlo; si no es el siguiente al cacheado, se descarta el laboratorio.
+        """
+        with self._lock:
+            lab = self._labs.get(lab_id)
+            if lab is None:
+                return
+            if lab.version + 1 != version:
+                del self._labs[lab_id]
+                return
+            lab.version = version
+            if removed is not None:
+                # Un slot puede compartirse con la reserva contigua: esos días se recargan
+                for day, _, _ in _slots_covered(*removed, self.slot_minutes):
+                    lab.days.pop(day, None)
+            if added is not None:
+                for day, first, last in _slots_covered(*added, self.slot_minutes):
+                    if day in lab.days:
+                        lab.days[day] |= _mask(first, last)
+
+    def invalidate(self, lab_id: Optional[int] = None) -> None:
+        with self._lock:
+            if lab_id is None:
+                self._labs.clear()
+            else:
+                self._labs.pop(lab_id, None)
+
+
+# Índice compartido por el proceso
+availability_index = AvailabilityIndex(settings.AVAILABILITY_SLOT_MINUTES)
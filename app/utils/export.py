@@ -0,0 +1,89 @@
+"""
+Exportación en streaming (CSV / NDJSON, opcionalmente gzip).
+
+Las filas se leen con un cursor del servidor (stream_results + yield_per) como
+tuplas de Core y se escriben por bloques en el generador de la respuesta: la
+memoria no depende del número de filas y los primeros bytes salen enseguida.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Iterator, List
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+_MEDIA_TYPES = {
+    ExportFormat.csv: "text/csv; charset=utf-8",
+    ExportFormat.ndjson: "application/x-ndjson",
+}
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(columns: List[str], partitions) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(columns: List[str], partitions) -> Iterator[str]:
+    for rows in partitions:
+        yield "".join(
+            json.dumps({c: _jsonable(v) for c, v in zip(columns, row)}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+def stream_rows(db: Session, stmt: Select, fmt: ExportFormat, gzip: bool = False) -> Iterator[bytes]:
+    """Genera el archivo por bloques de EXPORT_CHUNK_ROWS filas."""
+    conn = db.connection().execution_options(stream_results=True, yield_per=settings.EXPORT_CHUNK_ROWS)
+    result = conn.execute(stmt)
+    columns = list(result.keys())
+    chunks = (_csv_chunks if fmt == ExportFormat.csv else _ndjson_chunks)(columns, result.partitions())
+
+    # wbits=31: flujo gzip completo (cabecera + CRC) comprimido al vuelo
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    try:
+        for text in chunks:
+            data = text.encode("utf-8")
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor is not None:
+            yield compressor.flush()
+    finally:
+        result.close()
+
+
+def export_response(db: Session, stmt: Select, filename: str, fmt: ExportFormat, gzip: bool = False) -> StreamingResponse:
+    """StreamingResponse de descarga para la consulta dada."""
+    filename = f"{filename}.{fmt.value}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_rows(db, stmt, fmt, gzip),
+        media_type="application/gzip" if gzip else _MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
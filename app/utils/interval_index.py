@@ -0,0 +1,154 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """Normaliza un datetime a UTC sin tzinfo para poder compararlo siempre."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class _LabIntervals:
+    """
+    Intervalos de un laboratorio ordenados por inicio (listas paralelas).
+
+    La posición se busca por bisección (O(log n)), pero insertar o borrar en una
+    lista desplaza los elementos siguientes: cada escritura es O(n) en el número
+    de reservas vivas del laboratorio (un memmove, barato para los tamaños de un
+    laboratorio, pero no logarítmico).
+    """
+
+    __slots__ = ("starts", "entries", "spans", "max_span")
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.entries: List[Tuple[datetime, datetime, int]] = []
+        # Cuántos intervalos hay de cada duración, para recalcular max_span al borrar
+        self.spans: Dict[timedelta, int] = {}
+        # Duración máxima de los intervalos presentes: acota la búsqueda hacia atrás
+        # (y con ella el coste de cada consulta, que nunca pasa de RESERVATION_MAX_MINUTES).
+        self.max_span = timedelta(0)
+
+    def add(self, start: datetime, end: datetime, reservation_id: int) -> None:
+        entry = (start, end, reservation_id)
+        pos = bisect_right(self.entries, entry)
+        self.entries.insert(pos, entry)
+        self.starts.insert(pos, start)
+        span = end - start
+        self.spans[span] = self.spans.get(span, 0) + 1
+        if span > self.max_span:
+            self.max_span = span
+
+    def remove(self, start: datetime, end: datetime, reservation_id: int) -> None:
+        entry = (start, end, reservation_id)
+        pos = bisect_left(self.entries, entry)
+        if pos < len(self.entries) and self.entries[pos] == entry:
+            del self.entries[pos]
+            del self.starts[pos]
+            span = end - start
+            self.spans[span] -= 1
+            if not self.spans[span]:
+                del self.spans[span]
+                if span == self.max_span:
+                    # Una reserva larga ya borrada no debe ensanchar las búsquedas siguientes
+                    self.max_span = max(self.spans, default=timedelta(0))
+
+    def overlapping(self, start: datetime, end: datetime) -> List[int]:
+        # Solo pueden solaparse los intervalos que empiezan en (start - max_span, end).
+        lo = bisect_right(self.starts, start - self.max_span)
+        hi = bisect_left(self.starts, end)
+        return [rid for (s, e, rid) in self.entries[lo:hi] if e > start]
+
+
+class LabIntervalIndex:
+    """
+    Índice en memoria de los intervalos ocupados de cada laboratorio.
+
+    Cada laboratorio se carga de forma perezosa desde la base de datos la primera
+    vez que se consulta y luego se mantiene con las escrituras del propio proceso.
+    La búsqueda de choques es O(log n + k) gracias a la bisección sobre los inicios,
+    donde k son los intervalos que empiezan en (inicio - max_span, fin); las
+    altas y bajas cuestan O(n) por el desplazamiento de las listas (ver _LabIntervals).
+    El índice es solo una vía rápida: la verificación final la hace la base de datos.
+    """
+
+    def __init__(self):
+        self._labs: Dict[int, _LabIntervals] = {}
+        self._by_id: Dict[int, Tuple[int, datetime, datetime]] = {}
+        self._lock = threading.RLock()
+
+    def is_loaded(self, lab_id: int) -> bool:
+        return lab_id in self._labs
+
+    def load(self, lab_id: int, rows: Iterable[Tuple[int, datetime, datetime]]) -> None:
+        """Reemplaza los intervalos de un laboratorio con filas (id, inicio, fin)."""
+        intervals = _LabIntervals()
+        loaded = []
+        for reservation_id, start, end in rows:
+            start, end = to_utc_naive(start), to_utc_naive(end)
+            intervals.add(start, end, reservation_id)
+            loaded.append((reservation_id, start, end))
+        with self._lock:
+            self._drop_lab(lab_id)
+            self._labs[lab_id] = intervals
+            for reservation_id, start, end in loaded:
+                self._by_id[reservation_id] = (lab_id, start, end)
+
+    def find_conflicts(
+        self,
+        lab_id: int,
+        start: datetime,
+        end: datetime,
+        exclude_id: Optional[int] = None,
+    ) -> List[int]:
+        """Devuelve los ids que se solapan con [start, end) en el laboratorio."""
+        with self._lock:
+            intervals = self._labs.get(lab_id)
+            if intervals is None:
+                return []
+            ids = intervals.overlapping(to_utc_naive(start), to_utc_naive(end))
+        return [rid for rid in ids if rid != exclude_id]
+
+    def add(self, lab_id: int, reservation_id: int, start: datetime, end: datetime) -> None:
+        start, end = to_utc_naive(start), to_utc_naive(end)
+        with self._lock:
+            self.remove(reservation_id)
+            intervals = self._labs.get(lab_id)
+            if intervals is None:
+                # Si el laboratorio no está cargado se cargará completo al consultarlo.
+                return
+            intervals.add(start, end, reservation_id)
+            self._by_id[reservation_id] = (lab_id, start, end)
+
+    def remove(self, reservation_id: int) -> None:
+        with self._lock:
+            known = self._by_id.pop(reservation_id, None)
+            if known is None:
+                return
+            lab_id, start, end = known
+            intervals = self._labs.get(lab_id)
+            if intervals is not None:
+                intervals.remove(start, end, reservation_id)
+
+    def invalidate(self, lab_id: Optional[int] = None) -> None:
+        """Descarta un laboratorio (o todos) para recargarlo en la próxima consulta."""
+        with self._lock:
+            if lab_id is None:
+                self._labs.clear()
+                self._by_id.clear()
+            else:
+                self._drop_lab(lab_id)
+
+    def _drop_lab(self, lab_id: int) -> None:
+        intervals = self._labs.pop(lab_id, None)
+        if intervals is None:
+            return
+        for _, _, reservation_id in intervals.entries:
+            self._by_id.pop(reservation_id, None)
+
+
+# Instancia compartida por el proceso
+reservation_index = LabIntervalIndex()
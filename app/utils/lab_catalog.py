@@ -0,0 +1,159 @@
+"""
+Catálogo de laboratorios en memoria del proceso.
+
+La tabla labs es pequeña y casi nunca cambia, pero se consulta en cada
+respuesta de reservas (lab_id -> nombre), en cada alta (nombre -> lab_id) y en
+los análisis. Se carga entera de una vez y se sirve desde diccionarios:
+
+- Las escrituras del propio proceso (crud/lab.py) la parchean si el contador
+  de versión LABS avanzó justo una unidad; si no, se recarga.
+- Como mucho cada LAB_CATALOG_CHECK_SECONDS se lee el contador compartido
+  (Redis) para enterarse de los cambios hechos por otros workers.
+- Un id o un nombre desconocido fuerza una recarga (puede ser un laboratorio
+  recién creado en otro worker), pero como mucho una por ventana: si la última
+  carga es más reciente que LAB_CATALOG_CHECK_SECONDS, el fallo se da por bueno
+  (caché negativa), y una ráfaga de nombres inventados no recarga N veces.
+
+Desde código async se usa ensure_fresh_async(): la lectura del contador y la
+recarga (cliente de Redis y sesión síncronos) van a un hilo, no al event loop.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.versioning import LABS, get_counter
+from app.db.session import SessionLocal
+from app.models.lab import Lab
+
+
+class LabEntry(NamedTuple):
+    id: int
+    name: str
+    description: Optional[str]
+    capacity: Optional[int]
+    is_active: bool
+    created_at: datetime
+
+    @classmethod
+    def from_row(cls, row) -> "LabEntry":
+        return cls(row.id, row.name, row.description, row.capacity, row.is_active, row.created_at)
+
+
+class LabCatalog:
+    def __init__(self, session_factory: Callable[[], Session], check_seconds: float = 2.0):
+        self.session_factory = session_factory
+        self.check_seconds = check_seconds
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._by_id: Dict[int, LabEntry] = {}
+        self._by_name: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # --- Consultas ---
+
+    def all(self) -> List[LabEntry]:
+        """Todos los laboratorios, ordenados por nombre."""
+        self.ensure_fresh()
+        return sorted(self._by_id.values(), key=lambda lab: lab.name.lower())
+
+    def get(self, lab_id: int) -> Optional[LabEntry]:
+        self.ensure_fresh()
+        entry = self._by_id.get(lab_id)
+        if entry is None and self._reload_on_miss():
+            entry = self._by_id.get(lab_id)
+        return entry
+
+    def name(self, lab_id: int) -> Optional[str]:
+        entry = self.get(lab_id)
+        return entry.name if entry is not None else None
+
+    def id_for(self, name: str, reload_on_miss: bool = True) -> Optional[int]:
+        """
+        lab_id del laboratorio `name`. Con reload_on_miss=False un nombre
+        desconocido no recarga (quien llama lo busca en su propia sesión).
+        """
+        self.ensure_fresh()
+        lab_id = self._by_name.get(name)
+        if lab_id is None and reload_on_miss and self._reload_on_miss():
+            lab_id = self._by_name.get(name)
+        return lab_id
+
+    def matching_ids(self, text: str) -> List[int]:
+        """Ids de los laboratorios cuyo nombre contiene `text` (sin distinguir mayúsculas)."""
+        self.ensure_fresh()
+        needle = text.lower()
+        return [lab.id for lab in self._by_id.values() if needle in lab.name.lower()]
+
+    # --- Sincronización con la base de datos ---
+
+    def _check_due(self) -> bool:
+        return self.version is None or time.monotonic() - self._checked_at >= self.check_seconds
+
+    def ensure_fresh(self) -> None:
+        """Recarga si nunca se cargó o si el contador compartido cambió."""
+        if not self._check_due():
+            return
+        now = time.monotonic()
+        version = get_counter(LABS)
+        if version != self.version:
+            self.reload(version)
+        self._checked_at = now
+
+    async def ensure_fresh_async(self) -> None:
+        """ensure_fresh() sin bloquear el event loop: solo sale a un hilo si toca comprobar."""
+        if self._check_due():
+            await asyncio.to_thread(self.ensure_fresh)
+
+    def _reload_on_miss(self) -> bool:
+        """Recarga tras un fallo salvo que la última carga sea de esta misma ventana."""
+        if time.monotonic() - self._loaded_at < self.check_seconds:
+            return False
+        self.reload()
+        return True
+
+    def reload(self, version: Optional[int] = None) -> None:
+        if version is None:
+            version = get_counter(LABS)
+        db = self.session_factory()
+        try:
+            entries = [LabEntry.from_row(row) for row in db.execute(
+                select(Lab.id, Lab.name, Lab.description, Lab.capacity, Lab.is_active, Lab.created_at)
+            )]
+        finally:
+            db.close()
+        with self._lock:
+            self._by_id = {lab.id: lab for lab in entries}
+            self._by_name = {lab.name: lab.id for lab in entries}
+            self.version = version
+            self._checked_at = self._loaded_at = time.monotonic()
+
+    def apply_write(self, version: int, entry: LabEntry) -> None:
+        """Refleja un alta o un cambio confirmado por el propio proceso."""
+        with self._lock:
+            if self.version is None or self.version + 1 != version:
+                # Otro worker escribió entremedias: mejor recargar todo
+                self.version = None
+                return
+            previous = self._by_id.get(entry.id)
+            if previous is not None:
+                self._by_name.pop(previous.name, None)
+            self._by_id[entry.id] = entry
+            self._by_name[entry.name] = entry.id
+            self.version = version
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._by_id, self._by_name = {}, {}
+            self.version = None
+            self._loaded_at = 0.0
+
+
+# Catálogo compartido por el proceso
+lab_catalog = LabCatalog(SessionLocal, settings.LAB_CATALOG_CHECK_SECONDS)
@@ -1,16 +1,93 @@
-from typing import List, TypeVar, Generic
-
-T = TypeVar('T')
-
-class PaginatedResponse(Generic[T]):
-    total: int
-    items: List[T]
-    page: int
-    size: int
-
-def paginate(items: List[T], page: int, size: int) -> PaginatedResponse[T]:
-    total = len(items)
-    start = (page - 1) * size
-    end = start + size
-    paginated_items = items[start:end]
-    return PaginatedResponse(total=total, items=paginated_items, page=page, size=size)
\ No newline at end of file
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Query
+
+# Tope del conteo aproximado cuando el motor no ofrece estimaciones (SQLite)
+COUNT_ESTIMATE_CAP = 10_000
+
+
+class InvalidCursorError(ValueError):
+    """El cursor recibido no es válido (manipulado o de otro endpoint)."""
+
+
+def encode_cursor(*values: Any) -> str:
+    """Codifica los valores de la clave de ordenación en un cursor opaco."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> Tuple[Any, ...]:
+    """Decodifica un cursor y convierte cada valor al tipo esperado."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(types):
+            raise ValueError("longitud incorrecta")
+        return tuple(
+            datetime.fromisoformat(v) if t is datetime else t(v)
+            for v, t in zip(payload, types)
+        )
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Cursor de paginación inválido") from e
+
+
+def keyset_query(query: Query, columns: List, cursor_values: Optional[Tuple], limit: int, descending: bool = False) -> Query:
+    """La consulta de una página: WHERE (cols) > (cursor) ORDER BY cols LIMIT n+1."""
+    key = tuple_(*columns)
+    if cursor_values is not None:
+        query = query.filter(key < cursor_values if descending else key > cursor_values)
+    order = [c.desc() for c in columns] if descending else list(columns)
+    return query.order_by(*order).limit(limit + 1)
+
+
+def keyset_page(query: Query, columns: List, cursor_values: Optional[Tuple], limit: int, descending: bool = False):
+    """
+    Aplica paginación por clave (keyset) en SQL (ver keyset_query).
+    El coste no depende de lo profunda que sea la página, a diferencia de OFFSET.
+
+    Devuelve (filas, valores_del_siguiente_cursor o None).
+    """
+    rows = keyset_query(query, columns, cursor_values, limit, descending).all()
+
+    next_values = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_values = tuple(getattr(last, c.key) for c in columns)
+    return rows, next_values
+
+
+def compile_for_driver(statement, dialect) -> Tuple[str, Any]:
+    """
+    SQL y parámetros listos para exec_driver_sql con el driver del dialecto:
+    los IN expandidos se desarrollan (render_postcompile) y, si el driver usa
+    marcadores posicionales (asyncpg: $1, SQLite: ?), los parámetros van en tupla.
+    """
+    compiled = statement.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positional:
+        return str(compiled), tuple(compiled.params[name] for name in compiled.positiontup)
+    return str(compiled), compiled.params
+
+
+def estimate_count(query: Query) -> int:
+    """
+    Total aproximado de filas de la consulta sin contarlas todas.
+    En PostgreSQL se usa la estimación del planificador (EXPLAIN); en otros motores
+    se cuenta con un tope (COUNT_ESTIMATE_CAP) para que el coste siga acotado.
+    """
+    session = query.session
+    bind = session.get_bind()
+    if bind.dialect.name == "postgresql":
+        sql, params = compile_for_driver(query.statement, bind.dialect)
+        plan = session.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql, params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    capped = query.order_by(None).limit(COUNT_ESTIMATE_CAP).subquery()
+    return session.query(func.count()).select_from(capped).scalar()
@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+Counts = Dict[Tuple[str, int], int]
+
+
+class SuggestionIndex:
+    """
+    Conteos (laboratorio, hora) precalculados para el recomendador: uno global
+    y uno por usuario (LRU acotado). Cada conteo se guarda con la marca de
+    versión de su colección (ver app/core/versioning.py) y solo se recarga
+    cuando una escritura la renueva; el resto de consultas son en memoria.
+    """
+
+    def __init__(self, max_users: int = 10_000):
+        self.max_users = max_users
+        self._global: Optional[Tuple[str, Counts]] = None
+        self._users: "OrderedDict[int, Tuple[str, Counts]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def global_counts(self, stamp: str, loader: Callable[[], Counts]) -> Counts:
+        with self._lock:
+            if self._global is not None and self._global[0] == stamp:
+                return self._global[1]
+        counts = loader()
+        with self._lock:
+            self._global = (stamp, counts)
+        return counts
+
+    def user_counts(self, user_id: int, stamp: str, loader: Callable[[], Counts]) -> Counts:
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] == stamp:
+                self._users.move_to_end(user_id)
+                return entry[1]
+        counts = loader()
+        with self._lock:
+            self._users[user_id] = (stamp, counts)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return counts
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._global = None
+            self._users.clear()
+
+
+def _shares(counts: Counts, key_index: int) -> Dict:
+    """Proporción de reservas por laboratorio (key_index=0) o por hora (1)."""
+    totals: Dict = {}
+    for key, count in counts.items():
+        totals[key[key_index]] = totals.get(key[key_index], 0) + count
+    grand = sum(totals.values()) or 1
+    return {k: v / grand for k, v in totals.items()}
+
+
+def rank_candidates(global_counts: Counts, user_counts: Counts, hours: Iterable[int]) -> List[dict]:
+    """
+    Puntúa cada (laboratorio, hora) candidato, de mayor a menor:
+    - afinidad del usuario con el laboratorio y con la franja horaria (±1 h),
+      o la popularidad del laboratorio si el usuario aún no tiene historial;
+    - penalización por la ocupación histórica (de otros usuarios) de esa hora
+      en ese laboratorio.
+    """
+    hours = list(hours)
+    labs = {lab for lab, _ in global_counts} | {lab for lab, _ in user_counts}
+    # La ocupación que penaliza es la de los demás: el propio historial es preferencia
+    others = {key: count - user_counts.get(key, 0) for key, count in global_counts.items()}
+    busiest = max(others.values(), default=0) or 1
+    lab_popularity = _shares(global_counts, 0)
+    user_labs = _shares(user_counts, 0) if user_counts else {}
+    user_hours = _shares(user_counts, 1) if user_counts else {}
+
+    ranked = []
+    for lab in labs:
+        for hour in hours:
+            busy = max(others.get((lab, hour), 0), 0) / busiest
+            if user_counts:
+                hour_affinity = user_hours.get(hour, 0) + 0.5 * (
+                    user_hours.get(hour - 1, 0) + user_hours.get(hour + 1, 0)
+                )
+                affinity = 0.6 * user_labs.get(lab, 0) + 0.4 * min(hour_affinity, 1.0)
+                score = 0.7 * affinity + 0.3 * (1 - busy)
+                reason = (
+                    "Coincide con los laboratorios y horarios que sueles reservar"
+                    if affinity >= 0.3 else "Laboratorio y hora con poca ocupación histórica"
+                )
+            else:
+                score = 0.4 * lab_popularity.get(lab, 0) + 0.6 * (1 - busy)
+                reason = "Se recomienda por baja ocupación promedio en esa hora"
+            ranked.append({"lab_name": lab, "hour": hour, "score": round(score, 4), "reason": reason})
+
+    ranked.sort(key=lambda c: (-c["score"], c["hour"], c["lab_name"]))
+    return ranked
+
+
+# Índice compartido por el proceso
+suggestion_index = SuggestionIndex()
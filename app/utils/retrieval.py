@@ -0,0 +1,239 @@
+"""
+Índice de recuperación local (BM25) sobre el historial de reservas.
+
+Sirve para elegir, para cada pregunta a la IA, las k reservas más relevantes
+(por propósito, laboratorio y persona) en lugar de las últimas filas de la
+tabla. Todo ocurre en el proceso: sin servicios de embeddings externos.
+
+- Se construye perezosamente desde la base de datos (lectura por bloques) y
+  se mantiene con las escrituras del propio proceso.
+- Un contador de versión compartido (Redis) indica si otro worker escribió;
+  en ese caso se reconstruye en segundo plano mientras se sigue sirviendo el
+  índice actual.
+- Opcionalmente se guarda en disco (JSON) para arrancar sin recorrer la tabla.
+"""
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.lab import Lab
+from app.models.reservation import Reservation as ReservationModel
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a al como con cual cuales cuando de del donde el en es esta estan hay la las lo los "
+    "me mi mis que se sin sobre su sus un una uno y ya para por quien quienes".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Minúsculas, sin tildes y sin palabras vacías."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [w for w in _WORD.findall(text) if w not in _STOPWORDS and len(w) > 1]
+
+
+class ReservationDoc(NamedTuple):
+    lab_name: str
+    reserved_by: str
+    purpose: str
+    start_time: str
+
+    @classmethod
+    def from_row(cls, row) -> "ReservationDoc":
+        return cls(row.lab_name, row.reserved_by, row.purpose, str(row.start_time))
+
+    def terms(self) -> List[str]:
+        # El laboratorio pesa el doble: es por lo que más se pregunta
+        return tokenize(f"{self.lab_name} {self.lab_name} {self.reserved_by} {self.purpose}")
+
+
+class RetrievalIndex:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        persist_path: Optional[str] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.session_factory = session_factory
+        self.persist_path = persist_path
+        self.k1 = k1
+        self.b = b
+        self.version: Optional[int] = None
+        self._docs: Dict[int, ReservationDoc] = {}
+        self._lengths: Dict[int, int] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self._rebuilding = False
+
+    # --- Estructura BM25 ---
+
+    def _add_locked(self, reservation_id: int, doc: ReservationDoc) -> None:
+        self._remove_locked(reservation_id)
+        counts = Counter(doc.terms())
+        self._docs[reservation_id] = doc
+        self._lengths[reservation_id] = sum(counts.values())
+        self._total_length += self._lengths[reservation_id]
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[reservation_id] = tf
+
+    def _remove_locked(self, reservation_id: int) -> None:
+        doc = self._docs.pop(reservation_id, None)
+        if doc is None:
+            return
+        self._total_length -= self._lengths.pop(reservation_id)
+        for term in set(doc.terms()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(reservation_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _replace_all(self, docs: Dict[int, ReservationDoc], version: Optional[int]) -> None:
+        with self._lock:
+            self._docs, self._lengths, self._postings, self._total_length = {}, {}, {}, 0
+            for reservation_id, doc in docs.items():
+                self._add_locked(reservation_id, doc)
+            self.version = version
+
+    def search(self, query: str, k: int = 10) -> List[ReservationDoc]:
+        """Las k reservas con mayor puntuación BM25 (solo las que comparten algún término)."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._docs)
+            if not n or not terms:
+                return []
+            avg_length = self._total_length / n
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for reservation_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[reservation_id] / avg_length)
+                    scores[reservation_id] = scores.get(reservation_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+            return [self._docs[reservation_id] for reservation_id, _ in best]
+
+    # --- Sincronización con la base de datos ---
+
+    def is_built(self) -> bool:
+        return self.version is not None
+
+    def _load_from_db(self) -> Dict[int, ReservationDoc]:
+        db = self.session_factory()
+        try:
+            result = db.execute(
+                select(
+                    ReservationModel.id, Lab.name.label("lab_name"), ReservationModel.reserved_by,
+                    ReservationModel.purpose, ReservationModel.start_time,
+                )
+                .join(Lab, Lab.id == ReservationModel.lab_id)
+                .where(ReservationModel.deleted_at == None)
+                .execution_options(yield_per=5_000)
+            )
+            return {row.id: ReservationDoc.from_row(row) for row in result}
+        finally:
+            db.close()
+
+    def rebuild(self, version: int) -> None:
+        """Reconstruye desde la base de datos (y guarda en disco si está configurado)."""
+        docs = self._load_from_db()
+        self._replace_all(docs, version)
+        self.save()
+
+    def _rebuild_in_background(self, version: int) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                self.rebuild(version)
+            except Exception as e:
+                print(f"⚠️ Error al reconstruir el índice de búsqueda: {e}")
+            finally:
+                self._rebuilding = False
+
+        threading.Thread(target=run, name="retrieval-rebuild", daemon=True).start()
+
+    def ensure_fresh(self, version: int) -> None:
+        """
+        Primera vez: carga desde disco o construye (bloqueante). Después, si el
+        contador compartido no coincide, reconstruye en segundo plano.
+        """
+        if not self.is_built():
+            with self._lock:
+                if not self.is_built() and not self.load():
+                    self.rebuild(version)
+        if self.version != version:
+            self._rebuild_in_background(version)
+
+    def apply_write(self, version: int, reservation_id: int, doc: Optional[ReservationDoc]) -> None:
+        """
+        Refleja una escritura confirmada del propio proceso (doc=None si se borró).
+        Si el contador saltó más de una unidad, otro worker escribió entremedias y
+        la próxima consulta disparará la reconstrucción.
+        """
+        with self._lock:
+            if not self.is_built():
+                return
+            if doc is None:
+                self._remove_locked(reservation_id)
+            else:
+                self._add_locked(reservation_id, doc)
+            if self.version is not None and self.version + 1 == version:
+                self.version = version
+
+    def invalidate(self) -> None:
+        self._replace_all({}, None)
+
+    # --- Persistencia opcional ---
+
+    def save(self) -> None:
+        if not self.persist_path:
+            return
+        with self._lock:
+            payload = {
+                "version": self.version,
+                "saved_at": datetime.utcnow().isoformat(),
+                "docs": {str(rid): list(doc) for rid, doc in self._docs.items()},
+            }
+        tmp_path = f"{self.persist_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, self.persist_path)
+
+    def load(self) -> bool:
+        """Carga el índice guardado; devuelve False si no hay archivo o no es válido."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return False
+        try:
+            with open(self.persist_path, encoding="utf-8") as f:
+                payload = json.load(f)
+            docs = {int(rid): ReservationDoc(*fields) for rid, fields in payload["docs"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Índice de búsqueda en disco no válido, se reconstruye: {e}")
+            return False
+        self._replace_all(docs, payload.get("version"))
+        return True
+
+
+# Índice compartido por el proceso
+retrieval_index = RetrievalIndex(SessionLocal, settings.RETRIEVAL_INDEX_PATH)
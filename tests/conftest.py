@@ -1,22 +1,41 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from app.main import app
 from app.db.base import Base
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
 from app.api.v1.endpoints.auth import get_current_user
 from app.models.user import User as UserModel
 from app.core.security import get_password_hash
+from app.core.cache import local_cache
+from app.core.metrics import instrument_engine
+from app.utils.interval_index import reservation_index
+from app.utils.availability import availability_index
+from app.core.audit import audit_sink
+from app.utils.retrieval import retrieval_index
+from app.utils.lab_catalog import lab_catalog
+from app.core.config import settings
 
 # --- Configuración de la base de datos de prueba ---
-# Usamos una base de datos en memoria (SQLite) para que sea rápida y se borre sola
+# Usamos un archivo SQLite local; cada test deja las tablas vacías al terminar
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Los endpoints async usan aiosqlite sobre el mismo archivo. NullPool: cada
+# TestClient tiene su propio event loop y las conexiones no deben reutilizarse.
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Igual que los engines de la app: sus consultas cuentan en /metrics
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
 # Creamos las tablas en la base de datos de prueba
 Base.metadata.create_all(bind=engine)
 
@@ -29,6 +48,11 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    """Reemplaza la dependencia get_async_db para usar la base de datos de prueba."""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 def override_get_current_user():
     """Reemplaza la dependencia de autenticación para devolver un usuario de prueba."""
     # En un test real, esto sería más complejo, pero para empezar es suficiente
@@ -36,8 +60,29 @@ def override_get_current_user():
 
 # Aplicamos los reemplazos a nuestra app de FastAPI
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 app.dependency_overrides[get_current_user] = override_get_current_user
 
+# La auditoría se escribe al momento en la base de prueba para poder comprobarla
+audit_sink.session_factory = TestingSessionLocal
+audit_sink.sync = True
+retrieval_index.session_factory = TestingSessionLocal
+lab_catalog.session_factory = TestingSessionLocal
+
+# Las tablas las crea este módulo: el arranque de la app no debe tocar la base
+# (ni el admin de init_db ni la URL de DATABASE_URL)
+settings.DB_AUTO_INIT = False
+
+# Todas las peticiones del TestClient llegan desde la misma IP: sin límite ni
+# descarte de carga salvo en los tests que los activan
+settings.RATE_LIMIT_ENABLED = False
+settings.LOAD_SHED_ENABLED = False
+
+def _clear_tables():
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
 # --- Fixtures de Pytest ---
 @pytest.fixture(scope="session")
 def db_engine():
@@ -48,14 +93,22 @@ def db_engine():
 
 @pytest.fixture(scope="function")
 def db_session(db_engine):
-    """Crea una nueva sesión de base de datos para cada test."""
-    connection = engine.connect()
-    transaction = connection.begin()
-    session = TestingSessionLocal(bind=connection)
+    """Crea una nueva sesión de base de datos para cada test y limpia las tablas al final."""
+    session = TestingSessionLocal()
+    # Cachés del proceso: se vacían para no arrastrar datos de otro test
+    reservation_index.invalidate()
+    availability_index.invalidate()
+    retrieval_index.invalidate()
+    lab_catalog.invalidate()
+    local_cache.clear()
     yield session
     session.close()
-    transaction.rollback()
-    connection.close()
+    _clear_tables()
+
+@pytest.fixture(scope="function")
+def async_session_factory(db_session):
+    """Fábrica de AsyncSession sobre la base de prueba (para llamar a dependencias async)."""
+    return TestingAsyncSessionLocal
 
 @pytest.fixture(scope="module")
 def client():
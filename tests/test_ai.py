@@ -0,0 +1,198 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.llm import LLMClient, LLMProvider, LocalStubProvider, llm_client
+from app.utils.retrieval import ReservationDoc, RetrievalIndex
+
+
+class SlowProvider(LLMProvider):
+    """Proveedor que tarda más que el timeout configurado."""
+
+    name = "slow"
+
+    async def complete(self, messages, max_tokens):
+        await asyncio.sleep(1)
+        return "tarde"
+
+
+def test_provider_without_complete_fails_on_creation():
+    """
+    Test para verificar que un proveedor sin complete() falla al construirlo,
+    no en la primera pregunta.
+    """
+    class IncompleteProvider(LLMProvider):
+        name = "incompleto"
+
+    with pytest.raises(TypeError):
+        IncompleteProvider()
+
+
+def test_chat_ia_uses_response_cache(client: TestClient, db_session, monkeypatch):
+    """
+    Test para verificar que una pregunta repetida (normalizada) sale de la caché.
+    """
+    monkeypatch.setattr(llm_client, "provider", LocalStubProvider())
+
+    # 1. Primera pregunta: la responde el modelo local
+    response = client.post("/ai/chat-ia", json={"question": "¿Qué laboratorios están ocupados?"})
+    assert response.status_code == 200
+    assert response.json()["cache"] is False
+
+    # 2. La misma pregunta con otro formato sale de la caché
+    response = client.post("/ai/chat-ia", json={"question": "  qué LABORATORIOS están   ocupados "})
+    assert response.status_code == 200
+    assert response.json()["cache"] is True
+
+
+def test_chat_ia_timeout(client: TestClient, db_session, monkeypatch):
+    """
+    Test para verificar que un modelo lento devuelve 504 en lugar de colgar la petición.
+    """
+    monkeypatch.setattr(llm_client, "provider", SlowProvider())
+    monkeypatch.setattr(llm_client, "timeout", 0.05)
+
+    response = client.post("/ai/chat-ia", json={"question": "¿Hay huecos el lunes?"})
+    assert response.status_code == 504
+
+
+def test_chat_ia_stream_sends_tokens(client: TestClient, db_session, monkeypatch):
+    """
+    Test para verificar que /ai/chat-ia/stream envía la respuesta como eventos SSE.
+    """
+    monkeypatch.setattr(llm_client, "provider", LocalStubProvider())
+
+    # 1. Pedimos la respuesta en streaming
+    with client.stream("POST", "/ai/chat-ia/stream", json={"question": "¿Quién reservó hoy?"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+
+    # 2. Varios fragmentos y un evento final
+    events = [block for block in body.split("\n\n") if block]
+    assert len(events) > 2
+    assert events[0].startswith('data: {"token"')
+    assert events[-1].startswith("event: done")
+
+
+def test_chat_ia_context_uses_relevant_reservations(client: TestClient, test_user, monkeypatch):
+    """
+    Test para verificar que el contexto de la IA son las reservas relevantes
+    para la pregunta y no solo las más recientes.
+    """
+    monkeypatch.setattr(llm_client, "provider", LocalStubProvider())
+
+    # 1. Una reserva antigua de robótica y varias más recientes de otro tema
+    client.post("/reservations/", json={
+        "lab_name": "Lab Robótica",
+        "reserved_by": "Ana",
+        "purpose": "Competencia de robots",
+        "start_time": "2030-01-05T09:00:00",
+        "active": True,
+    })
+    for day in range(10, 22):
+        client.post("/reservations/", json={
+            "lab_name": "Lab Cómputo",
+            "reserved_by": "Luis",
+            "purpose": "Clase de redes",
+            "start_time": f"2030-02-{day}T09:00:00",
+            "active": True,
+        })
+
+    # 2. La pregunta (sin tildes ni mayúsculas) recupera la reserva de robótica
+    response = client.post("/ai/chat-ia", json={"question": "¿Quién usó el lab de robotica?"})
+    assert response.status_code == 200
+    assert "Lab Robótica reservado por Ana" in response.json()["respuesta"]
+
+
+def test_retrieval_index_persists_to_disk(tmp_path, db_session):
+    """
+    Test para verificar que el índice se guarda en disco y se recarga sin la base de datos.
+    """
+    path = str(tmp_path / "retrieval.json")
+    index = RetrievalIndex(session_factory=lambda: None, persist_path=path)
+    index._replace_all({1: ReservationDoc("Lab Física", "Eva", "Óptica", "2030-01-01 10:00:00")}, version=3)
+    index.save()
+
+    # 1. Un índice nuevo carga el archivo (la fábrica de sesiones no se usa)
+    restored = RetrievalIndex(session_factory=lambda: None, persist_path=path)
+    restored.ensure_fresh(3)
+    assert restored.search("optica")[0].lab_name == "Lab Física"
+
+    # 2. Las escrituras del proceso se reflejan sin reconstruir
+    restored.apply_write(4, 1, None)
+    assert restored.search("optica") == []
+    assert restored.version == 4
+
+
+def test_abandoned_stream_is_cancelled_upstream(db_session):
+    """
+    Test para verificar que cerrar el stream a mitad (cliente desconectado)
+    cierra la generación del proveedor y libera la plaza de concurrencia.
+    """
+    closed = []
+
+    class EndlessProvider(LLMProvider):
+        name = "endless"
+
+        async def complete(self, messages, max_tokens):
+            return "x"
+
+        async def stream(self, messages, max_tokens):
+            try:
+                while True:
+                    yield "x"
+                    await asyncio.sleep(0)
+            finally:
+                closed.append(True)
+
+    async def run():
+        client = LLMClient(EndlessProvider(), max_concurrency=1, timeout=1, queue_timeout=0.1, cache_ttl=60)
+        # 1. Leemos un fragmento y abandonamos
+        tokens, _ = await client.start_stream([], "pregunta", "contexto")
+        await anext(tokens)
+        await tokens.aclose()
+        return client._get_semaphore().locked()
+
+    # 2. El proveedor se cerró y la plaza quedó libre
+    assert asyncio.run(run()) is False
+    assert closed == [True]
+
+
+def test_sugerir_uses_history_and_availability(client: TestClient, test_user):
+    """
+    Test para verificar que /ai/sugerir recomienda según el historial del
+    usuario y nunca propone una hora ya ocupada.
+    """
+    # 1. Historial: el usuario suele reservar el Lab Química a las 10h
+    for day in (2, 3, 4):
+        client.post("/reservations/", json={
+            "lab_name": "Lab Química",
+            "reserved_by": "Test User",
+            "purpose": "Prácticas",
+            "start_time": f"2030-09-0{day}T10:00:00",
+            "active": True,
+        })
+
+    # 2. Para un día libre, la mejor sugerencia es su laboratorio y hora habituales
+    data = client.get("/ai/sugerir", params={"fecha": "2030-09-10"}).json()
+    assert data["laboratorio_recomendado"] == "Lab Química"
+    assert data["hora_sugerida"] == "10:00"
+
+    # 3. Si esa hora ya está ocupada, se propone otra
+    client.post("/reservations/", json={
+        "lab_name": "Lab Química",
+        "reserved_by": "Otra persona",
+        "purpose": "Examen",
+        "start_time": "2030-09-10T10:00:00",
+        "active": True,
+    })
+    data = client.get("/ai/sugerir", params={"fecha": "2030-09-10"}).json()
+    assert data["hora_sugerida"] != "10:00"
+
+    # 4. Un laboratorio dado de baja no se recomienda (no admitiría la reserva)
+    lab_id = client.get("/labs/").json()[0]["id"]
+    assert client.delete(f"/labs/{lab_id}").status_code == 200
+    data = client.get("/ai/sugerir", params={"fecha": "2030-09-10"}).json()
+    assert data["laboratorio_recomendado"] is None
@@ -1,9 +1,11 @@
 from fastapi.testclient import TestClient
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 from datetime import datetime
 
 # Importamos el modelo de la auditoría para poder buscar en la tabla
 from app.models.audit_log import AuditLog
+from app.core.audit import AuditSink
+from app.crud.audit_log import create_audit_log
 
 # Los fixtures 'client', 'db_session' y 'test_user' vienen de conftest.py
 def test_audit_log_on_create_reservation(client: TestClient, db_session: Session, test_user):
@@ -36,3 +38,66 @@ def test_audit_log_on_create_reservation(client: TestClient, db_session: Session
     assert log_entry.user_id == test_user.id
     assert log_entry.target_id == reservation_id
 
+def test_audit_sink_batches_entries(db_session: Session, test_user):
+    """
+    Test para verificar que el buffer de auditoría escribe por lotes.
+    """
+    # 1. Un buffer propio (sin hilo) que escribe en la base de prueba
+    sink = AuditSink(session_factory=sessionmaker(bind=db_session.get_bind()), batch_size=3)
+
+    # 2. Las entradas quedan en memoria hasta hacer flush
+    for target_id in range(1000, 1005):
+        sink.record(test_user.id, "UPDATE", "Reservation", target_id)
+    assert sink.pending() == 5
+    assert db_session.query(AuditLog).filter(AuditLog.target_id >= 1000).count() == 0
+
+    # 3. flush() las inserta todas (en lotes de 3)
+    assert sink.flush() == 5
+    assert sink.pending() == 0
+    assert db_session.query(AuditLog).filter(AuditLog.target_id >= 1000).count() == 5
+
+    # 4. Las acciones durables se escriben sin pasar por el buffer
+    sink.record(test_user.id, "DELETE", "Reservation", 2000, durable=True)
+    assert sink.pending() == 0
+    assert db_session.query(AuditLog).filter(AuditLog.target_id == 2000).count() == 1
+
+def test_read_audit_logs_with_before_cursor(client: TestClient, db_session: Session, test_user):
+    """
+    Test para verificar la paginación por cursor `before` del historial de auditoría.
+    """
+    # 1. Creamos 5 registros con horas distintas
+    for minute in range(5):
+        db_session.add(AuditLog(
+            timestamp=datetime(2030, 1, 1, 12, minute),
+            user_id=test_user.id,
+            action="UPDATE",
+            target_model="Reservation",
+            target_id=3000 + minute,
+        ))
+    db_session.commit()
+
+    # 2. Recorremos el historial de 2 en 2, del más reciente al más antiguo
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/audit/", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        seen.extend(log["target_id"] for log in data["results"])
+        if not data["next_before"]:
+            break
+        params = {"limit": 2, "before": data["next_before"]}
+
+    assert seen == [3004, 3003, 3002, 3001, 3000]
+
+def test_audit_conditional_get(client: TestClient, db_session: Session, test_user):
+    """
+    Test para verificar que /audit/ responde 304 hasta que se registra otra entrada.
+    """
+    # 1. Primera lectura y revalidación sin cambios
+    etag = client.get("/audit/").headers["ETag"]
+    assert client.get("/audit/", headers={"If-None-Match": etag}).status_code == 304
+
+    # 2. Una nueva entrada de auditoría invalida el ETag
+    create_audit_log(db_session, test_user, "CREATE", "Reservation", 1)
+    assert client.get("/audit/", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.api.v1.endpoints.auth import get_current_user
+from app.core.cache import local_cache
+from app.core.config import settings
+from app.core.security import create_access_token, get_password_hash, password_pool, pwd_ctx
+from app.crud.user import delete_user, update_user
+from app.models.user import User as UserModel
+from app.schemas.user import UserUpdate
+
+# Los fixtures 'db_session', 'async_session_factory' y 'test_user' vienen de conftest.py
+# (se llama a la dependencia real; el override de conftest solo afecta a la API)
+
+def test_current_user_is_cached(db_session: Session, async_session_factory, test_user):
+    """
+    Test para verificar que el usuario autenticado se resuelve desde la caché.
+    """
+    local_cache.clear()
+    token = create_access_token({"sub": test_user.username})
+
+    async def resolve():
+        async with async_session_factory() as db:
+            return await get_current_user(token=token, db=db)
+
+    # 1. La primera vez se consulta la base de datos y se guarda en caché
+    user = asyncio.run(resolve())
+    assert user.id == test_user.id
+
+    # 2. Aunque la fila cambie por fuera del CRUD, se sigue sirviendo desde caché
+    db_session.query(UserModel).filter(UserModel.id == test_user.id).update({"full_name": "Cambiado"})
+    db_session.commit()
+    user = asyncio.run(resolve())
+    assert user.full_name == "Test User"
+
+    # 3. update_user invalida la entrada
+    update_user(db_session, test_user.id, UserUpdate(full_name="Nuevo Nombre"))
+    user = asyncio.run(resolve())
+    assert user.full_name == "Nuevo Nombre"
+
+    # 4. Tras delete_user el token deja de ser válido
+    delete_user(db_session, test_user.id)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(resolve())
+    assert exc.value.status_code == 401
+
+def test_register_and_login(client: TestClient, db_session: Session):
+    """
+    Test para verificar el registro y el inicio de sesión (bcrypt en el pool dedicado).
+    """
+    response = client.post("/auth/register", json={"username": "nuevo", "password": "secreta123"})
+    assert response.status_code == 201
+    assert "access_token" in response.json()
+
+    response = client.post("/auth/token", data={"username": "nuevo", "password": "secreta123"})
+    assert response.status_code == 200
+
+    response = client.post("/auth/token", data={"username": "nuevo", "password": "incorrecta"})
+    assert response.status_code == 401
+
+def test_login_rehashes_when_cost_changes(client: TestClient, db_session: Session):
+    """
+    Test para verificar que un hash con otro coste se regenera al iniciar sesión.
+    """
+    # 1. Usuario con un hash antiguo de coste 4
+    old_hash = pwd_ctx.handler("bcrypt").using(rounds=4).hash("secreta123")
+    db_session.add(UserModel(username="antiguo", hashed_password=old_hash))
+    db_session.commit()
+
+    # 2. Al iniciar sesión se guarda un hash con el coste configurado
+    response = client.post("/auth/token", data={"username": "antiguo", "password": "secreta123"})
+    assert response.status_code == 200
+    db_session.expire_all()
+    new_hash = db_session.query(UserModel).filter(UserModel.username == "antiguo").one().hashed_password
+    assert new_hash != old_hash
+    assert new_hash.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+
+def test_login_returns_503_when_pool_is_full(client: TestClient, db_session: Session, monkeypatch):
+    """
+    Test para verificar que con el pool de bcrypt lleno se responde 503 de inmediato.
+    """
+    db_session.add(UserModel(username="ocupado", hashed_password=get_password_hash("secreta123")))
+    db_session.commit()
+    monkeypatch.setattr(password_pool, "queue_limit", 0)
+
+    response = client.post("/auth/token", data={"username": "ocupado", "password": "secreta123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,19 @@
+from benchmarks.run import compare, percentile, summarize
+
+
+def test_benchmark_summary_and_baseline_comparison():
+    """
+    Test para verificar los percentiles del informe y la detección de regresiones.
+    """
+    # 1. Percentiles por rango más cercano
+    latencies = [i / 1000 for i in range(1, 101)]
+    assert percentile(sorted(latencies), 95) == 0.095
+    result = summarize(latencies, elapsed=2.0, errors=0, sql_counts=[3] * 100)
+    assert result["p99_ms"] == 99.0 and result["rps"] == 50.0
+
+    # 2. Dentro de la tolerancia no hay regresión; una sentencia SQL más sí la hay
+    baseline = {"scenarios": {"list": dict(result)}}
+    slower = {"scenarios": {"list": dict(result, p95_ms=result["p95_ms"] * 1.1)}}
+    assert compare(slower, baseline, tolerance=0.2) == []
+    more_sql = {"scenarios": {"list": dict(result, sql_per_request=4.0)}}
+    assert compare(more_sql, baseline, tolerance=0.2) == ["list.sql_per_request: 3.0 -> 4.0"]
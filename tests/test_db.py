@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import create_engine, exc
+
+from app.db.session import InstrumentedQueuePool, PoolStats
+
+
+def test_pool_stats_count_overflow_and_timeouts(tmp_path):
+    """
+    Test para verificar que el pool instrumentado cuenta desbordes y esperas agotadas.
+    """
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=1, pool_timeout=0.05,
+    )
+    engine.pool.stats = PoolStats()
+
+    # 1. La segunda conexión simultánea es de desborde
+    first, second = engine.connect(), engine.connect()
+    assert engine.pool.stats.overflow_events == 1
+
+    # 2. La tercera agota la espera
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    assert engine.pool.stats.timeouts == 1
+
+    # 3. dispose() recrea el pool conservando las estadísticas
+    first.close()
+    second.close()
+    engine.dispose()
+    assert engine.pool.stats.checkouts == 2
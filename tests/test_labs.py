@@ -0,0 +1,128 @@
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.core import versioning
+from app.core.config import settings
+from app.models.lab import Lab
+from app.utils.lab_catalog import lab_catalog
+from tests.conftest import engine
+
+
+def test_lab_crud(client: TestClient, test_user):
+    """
+    Test para verificar el CRUD de /labs: alta, nombre duplicado, edición y baja lógica.
+    """
+    # 1. Alta de un laboratorio y nombre repetido
+    response = client.post("/labs/", json={"name": "Lab Óptica", "capacity": 12})
+    assert response.status_code == 201, response.json()
+    lab = response.json()
+    assert lab["is_active"] is True
+    assert client.post("/labs/", json={"name": "Lab Óptica"}).status_code == 409
+
+    # 2. Edición y lectura
+    response = client.put(f"/labs/{lab['id']}", json={"description": "Mesa óptica"})
+    assert response.json()["description"] == "Mesa óptica"
+    assert client.get(f"/labs/{lab['id']}").json()["capacity"] == 12
+    assert client.get("/labs/999999").status_code == 404
+    assert client.put(f"/labs/{lab['id']}", json={"is_active": None}).status_code == 422
+    assert client.put(f"/labs/{lab['id']}", json={"name": None}).status_code == 422
+    assert client.put(f"/labs/{lab['id']}", json={"capacity": None}).json()["capacity"] is None
+
+    # 3. La baja lo oculta del listado y ya no admite reservas
+    assert client.delete(f"/labs/{lab['id']}").status_code == 200
+    assert [l["name"] for l in client.get("/labs/").json()] == []
+    assert [l["name"] for l in client.get("/labs/", params={"include_inactive": True}).json()] == ["Lab Óptica"]
+    response = client.post("/reservations/", json={
+        "lab_name": "Lab Óptica", "reserved_by": "Test User", "purpose": "Láser",
+        "start_time": "2030-09-01T10:00:00",
+    })
+    assert response.status_code == 422
+
+
+def test_reservations_reference_lab_by_id(client: TestClient, test_user):
+    """
+    Test para verificar que una reserva da de alta su laboratorio, guarda el
+    lab_id y que renombrar el laboratorio se refleja sin tocar las reservas.
+    """
+    # 1. Reservar en un laboratorio nuevo lo crea en el catálogo
+    response = client.post("/reservations/", json={
+        "lab_name": "Lab Redes", "reserved_by": "Test User", "purpose": "Switches",
+        "start_time": "2030-09-02T10:00:00",
+    })
+    assert response.status_code == 201, response.json()
+    reservation = response.json()
+    labs = client.get("/labs/").json()
+    assert [(l["id"], l["name"]) for l in labs] == [(reservation["lab_id"], "Lab Redes")]
+
+    # 2. Otra reserva en el mismo laboratorio reutiliza el lab_id
+    second = client.post("/reservations/", json={
+        "lab_name": "Lab Redes", "reserved_by": "Test User", "purpose": "Routers",
+        "start_time": "2030-09-02T12:00:00",
+    }).json()
+    assert second["lab_id"] == reservation["lab_id"]
+
+    # 3. Renombrar el laboratorio cambia lo que devuelven reservas y análisis
+    first = client.get(f"/reservations/{reservation['id']}")
+    client.put(f"/labs/{reservation['lab_id']}", json={"name": "Lab Redes y Sistemas"})
+    response = client.get(f"/reservations/{reservation['id']}", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()["lab_name"] == "Lab Redes y Sistemas"
+    popular = client.get("/reservations/analysis/popular-times").json()
+    assert popular["popular_labs"] == [{"lab_name": "Lab Redes y Sistemas", "count": 2}]
+
+    # 4. El catálogo se sirve desde memoria: listar laboratorios no consulta la base
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert client.get("/labs/", params={"limit": 5}).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert statements == []
+
+
+def test_catalog_sees_other_workers_without_redis(db_session, monkeypatch):
+    """
+    Test para verificar que sin Redis (contadores locales) el catálogo acaba
+    viendo un laboratorio dado de alta por otro worker.
+    """
+    monkeypatch.setattr(settings, "VERSION_STAMP_LOCAL_TTL", 0.05)
+    monkeypatch.setattr(versioning, "_local_counters", {})
+    monkeypatch.setattr(lab_catalog, "check_seconds", 0)
+
+    # 1. Carga inicial con el catálogo vacío
+    assert lab_catalog.all() == []
+
+    # 2. Otro worker escribe directamente en la base (este proceso no ve su contador)
+    db_session.add(Lab(name="Lab Remoto", is_active=True))
+    db_session.commit()
+
+    # 3. Pasado el TTL local el contador avanza y el catálogo se recarga
+    time.sleep(0.06)
+    assert [lab.name for lab in lab_catalog.all()] == ["Lab Remoto"]
+
+
+def test_unknown_lab_names_reload_catalog_at_most_once(client: TestClient, test_user):
+    """
+    Test para verificar que una ráfaga de nombres de laboratorio desconocidos
+    no recarga el catálogo una vez por nombre (caché negativa por ventana).
+    """
+    # 1. Catálogo ya cargado
+    assert client.get("/labs/").status_code == 200
+
+    # 2. Disponibilidad de 20 laboratorios inexistentes
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.get("/reservations/availability", params={
+            "lab": [f"Lab Fantasma {i}" for i in range(20)],
+            "start_date": "2030-09-03", "end_date": "2030-09-03",
+        })
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert response.status_code == 200
+    assert all(lab["free"] for lab in response.json()["labs"])
+    assert len([s for s in statements if "FROM labs" in s]) <= 1
@@ -0,0 +1,39 @@
+from fastapi.testclient import TestClient
+
+from app.core.metrics import Histogram
+
+
+def test_metrics_endpoint_reports_routes_and_queries(client: TestClient, test_user):
+    """
+    Test para verificar que /metrics expone latencia por ruta (con la plantilla,
+    no el id), códigos de estado y consultas SQL por petición.
+    """
+    # 1. Una petición con consultas a la base y otra a una reserva inexistente
+    client.get("/reservations/")
+    client.get("/reservations/999999")
+
+    # 2. Formato de texto de Prometheus con las series esperadas
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/reservations/{id}",status="404"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/reservations/",le="+Inf"}' in body
+    assert 'http_request_db_queries_count{method="GET",route="/reservations/"}' in body
+    assert "http_requests_in_flight" in body
+    assert 'db_query_duration_seconds_count{engine="async"}' in body
+
+
+def test_histogram_buckets_are_cumulative():
+    """
+    Test para verificar que las cubetas del histograma se exponen acumuladas.
+    """
+    histogram = Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, "/x")
+
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/x",le="1"} 3' in lines
+    assert 'demo_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{route="/x"} 4' in lines
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.profiler import ProfilerMiddleware
+from app.main import app
+from app.models.lab import Lab
+from app.models.reservation import Reservation as ReservationModel
+from app.models.user import User as UserModel
+from tests.conftest import TestingSessionLocal
+
+
+def test_profile_header_returns_report(db_session):
+    """
+    Test para verificar que X-Profile devuelve el informe en lugar de la respuesta.
+    """
+    with TestClient(ProfilerMiddleware(app)) as profiled:
+        # 1. Informe JSON descargable con las sentencias SQL
+        response = profiled.get("/reservations/", headers={"X-Profile": "json"})
+        assert response.status_code == 200
+        assert "attachment" in response.headers["content-disposition"]
+        report = response.json()
+        assert report["path"] == "/reservations/"
+        assert report["sql"]["count"] >= 1
+
+        # 2. Pilas colapsadas (texto plano) para flamegraph
+        response = profiled.get("/reservations/", headers={"X-Profile": "collapsed"})
+        assert response.headers["content-type"].startswith("text/plain")
+
+        # 3. Sin cabecera (y sin muestreo) la respuesta es la normal
+        assert "results" in profiled.get("/reservations/").json()
+
+
+def test_profiler_flags_lazy_owner_as_n_plus_one(db_session):
+    """
+    Test para verificar que leer Reservation.owner (lazy) en un bucle se marca como N+1.
+    """
+    # 1. Cinco reservas de cinco usuarios distintos
+    lab = Lab(name="Lab N1")
+    db_session.add(lab)
+    db_session.flush()
+    for i in range(5):
+        user = UserModel(username=f"n1_{i}", email=f"n1_{i}@example.com", hashed_password="x")
+        db_session.add(user)
+        db_session.flush()
+        db_session.add(ReservationModel(
+            lab_id=lab.id, reserved_by="Test", purpose="Prueba",
+            start_time=datetime(2030, 5, i + 1, 10), end_time=datetime(2030, 5, i + 1, 11), owner_id=user.id,
+        ))
+    db_session.commit()
+
+    demo = FastAPI()
+
+    @demo.get("/owners")
+    def owners():
+        db = TestingSessionLocal()
+        try:
+            return [r.owner.username for r in db.query(ReservationModel).all()]
+        finally:
+            db.close()
+
+    # 2. La consulta del dueño se repite una vez por reserva
+    report = TestClient(ProfilerMiddleware(demo)).get("/owners", headers={"X-Profile": "json"}).json()
+    flagged = report["sql"]["n_plus_one"]
+    assert len(flagged) == 1
+    assert flagged[0]["count"] == 5
+    assert "FROM users" in flagged[0]["sql"]
+    # 3. Se indica la línea del proyecto que dispara las consultas
+    assert all(caller.startswith("tests/test_profiler.py:") for caller in flagged[0]["callers"])
@@ -0,0 +1,160 @@
+import asyncio
+
+import redis
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import ratelimit
+from app.core.config import settings
+from app.core.ratelimit import RateLimiter, RateLimitMiddleware
+from app.core.security import create_access_token
+from app.db.session import PoolStats
+
+demo = FastAPI()
+
+
+@demo.get("/items/{id}")
+def read_item(id: int):
+    return {"id": id}
+
+
+@demo.post("/items/")
+def create_item():
+    return {"ok": True}
+
+
+@demo.get("/health")
+def health():
+    return {"status": "ok"}
+
+
+def _client(default="3/minute", routes=None) -> TestClient:
+    limiter = RateLimiter(default, routes or {})
+    return TestClient(RateLimitMiddleware(demo, limiter=limiter, exempt_prefixes=["/health"]))
+
+
+def test_rate_limit_per_identity_and_route(monkeypatch):
+    """
+    Test para verificar el 429 con Retry-After, que cada usuario tiene su propia
+    cubeta, que las reglas por ruta se suman a la general y las rutas exentas.
+    """
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    client = _client(routes={"POST /items/": "1/minute"})
+
+    # 1. Tres peticiones de la misma IP pasan; la cuarta no
+    for item_id in range(3):
+        assert client.get(f"/items/{item_id}").status_code == 200
+    response = client.get("/items/9")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.headers["X-RateLimit-Remaining"] == "0"
+
+    # 2. Con token, la cubeta es la del usuario y no la de la IP
+    token = create_access_token({"sub": "ana"})
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/items/1", headers=headers).status_code == 200
+
+    # 3. Un token inválido cuenta como la IP (ya agotada)
+    assert client.get("/items/1", headers={"Authorization": "Bearer falso"}).status_code == 429
+
+    # 4. La regla de la ruta se agota antes que la general
+    assert client.post("/items/", headers=headers).status_code == 200
+    assert client.post("/items/", headers=headers).status_code == 429
+    assert client.get("/items/2", headers=headers).status_code == 200
+
+    # 5. Las rutas exentas no consumen tokens
+    assert client.get("/health").status_code == 200
+
+
+class FakeScript:
+    """Script Lua registrado: responde lo indicado y anota cada llamada."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def __call__(self, keys, args):
+        try:
+            asyncio.get_running_loop()
+            on_loop = True
+        except RuntimeError:
+            on_loop = False
+        self.calls.append((keys, args, on_loop))
+        return self.replies.pop(0)
+
+
+class FakeRedis:
+    def __init__(self, script):
+        self.script = script
+
+    def register_script(self, source):
+        return self.script
+
+
+def test_rate_limit_uses_redis_off_the_event_loop(monkeypatch):
+    """
+    Test para verificar que con Redis las cubetas se actualizan con el script
+    (fuera del event loop) y que si Redis falla se usan las cubetas locales.
+    """
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    script = FakeScript([[1, 2, 0], [0, 0, 1500]])
+    monkeypatch.setattr(ratelimit, "active_redis", lambda: FakeRedis(script))
+    client = _client(routes={"POST /items/": "1/minute"})
+
+    # 1. La respuesta del script decide: la segunda petición se rechaza
+    assert client.post("/items/").status_code == 200
+    response = client.post("/items/")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert response.headers["X-RateLimit-Remaining"] == "0"
+
+    # 2. Cubeta general y de ruta en una sola llamada, cada una con su ráfaga y ritmo
+    keys, args, on_loop = script.calls[0]
+    assert keys == ["ratelimit:{ip:testclient}", "ratelimit:{ip:testclient}:POST /items/"]
+    assert args == [3, 0.05, 1, 1 / 60]
+    assert not any(on_loop for _, _, on_loop in script.calls)
+
+    # 3. Redis caído: se marca como tal y se sigue con las cubetas locales
+    errors = []
+    monkeypatch.setattr(ratelimit, "mark_redis_down", errors.append)
+    limiter = RateLimiter("3/minute", {})
+    refused = redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.5)
+    monkeypatch.setattr(ratelimit, "active_redis", lambda: refused)
+    client = TestClient(RateLimitMiddleware(demo, limiter=limiter, exempt_prefixes=[]))
+    assert client.get("/items/1").status_code == 200
+    assert isinstance(errors[0], redis.ConnectionError)
+    assert limiter.local._state
+
+
+def test_load_shedding_returns_503(monkeypatch):
+    """
+    Test para verificar que con el pool saturado se responde 503 sin llegar a la app.
+    """
+    monkeypatch.setattr(settings, "LOAD_SHED_ENABLED", True)
+    client = _client()
+
+    # 1. Espera reciente por conexión por encima de la cota => 503
+    monkeypatch.setattr(ratelimit, "recent_pool_wait", lambda: settings.LOAD_SHED_POOL_WAIT_SECONDS + 1)
+    response = client.get("/items/1")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.LOAD_SHED_RETRY_AFTER_SECONDS)
+    assert client.get("/health").status_code == 200
+
+    # 2. Sin espera vuelve a atender
+    monkeypatch.setattr(ratelimit, "recent_pool_wait", lambda: 0.0)
+    assert client.get("/items/1").status_code == 200
+
+
+def test_pool_recent_wait_decays():
+    """
+    Test para verificar que la espera reciente del pool sube con las esperas y decae con el tiempo.
+    """
+    stats = PoolStats()
+    for _ in range(10):
+        stats.record(2.0, overflowed=False)
+    high = stats.recent_wait()
+    assert high > 1.0
+
+    # Dos semividas después queda en una cuarta parte
+    stats._recent_at -= 2 * PoolStats.RECENT_HALFLIFE
+    assert abs(stats.recent_wait() - high / 4) < 0.01
@@ -1,6 +1,15 @@
 from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.crud.reservation import LIST_ORDER, list_reservations_query
+from app.models.reservation import Reservation as ReservationModel
+from app.models.user import User as UserModel
+from app.utils.availability import availability_index
+from app.utils.interval_index import LabIntervalIndex
+from app.utils.pagination import compile_for_driver, keyset_query
 
 # Los tests reciben 'client', 'db_session' y 'test_user' como argumentos.
 # Pytest se los pasa automáticamente desde el archivo conftest.py.
@@ -109,4 +118,462 @@ def test_soft_delete_reservation(client: TestClient, test_user):
     response = client.get(f"/reservations/{reservation_id}")
     assert response.status_code == 404
 
-    
\ No newline at end of file
+def test_overlapping_reservation_is_rejected(client: TestClient, test_user):
+    """
+    Test para verificar que no se puede reservar un laboratorio ya ocupado.
+    """
+    # 1. Reservamos el laboratorio de 10:00 a 12:00
+    base = {
+        "lab_name": "Laboratorio con Choques",
+        "reserved_by": "Test User",
+        "purpose": "Probar choques de horario",
+        "active": True,
+    }
+    response = client.post("/reservations/", json={
+        **base,
+        "start_time": "2030-01-10T10:00:00",
+        "end_time": "2030-01-10T12:00:00",
+    })
+    assert response.status_code == 201
+    first_id = response.json()["id"]
+
+    # 2. Una reserva que se solapa debe devolver 409
+    response = client.post("/reservations/", json={
+        **base,
+        "start_time": "2030-01-10T11:30:00",
+        "end_time": "2030-01-10T13:00:00",
+    })
+    assert response.status_code == 409
+    assert response.json()["detail"]["conflicting_ids"] == [first_id]
+
+    # 3. Una reserva contigua (empieza justo al terminar la otra) sí es válida
+    response = client.post("/reservations/", json={
+        **base,
+        "start_time": "2030-01-10T12:00:00",
+    })
+    assert response.status_code == 201
+    assert response.json()["end_time"].startswith("2030-01-10T13:00:00")
+
+    # 4. Al borrar la primera, su horario queda libre otra vez
+    client.delete(f"/reservations/{first_id}")
+    response = client.post("/reservations/", json={
+        **base,
+        "start_time": "2030-01-10T10:30:00",
+        "end_time": "2030-01-10T11:30:00",
+    })
+    assert response.status_code == 201
+
+def test_update_reservation_into_conflict(client: TestClient, test_user):
+    """
+    Test para verificar que mover una reserva sobre otra devuelve 409.
+    """
+    base = {
+        "lab_name": "Laboratorio Movido",
+        "reserved_by": "Test User",
+        "purpose": "Probar choques al actualizar",
+        "active": True,
+    }
+    client.post("/reservations/", json={**base, "start_time": "2030-02-01T08:00:00"})
+    response = client.post("/reservations/", json={**base, "start_time": "2030-02-01T10:00:00"})
+    second_id = response.json()["id"]
+
+    # Mover la segunda a las 08:30 (conserva su hora de duración) choca con la primera
+    response = client.put(f"/reservations/{second_id}", json={"start_time": "2030-02-01T08:30:00"})
+    assert response.status_code == 409
+
+    # Moverla a otro laboratorio a la misma hora sí es posible
+    response = client.put(f"/reservations/{second_id}", json={
+        "lab_name": "Otro Laboratorio",
+        "start_time": "2030-02-01T08:30:00",
+    })
+    assert response.status_code == 200
+    assert response.json()["end_time"].startswith("2030-02-01T09:30:00")
+    assert response.json()["lab_name"] == "Otro Laboratorio"
+
+def test_update_reservation_respects_max_duration(client: TestClient, test_user):
+    """
+    Test para verificar que un PUT con solo end_time no deja una reserva más
+    larga que RESERVATION_MAX_MINUTES (el schema solo lo ve con ambos extremos).
+    """
+    response = client.post("/reservations/", json={
+        "lab_name": "Laboratorio Largo", "reserved_by": "Test User", "purpose": "Duración máxima",
+        "start_time": "2030-02-05T08:00:00",
+    })
+    reservation_id = response.json()["id"]
+
+    # 1. Alargar solo el final más allá del máximo => 422 y la reserva no cambia
+    response = client.put(f"/reservations/{reservation_id}", json={"end_time": "2030-02-07T08:00:00"})
+    assert response.status_code == 422
+    assert client.get(f"/reservations/{reservation_id}").json()["end_time"].startswith("2030-02-05T09:00:00")
+
+    # 2. Dentro del máximo sí se puede alargar
+    response = client.put(f"/reservations/{reservation_id}", json={"end_time": "2030-02-05T12:00:00"})
+    assert response.status_code == 200
+
+def test_cursor_pagination(client: TestClient, test_user):
+    """
+    Test para verificar la paginación por cursor (keyset) del listado.
+    """
+    # 1. Creamos 5 reservas en horas distintas
+    for hour in range(8, 13):
+        client.post("/reservations/", json={
+            "lab_name": "Laboratorio Paginado",
+            "reserved_by": "Test User",
+            "purpose": "Probar la paginación",
+            "start_time": f"2030-03-01T{hour:02d}:00:00",
+            "active": True,
+        })
+
+    # 2. Recorremos las páginas de 2 en 2 siguiendo next_cursor
+    seen = []
+    response = client.get("/reservations/", params={"limit": 2, "include_total": True})
+    data = response.json()
+    assert data["total"] == 5
+    while True:
+        assert response.status_code == 200
+        seen.extend(r["start_time"][:13] for r in data["results"])
+        if not data["next_cursor"]:
+            break
+        response = client.get("/reservations/", params={"limit": 2, "cursor": data["next_cursor"]})
+        data = response.json()
+
+    # 3. Todas las reservas aparecen una sola vez y en orden
+    assert seen == [f"2030-03-01T{hour:02d}" for hour in range(8, 13)]
+
+    # 4. Un cursor manipulado devuelve 400
+    response = client.get("/reservations/", params={"cursor": "no-es-un-cursor"})
+    assert response.status_code == 400
+
+def test_popular_times_rollups(client: TestClient, db_session: Session, test_user):
+    """
+    Test para verificar que los rollups de popular-times siguen a las escrituras
+    y coinciden con una reconstrucción completa desde la tabla de reservas.
+    """
+    from app.crud.rollup import get_popular_times, rebuild_rollups
+
+    # 1. Tres reservas: dos en el Lab A (9h y 10h) y una en el Lab B (9h)
+    ids = []
+    for lab, hour in [("Lab A", 9), ("Lab A", 10), ("Lab B", 9)]:
+        response = client.post("/reservations/", json={
+            "lab_name": lab,
+            "reserved_by": "Test User",
+            "purpose": "Probar rollups",
+            "start_time": f"2030-04-01T{hour:02d}:00:00",
+            "active": True,
+        })
+        ids.append(response.json()["id"])
+
+    # 2. Movemos la de las 10h a las 14h y borramos la del Lab B
+    client.put(f"/reservations/{ids[1]}", json={"start_time": "2030-04-01T14:00:00"})
+    client.delete(f"/reservations/{ids[2]}")
+
+    # 3. El endpoint refleja los cambios
+    response = client.get("/reservations/analysis/popular-times")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["popular_hours"] == [{"hour": 9, "count": 1}, {"hour": 14, "count": 1}]
+    assert data["popular_labs"] == [{"lab_name": "Lab A", "count": 2}]
+
+    # 4. La reconciliación desde la tabla original da el mismo resultado
+    rebuild_rollups(db_session)
+    assert get_popular_times(db_session) == data
+
+def test_conditional_get_with_etag(client: TestClient, test_user):
+    """
+    Test para verificar el GET condicional: 304 mientras no haya cambios y
+    un ETag nuevo después de una escritura.
+    """
+    reservation = {
+        "lab_name": "Laboratorio ETag",
+        "reserved_by": "Test User",
+        "purpose": "Probar ETag",
+        "start_time": "2030-05-01T09:00:00",
+        "active": True,
+    }
+    client.post("/reservations/", json=reservation)
+
+    # 1. La primera lectura devuelve ETag y Last-Modified
+    response = client.get("/reservations/")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert "Last-Modified" in response.headers
+
+    # 2. Con If-None-Match y sin cambios: 304 sin cuerpo
+    response = client.get("/reservations/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # 3. Otros filtros generan otro ETag
+    response = client.get("/reservations/", params={"limit": 1}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    # 4. Tras una escritura el ETag anterior deja de valer
+    client.post("/reservations/", json={**reservation, "start_time": "2030-05-01T11:00:00"})
+    response = client.get("/reservations/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["size"] == 2
+
+def test_occupancy_heatmap(client: TestClient, test_user):
+    """
+    Test para verificar el mapa de ocupación: las horas se reparten entre las
+    celdas (día, hora) que cubre cada reserva.
+    """
+    # 1. Lunes 6 de mayo de 2030: 9:30-11:00 en el Lab A
+    client.post("/reservations/", json={
+        "lab_name": "Lab A",
+        "reserved_by": "Test User",
+        "purpose": "Probar ocupación",
+        "start_time": "2030-05-06T09:30:00",
+        "end_time": "2030-05-06T11:00:00",
+        "active": True,
+    })
+
+    # 2. Pedimos la semana completa
+    response = client.get("/reservations/analysis/occupancy", params={
+        "start_date": "2030-05-06", "end_date": "2030-05-12",
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert [lab["lab_name"] for lab in data["labs"]] == ["Lab A"]
+
+    # 3. Media hora a las 9h y una hora completa a las 10h del lunes
+    monday = data["labs"][0]["occupied_hours"][0]
+    assert monday[9] == 0.5
+    assert monday[10] == 1.0
+    assert sum(sum(day) for day in data["labs"][0]["occupied_hours"]) == 1.5
+    assert data["lead_time_hours"]["count"] == 1
+
+    # 4. Un rango invertido se rechaza
+    response = client.get("/reservations/analysis/occupancy", params={
+        "start_date": "2030-05-12", "end_date": "2030-05-06",
+    })
+    assert response.status_code == 400
+
+def test_export_reservations(client: TestClient, test_user):
+    """
+    Test para verificar la exportación en streaming (CSV, NDJSON y gzip).
+    """
+    import csv, gzip, io, json
+
+    # 1. Creamos dos reservas
+    for hour in (9, 11):
+        client.post("/reservations/", json={
+            "lab_name": "Laboratorio Export",
+            "reserved_by": "Test User",
+            "purpose": "Probar exportación",
+            "start_time": f"2030-06-01T{hour:02d}:00:00",
+            "active": True,
+        })
+
+    # 2. CSV: cabecera + una fila por reserva
+    response = client.get("/reservations/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["start_time"][11:13] for row in rows] == ["09", "11"]
+
+    # 3. NDJSON comprimido con gzip
+    response = client.get("/reservations/export", params={"format": "ndjson", "gzip": True})
+    assert response.status_code == 200
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert [json.loads(line)["lab_name"] for line in lines] == ["Laboratorio Export"] * 2
+
+def test_availability_free_slots(client: TestClient, test_user):
+    """
+    Test para verificar la búsqueda de huecos libres y que se actualiza al reservar.
+    """
+    params = {
+        "lab": "Lab Libre", "start_date": "2030-07-01", "end_date": "2030-07-01",
+        "duration_minutes": 60, "open_hour": 8, "close_hour": 12,
+    }
+
+    # 1. Sin reservas todo el horario está libre
+    response = client.get("/reservations/availability", params=params)
+    assert response.status_code == 200
+    free = response.json()["labs"][0]["free"]
+    assert [(w["start"][11:16], w["end"][11:16]) for w in free] == [("08:00", "12:00")]
+
+    # 2. Reservamos 9:00-10:30: quedan 8-9 y 10:30-12
+    client.post("/reservations/", json={
+        "lab_name": "Lab Libre",
+        "reserved_by": "Test User",
+        "purpose": "Probar disponibilidad",
+        "start_time": "2030-07-01T09:00:00",
+        "end_time": "2030-07-01T10:30:00",
+        "active": True,
+    })
+    free = client.get("/reservations/availability", params=params).json()["labs"][0]["free"]
+    assert [(w["start"][11:16], w["end"][11:16]) for w in free] == [("08:00", "09:00"), ("10:30", "12:00")]
+
+    # 3. Si pedimos 2 horas seguidas no queda ningún hueco
+    free = client.get("/reservations/availability", params={**params, "duration_minutes": 120}).json()["labs"][0]["free"]
+    assert free == []
+
+
+def test_availability_survives_concurrent_invalidation(client: TestClient, test_user, monkeypatch):
+    """
+    Test para verificar que si otra escritura descarta el laboratorio del índice
+    mientras se cargan sus días, la respuesta sigue contando las reservas.
+    """
+    params = {
+        "lab": "Lab Carrera", "start_date": "2030-07-02", "end_date": "2030-07-02",
+        "duration_minutes": 60, "open_hour": 8, "close_hour": 12,
+    }
+    # 1. Una reserva de 9:00 a 11:00
+    response = client.post("/reservations/", json={
+        "lab_name": "Lab Carrera", "reserved_by": "Test User", "purpose": "Carrera",
+        "start_time": "2030-07-02T09:00:00", "end_time": "2030-07-02T11:00:00",
+    })
+    lab_id = response.json()["lab_id"]
+
+    # 2. Simulamos una escritura de otro worker justo antes de guardar los bitsets
+    original_load = availability_index.load
+    def load_after_write(*args):
+        availability_index.invalidate(lab_id)
+        return original_load(*args)
+    monkeypatch.setattr(availability_index, "load", load_after_write)
+
+    # 3. Los bitsets cargados se usan igualmente: no se da el día por libre
+    free = client.get("/reservations/availability", params=params).json()["labs"][0]["free"]
+    assert [(w["start"][11:16], w["end"][11:16]) for w in free] == [("08:00", "09:00"), ("11:00", "12:00")]
+
+
+def test_list_filters_use_half_open_day_and_partial_index(client: TestClient, test_user, db_session: Session):
+    """
+    Test para verificar los filtros del listado (día en rango semiabierto,
+    lab_name sin comodines) y que la consulta usa el índice parcial.
+    """
+    # 1. Una reserva al final del día y otra justo al empezar el siguiente
+    for lab, start in (("Lab_Redes", "2030-08-01T23:30:00"), ("Lab Redes 2", "2030-08-02T00:00:00")):
+        client.post("/reservations/", json={
+            "lab_name": lab, "reserved_by": "Test User", "purpose": "Filtros", "start_time": start,
+        })
+
+    # 2. El día 1 incluye las 23:30 y excluye las 00:00 del día 2
+    data = client.get("/reservations/", params={"start_date": "2030-08-01"}).json()
+    assert [r["lab_name"] for r in data["results"]] == ["Lab_Redes"]
+
+    # 3. "_" se busca literalmente, no como comodín de LIKE
+    data = client.get("/reservations/", params={"lab_name": "lab_"}).json()
+    assert [r["lab_name"] for r in data["results"]] == ["Lab_Redes"]
+
+    # 4. La consulta que emite el listado (filtros + cursor + LIMIT) usa el
+    #    índice parcial en SQLite, sin recorrer la tabla
+    query = keyset_query(
+        list_reservations_query(db_session, test_user.id, lab_name="lab", start_date=date(2030, 8, 1)),
+        list(LIST_ORDER), (datetime(2030, 8, 1, tzinfo=timezone.utc), 0), 50,
+    )
+    sql, params = compile_for_driver(query.statement, db_session.get_bind().dialect)
+    plan = db_session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params).all()
+    assert any("ix_reservations_owner_start_live" in row[-1] for row in plan), plan
+    assert not any(row[-1].startswith("SCAN reservations") for row in plan), plan
+
+
+def test_estimate_count_sql_for_postgresql(client: TestClient, db_session, test_user):
+    """
+    Test para verificar que la consulta que estima el total (EXPLAIN en
+    PostgreSQL) se compila con el IN del filtro por laboratorio desarrollado
+    y con los parámetros en la forma que espera cada driver.
+    """
+    # 1. Dos laboratorios que casan con el filtro
+    for lab in ("Lab Química", "Lab Química Orgánica"):
+        client.post("/reservations/", json={
+            "lab_name": lab, "reserved_by": "Test User", "purpose": "Total estimado",
+            "start_time": "2030-10-01T10:00:00",
+        })
+    query = list_reservations_query(db_session, test_user.id, lab_name="química")
+
+    # 2. asyncpg: marcadores numerados y parámetros en tupla, sin POSTCOMPILE
+    sql, params = compile_for_driver(query.statement, postgresql.asyncpg.dialect())
+    assert "POSTCOMPILE" not in sql
+    assert isinstance(params, tuple) and len(params) == 3  # owner_id y los dos lab_id
+    assert all(f"${i}" in sql for i in range(1, 4))
+
+    # 3. psycopg2: marcadores con nombre y parámetros en diccionario
+    sql, params = compile_for_driver(query.statement, postgresql.psycopg2.dialect())
+    assert "POSTCOMPILE" not in sql and isinstance(params, dict)
+
+
+def test_search_reservations_ranked_and_paginated(client: TestClient, test_user):
+    """
+    Test para verificar /reservations/search: coincidencias por propósito y
+    persona (sin tildes), paginación por cursor y borrados excluidos.
+    """
+    # 1. Tres reservas de química y una de otro tema
+    ids = []
+    for day, (who, purpose) in enumerate([
+        ("Ana Pérez", "Práctica de química orgánica"),
+        ("Luis Gómez", "Química analítica"),
+        ("Ana Pérez", "Química: titulaciones y química de soluciones"),
+        ("Marta Ruiz", "Examen de física"),
+    ], start=1):
+        response = client.post("/reservations/", json={
+            "lab_name": "Lab Búsqueda", "reserved_by": who, "purpose": purpose,
+            "start_time": f"2030-10-0{day}T10:00:00",
+        })
+        ids.append(response.json()["id"])
+
+    # 2. "quimica" (sin tilde) encuentra las tres, la que más lo repite primero
+    page = client.get("/reservations/search", params={"q": "quimica", "limit": 2}).json()
+    assert page["size"] == 2 and page["next_cursor"]
+    assert page["results"][0]["id"] == ids[2]
+    rest = client.get("/reservations/search", params={"q": "quimica", "limit": 2, "cursor": page["next_cursor"]}).json()
+    found = [r["id"] for r in page["results"] + rest["results"]]
+    assert sorted(found) == sorted(ids[:3]) and rest["next_cursor"] is None
+
+    # 3. Por persona, y sin las reservas borradas
+    client.delete(f"/reservations/{ids[0]}")
+    data = client.get("/reservations/search", params={"q": "perez"}).json()
+    assert [r["id"] for r in data["results"]] == [ids[2]]
+
+
+def test_search_is_scoped_to_own_reservations(client: TestClient, test_user, db_session: Session, monkeypatch):
+    """
+    Test para verificar que la búsqueda no devuelve reservas de otros usuarios
+    salvo que RESERVATION_SEARCH_ALL_USERS lo permita.
+    """
+    # 1. Una reserva propia y otra de otro usuario con el mismo propósito
+    client.post("/reservations/", json={
+        "lab_name": "Lab Privado", "reserved_by": "Test User", "purpose": "Cultivo celular",
+        "start_time": "2030-10-20T10:00:00",
+    })
+    other = UserModel(username="otra", hashed_password="x")
+    db_session.add(other)
+    db_session.flush()
+    db_session.add(ReservationModel(
+        lab_id=client.get("/labs/").json()[0]["id"], reserved_by="Otra Persona", purpose="Cultivo celular",
+        start_time=datetime(2030, 10, 21, 10, tzinfo=timezone.utc),
+        end_time=datetime(2030, 10, 21, 11, tzinfo=timezone.utc), owner_id=other.id,
+    ))
+    db_session.commit()
+
+    # 2. Por defecto solo aparecen las propias (mine=false no amplía nada)
+    data = client.get("/reservations/search", params={"q": "cultivo", "mine": False}).json()
+    assert [r["owner_id"] for r in data["results"]] == [test_user.id]
+
+    # 3. Con la búsqueda global activada aparecen las de todos
+    monkeypatch.setattr(settings, "RESERVATION_SEARCH_ALL_USERS", True)
+    data = client.get("/reservations/search", params={"q": "cultivo"}).json()
+    assert sorted(r["owner_id"] for r in data["results"]) == sorted([test_user.id, other.id])
+
+
+def test_interval_index_shrinks_max_span_on_removal():
+    """
+    Test para verificar que al borrar la reserva más larga la ventana de
+    búsqueda hacia atrás vuelve a la duración máxima de las que quedan.
+    """
+    index = LabIntervalIndex()
+    day = datetime(2030, 11, 1)
+    index.load(1, [(1, day, day + timedelta(hours=1)), (2, day + timedelta(hours=2), day + timedelta(hours=10))])
+    assert index._labs[1].max_span == timedelta(hours=8)
+
+    # 1. Borrada la larga, solo queda la de una hora
+    index.remove(2)
+    assert index._labs[1].max_span == timedelta(hours=1)
+    assert index.find_conflicts(1, day + timedelta(minutes=30), day + timedelta(hours=3)) == [1]
+
+    # 2. Dos de igual duración: borrar una no cambia la ventana
+    index.add(1, 3, day + timedelta(hours=4), day + timedelta(hours=5))
+    index.remove(1)
+    assert index._labs[1].max_span == timedelta(hours=1)
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+
+def test_import_skips_optional_subsystems():
+    """
+    Test para verificar que importar la app no carga numpy, Jinja2 ni openai
+    (se importan con el primer uso).
+    """
+    code = "import sys, app.main; print(sorted(m for m in ('numpy', 'jinja2', 'openai') if m in sys.modules))"
+    env = {**os.environ, "DATABASE_URL": os.environ.get("DATABASE_URL", "sqlite:///./test.db")}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_health_reports_startup_timings(client: TestClient):
+    """
+    Test para verificar que /health responde sin base de datos e informa los tiempos de arranque.
+    """
+    data = client.get("/health").json()
+    assert data["status"] == "ok"
+    assert data["startup_seconds"]["import"] > 0
+    assert data["startup_budget_seconds"] > 0